@@ -0,0 +1,60 @@
+"""add_query_shape_indexes
+
+Revision ID: 3951d3bcf180
+Revises: 319c433fbdb6
+Create Date: 2026-10-17 16:05:12.480913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3951d3bcf180'
+down_revision: Union[str, None] = '319c433fbdb6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index_concurrently(name: str, table: str, columns: list, **kw) -> None:
+    # A failed CONCURRENTLY build leaves an INVALID index behind: drop it so a re-run starts clean.
+    op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    op.create_index(name, table, columns, postgresql_concurrently=True, **kw)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE/DROP INDEX CONCURRENTLY can't run inside a transaction. Building concurrently
+    # takes no lock that blocks writes, at the price of two table scans per index.
+    with op.get_context().autocommit_block():
+        # Prompt lists: WHERE user_id = ? [AND id > cursor] ORDER BY id LIMIT n, and prompt counts per user
+        _create_index_concurrently('ix_prompts_user_id_id', 'prompts', ['user_id', 'id'])
+        # Version history pages, selectin loads and deletes by prompt; INCLUDE lets the per-prompt
+        # version count and last-updated subqueries of the summary list run as index-only scans.
+        _create_index_concurrently(
+            'ix_prompt_versions_prompt_id_version_number', 'prompt_versions', ['prompt_id', 'version_number'],
+            postgresql_include=['id', 'created_at', 'updated_at']
+        )
+        # Stripe webhook lookups; most users have neither, so only rows with a value are indexed
+        _create_index_concurrently(
+            'ix_userdb_stripe_customer_id', 'userdb', ['stripe_customer_id'],
+            postgresql_where=sa.text('stripe_customer_id IS NOT NULL')
+        )
+        _create_index_concurrently('ix_userdb_email', 'userdb', ['email'], postgresql_where=sa.text('email IS NOT NULL'))
+
+        # Superseded by ix_prompts_user_id_id, and a duplicate of ix_prompts_title
+        op.drop_index('ix_prompt_user_id', table_name='prompts', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_prompt_title', table_name='prompts', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        _create_index_concurrently('ix_prompt_title', 'prompts', ['title'])
+        _create_index_concurrently('ix_prompt_user_id', 'prompts', ['user_id'])
+        op.drop_index('ix_userdb_email', table_name='userdb', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_userdb_stripe_customer_id', table_name='userdb', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_prompt_versions_prompt_id_version_number', table_name='prompt_versions', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_prompts_user_id_id', table_name='prompts', postgresql_concurrently=True, if_exists=True)
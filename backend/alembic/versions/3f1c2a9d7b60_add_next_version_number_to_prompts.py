@@ -0,0 +1,39 @@
+"""add_next_version_number_to_prompts
+
+Revision ID: 3f1c2a9d7b60
+Revises: cbd0a67847a1
+Create Date: 2026-10-17 09:12:41.218034
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d7b60'
+down_revision: Union[str, None] = 'cbd0a67847a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Step 1: Add the counter column (server default covers rows created during the backfill)
+    op.add_column('prompts', sa.Column('next_version_number', sa.Integer(), server_default='1', nullable=True))
+
+    # Step 2: Continue numbering after each prompt's highest existing version
+    op.execute("""
+        UPDATE prompts SET next_version_number = COALESCE(
+            (SELECT MAX(v.version_number) FROM prompt_versions v WHERE v.prompt_id = prompts.id), 0
+        ) + 1
+    """)
+
+    # Step 3: Every row has a value now
+    op.alter_column('prompts', 'next_version_number', nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('prompts', 'next_version_number')
@@ -0,0 +1,42 @@
+"""add_next_prompt_number_to_userdb
+
+Revision ID: 8a4e6d1c5f27
+Revises: 3f1c2a9d7b60
+Create Date: 2026-10-17 10:03:18.552901
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4e6d1c5f27'
+down_revision: Union[str, None] = '3f1c2a9d7b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Step 1: Add the counter column (server default covers users created during the backfill)
+    op.add_column('userdb', sa.Column('next_prompt_number', sa.Integer(), server_default='1', nullable=True))
+
+    # Step 2: Continue after the highest existing prompt_{md5(user_id)[:8]}_{n} suffix of each user
+    op.execute("""
+        UPDATE userdb SET next_prompt_number = COALESCE((
+            SELECT MAX(CAST(substring(p.prompt_id FROM '_([0-9]+)$') AS INTEGER))
+            FROM prompts p
+            WHERE p.user_id = userdb.user_id
+              AND p.prompt_id LIKE 'prompt\\_' || left(md5(userdb.user_id::text), 8) || '\\_%'
+        ), 0) + 1
+    """)
+
+    # Step 3: Every row has a value now
+    op.alter_column('userdb', 'next_prompt_number', nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('userdb', 'next_prompt_number')
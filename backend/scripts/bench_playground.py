@@ -0,0 +1,96 @@
+# backend/scripts/bench_playground.py
+"""
+Benchmarks the playground LLM call path against the local OpenAI stand-in (scripts/mock_llm_server.py).
+
+Compares building a fresh AsyncOpenAI client per call (the old behaviour: new connection pool,
+new connection every time) with the pooled clients in src.llm_services, and prints p50/p99.
+
+    cd backend
+    python -m scripts.bench_playground --requests 500 --concurrency 20 --server-delay-ms 5
+
+The mock speaks plain HTTP on localhost, so the measured gap is only TCP setup plus client
+construction; against a real provider the pooled path also skips the TLS handshake.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # Make `src` importable when run as a file
+
+from scripts.mock_llm_server import start_mock_llm_server
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(call, total: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            text, error = await call(i)
+            latencies.append(time.perf_counter() - started)
+            if error:
+                raise RuntimeError(error)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, time.perf_counter() - started
+
+
+async def main(args) -> None:
+    from openai import AsyncOpenAI
+    from src.llm_services import get_llm_response, client_pool
+
+    api_keys = [f"sk-bench-{n}" for n in range(args.keys)]
+    model = f"mock-model?latency_ms={args.server_delay_ms}&tokens=2"
+
+    async def fresh_client_call(i):
+        client = AsyncOpenAI(api_key=api_keys[i % len(api_keys)])
+        try:
+            response = await client.chat.completions.create(
+                model=model, messages=[{"role": "user", "content": "hello"}]
+            )
+            return response.choices[0].message.content, None
+        finally:
+            await client.close()
+
+    async def pooled_call(i):
+        return await get_llm_response("openai", api_keys[i % len(api_keys)], model, "hello")
+
+    for name, call in (("fresh client per call", fresh_client_call), ("pooled clients", pooled_call)):
+        await run(call, min(args.requests, 50), args.concurrency) # Warm-up
+        latencies, elapsed = await run(call, args.requests, args.concurrency)
+        print(
+            f"{name:<24} p50={percentile(latencies, 50) * 1000:7.2f}ms "
+            f"p99={percentile(latencies, 99) * 1000:7.2f}ms "
+            f"mean={statistics.mean(latencies) * 1000:7.2f}ms "
+            f"throughput={args.requests / elapsed:8.1f} req/s"
+        )
+
+    await client_pool.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--keys", type=int, default=5, help="Number of distinct API keys to spread calls over")
+    parser.add_argument("--server-delay-ms", type=float, default=5.0, help="Simulated model latency")
+    args = parser.parse_args()
+
+    server = start_mock_llm_server()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.shutdown()
@@ -0,0 +1,227 @@
+# backend/scripts/explain_queries.py
+"""
+Runs EXPLAIN (ANALYZE, BUFFERS) on every statement the CRUD functions issue, against a seeded dataset.
+
+    cd backend
+    python -m scripts.explain_queries --users 200 --prompts 50 --versions 5
+    python -m scripts.explain_queries --only get_prompts,get_prompt_versions --no-seqscan
+
+Point DATABASE_URL at a development or staging database migrated with `alembic upgrade head`, never
+production. Everything runs in one transaction that is rolled back at the end: the seed rows, the
+CRUD calls, and the EXPLAIN ANALYZE re-runs of their statements, which execute writes too.
+
+Each CRUD function runs once while the statements it sends are recorded. Each recorded statement is
+then explained with its real parameters, inside a savepoint. Plans that scan a seeded table
+sequentially are listed at the end. With small seeds the planner rightly prefers sequential scans;
+--no-seqscan (enable_seqscan = off) shows whether an index can serve the query at all.
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # Make `src` importable when run as a file
+
+from cryptography.fernet import Fernet
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src import crud, schemas
+from src.config import settings
+from src.crud import crud_api_keys, crud_batch_runs, crud_users
+from src.database import async_database_url
+
+SEEDED_TABLES = ("userdb", "prompts", "prompt_versions", "user_api_keys", "batch_runs", "batch_run_rows")
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+SEED_SQL = [
+    # One user in ten has a Stripe customer id, like the real table
+    """
+    INSERT INTO userdb (auth0_id, email, username, tier, subscription_status, stripe_customer_id, has_seen_paywall_modal, next_prompt_number)
+    SELECT 'auth0|explain-' || n, 'explain-' || n || '@example.com', 'explain-' || n, 'free', 'active',
+           CASE WHEN n % 10 = 1 THEN 'cus_explain_' || n END, false, CAST(:prompts AS integer) + 1
+    FROM generate_series(1, CAST(:users AS integer)) AS n
+    """,
+    """
+    INSERT INTO prompts (prompt_id, user_id, title, tags, latest_version, next_version_number)
+    SELECT 'explain_' || u.user_id || '_' || p, u.user_id, 'Prompt ' || p, '[]', 'v' || CAST(:versions AS integer), CAST(:versions AS integer) + 1
+    FROM userdb u CROSS JOIN generate_series(1, CAST(:prompts AS integer)) AS p
+    WHERE u.auth0_id LIKE 'auth0|explain-%'
+    """,
+    """
+    INSERT INTO prompt_versions (prompt_id, user_id, version_number, version_id_str, text, created_at, updated_at)
+    SELECT pr.id, pr.user_id, v, 'v' || v, repeat('Summarise {{topic}} for {{audience}}. ', 20), now(), now()
+    FROM prompts pr CROSS JOIN generate_series(1, CAST(:versions AS integer)) AS v
+    WHERE pr.prompt_id LIKE 'explain\\_%'
+    """,
+    """
+    INSERT INTO user_api_keys (user_id, llm_provider, encrypted_api_key, masked_api_key)
+    SELECT u.user_id, provider, :token, 'sk-...plan'
+    FROM userdb u CROSS JOIN unnest(ARRAY['openai', 'anthropic', 'gemini']) AS provider
+    WHERE u.auth0_id LIKE 'auth0|explain-%'
+    """,
+    "ANALYZE userdb, prompts, prompt_versions, user_api_keys",
+]
+
+
+class StatementRecorder:
+    """Records the statements (and DBAPI parameters) sent on a connection while `recording` is set."""
+
+    def __init__(self, sync_connection):
+        self.recording = False
+        self.statements: List[tuple] = []
+        event.listen(sync_connection, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.recording and not executemany and not statement.lstrip().upper().startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+            self.statements.append((statement, parameters))
+
+
+def _cases(user_id: int, auth0_id: str, prompt_id: str, prompt_pk: int, other_prompt_id: str) -> List[tuple]:
+    """(name, fn(db)) for each CRUD call on a hot path, with arguments pointing at seeded rows."""
+    state: Dict[str, Any] = {}
+
+    async def create_batch_run(db):
+        run = await crud_batch_runs.create_batch_run(db, user_id, prompt_id, "v1", "openai", "gpt-4o", [{"topic": str(n)} for n in range(20)])
+        state["run_id"] = run.id
+
+    async def get_decrypted_api_key(db):
+        crud_api_keys.invalidate_cached_api_key(user_id, "openai") # Measure the database path, not the cache
+        if not settings.FERNET_KEY: # Seeded with a throwaway key; the lookup it starts with is the same query
+            return await crud_api_keys._get_user_api_key_row(db, user_id, "openai")
+        return await crud_api_keys.get_decrypted_api_key(db, user_id, "openai")
+
+    return [
+        ("get_user_by_auth0_id", lambda db: crud_users.get_user_by_auth0_id(db, auth0_id)),
+        ("get_or_create_user_from_auth0", lambda db: crud_users.get_or_create_user_from_auth0(db, {"sub": auth0_id})),
+        ("get_user_by_email", lambda db: crud_users.get_user_by_email(db, "explain-1@example.com")),
+        ("get_user_by_stripe_customer_id", lambda db: crud_users.get_user_by_stripe_customer_id(db, "cus_explain_1")),
+        ("count_user_prompts", lambda db: crud_users.count_user_prompts(db, user_id)),
+        ("count_prompt_versions", lambda db: crud_users.count_prompt_versions(db, user_id, prompt_id)),
+        ("get_prompts", lambda db: crud.get_prompts(db, user_id, limit=20)),
+        ("get_prompts (next page)", lambda db: crud.get_prompts(db, user_id, limit=20, cursor=crud.encode_cursor(id=prompt_pk))),
+        ("get_prompt_summaries", lambda db: crud.get_prompt_summaries(db, user_id, limit=20)),
+        ("get_prompt_by_prompt_id", lambda db: crud.get_prompt_by_prompt_id(db, prompt_id, user_id)),
+        ("get_prompt_versions", lambda db: crud.get_prompt_versions(db, prompt_id, user_id, limit=20)),
+        ("create_db_version", lambda db: crud.create_db_version(db, prompt_id, user_id, schemas.VersionCreate(text="new draft"))),
+        ("update_db_version_notes", lambda db: crud.update_db_version_notes(db, prompt_id, user_id, "v1", "a note")),
+        ("add_db_tag", lambda db: crud.add_db_tag(db, prompt_id, user_id, schemas.TagCreate(name="plan", color="blue"))),
+        ("create_db_prompt", lambda db: crud.create_db_prompt(db, schemas.PromptCreate(title="New", initial_version_text="text"), user_id)),
+        ("delete_db_prompt", lambda db: crud.delete_db_prompt(db, other_prompt_id, user_id)),
+        ("get_user_api_keys", lambda db: crud_api_keys.get_user_api_keys(db, user_id)),
+        ("get_decrypted_api_key", get_decrypted_api_key),
+        ("create_batch_run", create_batch_run),
+        ("get_batch_runs_for_version", lambda db: crud_batch_runs.get_batch_runs_for_version(db, prompt_id, "v1", user_id)),
+        ("get_batch_run", lambda db: crud_batch_runs.get_batch_run(db, state["run_id"], user_id)),
+        ("get_batch_run_rows", lambda db: crud_batch_runs.get_batch_run_rows(db, state["run_id"], user_id, limit=50)),
+        ("claim_batch_run", lambda db: crud_batch_runs.claim_batch_run(db, state["run_id"], "explain", lease_seconds=60)),
+        ("get_pending_batch_run_rows", lambda db: crud_batch_runs.get_pending_batch_run_rows(db, state["run_id"])),
+        ("get_resumable_batch_run_ids", lambda db: crud_batch_runs.get_resumable_batch_run_ids(db)),
+    ]
+
+
+async def explain_all(
+    database_url: str, users: int = 200, prompts: int = 50, versions: int = 5,
+    only: Optional[List[str]] = None, seqscan: bool = True, verbose: bool = True
+) -> List[Dict[str, Any]]:
+    """Seeds, runs and explains every case; returns one {case, statement, plan, error} dict per statement."""
+    # Seeded API keys are encrypted with FERNET_KEY when there is one, so the decrypt path runs
+    fernet = crud_api_keys._get_fernet_instance() if settings.FERNET_KEY else Fernet(Fernet.generate_key())
+    token = fernet.encrypt(b"sk-plan")
+    engine = create_async_engine(async_database_url(database_url), poolclass=NullPool)
+    results: List[Dict[str, Any]] = []
+    try:
+        async with engine.connect() as conn:
+            transaction = await conn.begin()
+            try:
+                for sql in SEED_SQL:
+                    await conn.execute(text(sql), {"users": users, "prompts": prompts, "versions": versions, "token": token})
+                if not seqscan:
+                    await conn.execute(text("SET LOCAL enable_seqscan = off"))
+                user_id = (await conn.execute(text("SELECT user_id FROM userdb WHERE auth0_id = 'auth0|explain-1'"))).scalar()
+                prompt_pk, prompt_id = (await conn.execute(
+                    text("SELECT id, prompt_id FROM prompts WHERE user_id = :user_id ORDER BY id LIMIT 1"), {"user_id": user_id}
+                )).one()
+                cases = _cases(user_id, "auth0|explain-1", prompt_id, prompt_pk, f"explain_{user_id}_{prompts}")
+
+                # Commits inside the CRUD functions only release savepoints of the outer transaction
+                db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False, autoflush=False)
+                recorder = StatementRecorder(conn.sync_connection)
+                for name, call in cases:
+                    recorder.statements.clear()
+                    recorder.recording = True
+                    try:
+                        await call(db)
+                    finally:
+                        recorder.recording = False
+                        db.expunge_all()
+                    if only and name not in only:
+                        continue
+                    for statement, parameters in list(recorder.statements):
+                        results.append(await _explain(conn, name, statement, parameters))
+                        if verbose:
+                            _print_result(results[-1])
+                await db.close()
+            finally:
+                await transaction.rollback()
+    finally:
+        await engine.dispose()
+    return results
+
+
+async def _explain(conn, name: str, statement: str, parameters) -> Dict[str, Any]:
+    result = {"case": name, "statement": statement, "plan": None, "error": None}
+    # Re-running a write can fail where the first run didn't (e.g. an INSERT of the same unique key):
+    # then show the estimated plan only. Each attempt runs in a savepoint, so it's undone on its own.
+    for explain in ("EXPLAIN (ANALYZE, BUFFERS) ", "EXPLAIN "):
+        try:
+            async with conn.begin_nested():
+                rows = await conn.exec_driver_sql(explain + statement, parameters)
+                result["plan"] = "\n".join(row[0] for row in rows)
+            return result
+        except Exception as e:
+            result["error"] = result["error"] or f"{type(e).__name__}: {e}"
+    return result
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    print(f"== {result['case']} ==")
+    print(" ".join(result["statement"].split()))
+    if result["plan"] and result["error"]:
+        print(f"  (not executed, estimated plan only: {result['error'].splitlines()[0]})")
+    print(result["plan"] or f"  could not explain: {result['error']}")
+    print()
+
+
+def sequential_scans(results: List[Dict[str, Any]]) -> List[tuple]:
+    """(case, table) for every plan that scans a seeded table sequentially."""
+    return [
+        (result["case"], table)
+        for result in results if result["plan"]
+        for table in SEQ_SCAN.findall(result["plan"]) if table in SEEDED_TABLES
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="Seeded users")
+    parser.add_argument("--prompts", type=int, default=50, help="Seeded prompts per user")
+    parser.add_argument("--versions", type=int, default=5, help="Seeded versions per prompt")
+    parser.add_argument("--only", default="", help="Comma-separated case names to explain (all run regardless)")
+    parser.add_argument("--no-seqscan", action="store_true", help="Discourage sequential scans to check index usability")
+    args = parser.parse_args()
+
+    from src.database import SQLALCHEMY_DATABASE_URL
+
+    explained = asyncio.run(explain_all(
+        SQLALCHEMY_DATABASE_URL, users=args.users, prompts=args.prompts, versions=args.versions,
+        only=[name.strip() for name in args.only.split(",") if name.strip()] or None, seqscan=not args.no_seqscan
+    ))
+    scans = sequential_scans(explained)
+    print(f"{len(explained)} statements explained, {sum(1 for r in explained if not r['plan'])} failed")
+    for case, table in scans:
+        print(f"Seq Scan on {table}: {case}")
@@ -0,0 +1,231 @@
+# backend/scripts/mock_llm_server.py
+"""
+Local stand-in for the OpenAI, Anthropic and Gemini HTTP APIs, for load tests and benchmarks.
+
+    cd backend
+    python -m scripts.mock_llm_server --port 8089
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:8089 \\
+        GEMINI_BASE_URL=http://127.0.0.1:8089 uvicorn src.main:app
+
+Serves POST /v1/chat/completions (OpenAI), POST /v1/messages (Anthropic) and
+POST /v1beta/models/{model}:generateContent / :streamGenerateContent (Gemini; set GEMINI_BASE_URL),
+streamed or not, so the real SDKs, client pool, rate limiter, retry policy and SSE relay run unchanged against it.
+Behaviour is read from the request's model name just like the `mock` provider (src.mock_llm.MockSpec),
+e.g. model "gpt-4o?latency_ms=300&p99_ms=1500&tps=60&errors=429:0.02,529:0.01". Injected errors use
+each API's status codes, error bodies and retry-after headers; injected timeouts hang the request.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # Make `src` importable when run as a file
+
+from src.mock_llm import MockCall, mock_llm
+
+ERROR_TYPES = {
+    "openai": {429: "rate_limit_error", 400: "invalid_request_error"},
+    "anthropic": {429: "rate_limit_error", 529: "overloaded_error", 400: "invalid_request_error"},
+    "gemini": {429: "RESOURCE_EXHAUSTED", 400: "INVALID_ARGUMENT", 503: "UNAVAILABLE", 500: "INTERNAL"},
+}
+GEMINI_METHODS = (":streamGenerateContent", ":generateContent")
+
+
+def _prompt_text(body: dict) -> str:
+    if "contents" in body: # Gemini
+        return "\n".join(part.get("text", "") for content in body["contents"] for part in content.get("parts", []))
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, list): # Content blocks
+            content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real APIs
+    hang_seconds = 600.0
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connection_count += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = self.path.split("?", 1)[0].rstrip("/")
+        model = body.get("model", "mock")
+        stream = bool(body.get("stream"))
+        if "/models/" in self.path and any(method in self.path for method in GEMINI_METHODS):
+            # Gemini puts the model in the path, unescaped: /v1beta/models/<model>:generateContent[?alt=sse]
+            api = "gemini"
+            rest = self.path.split("/models/", 1)[1]
+            method = next(method for method in GEMINI_METHODS if method in rest)
+            model = rest[:rest.rindex(method)]
+            stream = method == ":streamGenerateContent"
+        elif path.endswith("/chat/completions"):
+            api = "openai"
+        elif path.endswith("/messages"):
+            api = "anthropic"
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        with self.server.lock:
+            self.server.request_count += 1
+            self.server.api_keys.append(
+                self.headers.get("x-goog-api-key") or self.headers.get("x-api-key")
+                or self.headers.get("Authorization", "").removeprefix("Bearer ")
+            )
+
+        try:
+            call = mock_llm.plan(model, _prompt_text(body))
+        except ValueError as e:
+            self._send_error(api, 400, str(e))
+            return
+        time.sleep(call.first_token_delay)
+        if call.error == "timeout":
+            time.sleep(self.hang_seconds)
+            self.close_connection = True
+            return
+        if call.error:
+            self._send_error(api, int(call.error), "Injected error", retry_after=call.retry_after)
+            return
+        if stream:
+            self._stream(api, model, call)
+        else:
+            time.sleep(call.chunk_delay * (len(call.chunks) - 1))
+            self._send_json(200, self._completion(api, model, call))
+
+    def _completion(self, api: str, model: str, call: MockCall, text: str = None) -> dict:
+        text = call.text if text is None else text
+        if api == "gemini":
+            return {
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": len(call.chunks), "totalTokenCount": 1 + len(call.chunks)},
+                "modelVersion": model,
+            }
+        if api == "openai":
+            return {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": len(call.chunks), "total_tokens": 1 + len(call.chunks)},
+            }
+        return {
+            "id": "msg_mock",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 1, "output_tokens": len(call.chunks)},
+        }
+
+    def _stream(self, api: str, model: str, call: MockCall) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close") # No length or chunking: the body ends when the connection does
+        self.end_headers()
+        self.close_connection = True
+
+        def send(data: dict, event: str = None) -> None:
+            frame = (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+            self.wfile.write(frame.encode())
+            self.wfile.flush()
+
+        try:
+            if api == "anthropic":
+                send({"type": "message_start", "message": {**self._completion(api, model, call), "content": [], "stop_reason": None}}, "message_start")
+                send({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, "content_block_start")
+            for i, chunk in enumerate(call.chunks):
+                if i and call.chunk_delay:
+                    time.sleep(call.chunk_delay)
+                if api == "gemini":
+                    send(self._completion(api, model, call, text=chunk))
+                elif api == "openai":
+                    send({
+                        "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": {"role": "assistant", "content": chunk}, "finish_reason": None}],
+                    })
+                else:
+                    send({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}}, "content_block_delta")
+            if api == "openai":
+                send({
+                    "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                })
+                self.wfile.write(b"data: [DONE]\n\n")
+            elif api == "anthropic":
+                send({"type": "content_block_stop", "index": 0}, "content_block_stop")
+                send({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": len(call.chunks)}}, "message_delta")
+                send({"type": "message_stop"}, "message_stop")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. the playground stream was aborted)
+            with self.server.lock:
+                self.server.aborted_streams += 1
+
+    def _send_error(self, api: str, status: int, message: str, retry_after: float = None) -> None:
+        error_type = ERROR_TYPES[api].get(status, "api_error" if api == "anthropic" else "server_error")
+        if api == "gemini":
+            payload = {"error": {"code": status, "message": message, "status": error_type}}
+        elif api == "openai":
+            payload = {"error": {"message": message, "type": error_type, "param": None, "code": None}}
+        else:
+            payload = {"type": "error", "error": {"type": error_type, "message": message}}
+        headers = {}
+        if status == 429 and retry_after is not None:
+            headers["retry-after"] = str(max(int(retry_after), 1))
+            headers["retry-after-ms"] = str(int(retry_after * 1000))
+        self._send_json(status, payload, headers)
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_llm_server(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Starts the stand-in on a background thread; port 0 picks a free port (see server_address)."""
+    httpd = ThreadingHTTPServer((host, port), MockLLMHandler)
+    httpd.daemon_threads = True
+    httpd.request_count = 0
+    httpd.connection_count = 0 # TCP connections accepted; less than request_count when clients keep them alive
+    httpd.api_keys = [] # The API key each request was made with, in arrival order
+    httpd.aborted_streams = 0 # Streams the client closed before the last chunk
+    httpd.lock = threading.Lock()
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--hang-seconds", type=float, default=600.0, help="How long an injected timeout holds the request")
+    args = parser.parse_args()
+
+    MockLLMHandler.hang_seconds = args.hang_seconds
+    server = start_mock_llm_server(args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Mock LLM server on http://{host}:{port} (OpenAI: /v1/chat/completions, Anthropic: /v1/messages, Gemini: /v1beta/models)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,125 @@
+# backend/scripts/rotate_fernet_key.py
+"""
+Re-encrypts every stored user API key with the current FERNET_KEY, online.
+
+Rotating the key:
+  1. Generate a new key and deploy with FERNET_KEY=<new> and FERNET_PREVIOUS_KEYS=<old>. New and updated
+     keys are written with the new key; existing rows keep decrypting with the old one.
+  2. Run the job:
+
+         cd backend
+         python -m scripts.rotate_fernet_key --batch-size 500 --workers 4
+
+  3. Once a run reports nothing left to rotate, drop the old key from FERNET_PREVIOUS_KEYS.
+
+Rows are streamed in id order through a server-side cursor (yield_per) on one connection, re-encrypted
+in a process pool, and written back on another connection in batches, each its own short transaction.
+A row is only overwritten if its ciphertext hasn't changed since it was read, so keys users change
+meanwhile win and no lock is held beyond the rows of the batch being written. Rows already on the
+current key are skipped, so the job can be interrupted and simply re-run, or resumed with --after-id
+(printed after every batch).
+"""
+
+import argparse
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # Make `src` importable when run as a file
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from src.crud import crud_api_keys
+
+
+def rotate_tokens(fernet_keys: Tuple[str, ...], rows: List[Tuple[int, bytes]]):
+    """
+    Runs in a worker process. Returns (id, old_token, new_token) for each row not yet encrypted with the
+    current key (fernet_keys[0]), and the ids of rows none of the keys can decrypt.
+    """
+    current = Fernet(fernet_keys[0].encode())
+    multi = MultiFernet([Fernet(key.encode()) for key in fernet_keys])
+    rotated, undecryptable = [], []
+    for row_id, token in rows:
+        try:
+            current.decrypt(token)
+            continue # Already on the current key
+        except InvalidToken:
+            pass
+        try:
+            rotated.append((row_id, token, multi.rotate(token)))
+        except InvalidToken:
+            undecryptable.append(row_id)
+    return rotated, undecryptable
+
+
+def _batches(rows, batch_size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rotate_all(session_factory: Callable, batch_size: int = 500, workers: int = 2, after_id: int = 0, verbose: bool = True) -> dict:
+    """Re-encrypts every key with id > after_id onto the current FERNET_KEY. Returns counts and the last id processed."""
+    fernet_keys = crud_api_keys._fernet_keys()
+    stats = {"scanned": 0, "rotated": 0, "changed_concurrently": 0, "undecryptable": 0, "last_id": after_id}
+    read_db = session_factory()
+    write_db = session_factory()
+
+    def store(last_id: int, size: int, rotated, undecryptable) -> None:
+        written = crud_api_keys.store_rotated_api_keys(write_db, rotated) if rotated else 0
+        stats["scanned"] += size
+        stats["rotated"] += written
+        stats["changed_concurrently"] += len(rotated) - written
+        stats["undecryptable"] += len(undecryptable)
+        stats["last_id"] = last_id
+        if undecryptable:
+            print(f"WARNING: no configured key decrypts user_api_keys ids {undecryptable}; left unchanged")
+        if verbose:
+            print(f"Processed through id {last_id}: {stats['scanned']} scanned, {stats['rotated']} rotated")
+
+    try:
+        rows = crud_api_keys.stream_encrypted_api_keys(read_db, after_id, batch_size)
+        if workers <= 0: # In-process, for small tables and debugging
+            for batch in _batches(rows, batch_size):
+                store(batch[-1][0], len(batch), *rotate_tokens(fernet_keys, batch))
+            return stats
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep a bounded number of batches in flight and write them back in id order,
+            # so memory stays flat and the reported last id is always safe to resume from.
+            pending = deque()
+            for batch in _batches(rows, batch_size):
+                pending.append((batch[-1][0], len(batch), pool.submit(rotate_tokens, fernet_keys, batch)))
+                if len(pending) >= workers * 2:
+                    last_id, size, future = pending.popleft()
+                    store(last_id, size, *future.result())
+            while pending:
+                last_id, size, future = pending.popleft()
+                store(last_id, size, *future.result())
+        return stats
+    finally:
+        read_db.close()
+        write_db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows fetched, re-encrypted and committed together")
+    parser.add_argument("--workers", type=int, default=2, help="Re-encryption processes (0 = in-process)")
+    parser.add_argument("--after-id", type=int, default=0, help="Resume after this user_api_keys id")
+    args = parser.parse_args()
+
+    from src.database import SessionLocal
+
+    result = rotate_all(SessionLocal, batch_size=args.batch_size, workers=args.workers, after_id=args.after_id)
+    print(
+        f"Done: {result['rotated']} rotated, {result['changed_concurrently']} changed concurrently (already current), "
+        f"{result['undecryptable']} undecryptable, last id {result['last_id']}"
+    )
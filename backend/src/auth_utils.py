@@ -1,48 +1,161 @@
 # backend/src/auth_utils.py
-import json
-import requests # Using requests for simplicity, httpx for async environments
+import hashlib
+import time
+import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError, ExpiredSignatureError # JWTClaimsError will be imported from jose.exceptions
 from jose.exceptions import JWTClaimsError # Corrected import for JWTClaimsError
 from typing import Dict, Optional
-from functools import lru_cache # For caching JWKS
 
 from src.config import settings
+from src.cache_utils import TTLCache, SingleFlight
+from src.database import get_db, read_session_router
+from src.crud import crud_users
+from src import schemas
 
 # Scheme for bearer token authentication
 oauth2_scheme = HTTPBearer(auto_error=False)  # Changed to not auto-error to handle manually
 
+# --- Verified Token Cache ---
+# Maps sha256(token) -> verified payload. Entries expire at the token's own 'exp'
+# (capped by AUTH_TOKEN_CACHE_MAX_TTL_SECONDS) and the whole cache is dropped when
+# the JWKS key set changes, so a revoked signing key can't keep tokens alive.
+_verified_token_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def _token_digest(token_value: str) -> str:
+    """Returns the cache key for a raw bearer token (never store the token itself)."""
+    return hashlib.sha256(token_value.encode()).hexdigest()
+
+
+def _cache_verified_payload(token_value: str, payload: Dict[str, any]) -> None:
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)):
+        return # Tokens without an expiry are never cached
+    expires_at = min(float(exp), time.time() + settings.AUTH_TOKEN_CACHE_MAX_TTL_SECONDS)
+    _verified_token_cache.set(_token_digest(token_value), payload, expires_at=expires_at)
+
+
 # --- JWKS (JSON Web Key Set) Caching ---
-@lru_cache(maxsize=1)
-def get_jwks() -> Dict[str, any]:
+class JWKSManager:
     """
-    Fetches and caches the JSON Web Key Set (JWKS) from Auth0.
+    Async, non-blocking cache of the Auth0 signing keys.
+
+    - Fetches are single-flight: concurrent cold-cache or unknown-kid requests share one HTTP call.
+    - Keys are refreshed in the background once they are within the refresh-ahead window of their TTL.
+    - Unknown kids are negatively cached, and forced refreshes are rate limited, so a flood of
+      tokens with bogus kids can't be turned into a flood of requests against Auth0.
+    - If a refresh fails while we still hold keys, the stale keys keep being served.
     """
-    if not settings.AUTH0_DOMAIN:
-        raise ValueError("AUTH0_DOMAIN is not configured.")
-    
-    jwks_url = f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json"
-    try:
-        response = requests.get(jwks_url, timeout=10)
-        response.raise_for_status()
-        jwks = response.json()
-        # Ensure 'keys' exists and is a list before processing
-        if "keys" not in jwks or not isinstance(jwks["keys"], list):
-            raise ValueError("Invalid JWKS format: 'keys' array not found.")
-        return {key["kid"]: key for key in jwks["keys"] if "kid" in key} # Added check for "kid"
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching JWKS: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Could not fetch JWKS from authentication server."
-        )
-    except (KeyError, TypeError, ValueError) as e: # Added ValueError
-        print(f"Invalid JWKS format or content: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Invalid JWKS format received from authentication server."
-        )
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport # Injected by tests to avoid the network
+        self._keys: Dict[str, Dict[str, any]] = {}
+        self._expires_at = 0.0
+        self._last_fetch_attempt = 0.0
+        self._unknown_kids = TTLCache(maxsize=1024)
+        self._single_flight = SingleFlight()
+
+    @property
+    def jwks_url(self) -> str:
+        if settings.AUTH0_JWKS_URL:
+            return settings.AUTH0_JWKS_URL
+        if not settings.AUTH0_DOMAIN:
+            raise ValueError("AUTH0_DOMAIN is not configured.")
+        return f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json"
+
+    def reset(self) -> None:
+        """Forgets all keys and negative-cache entries (used by tests and on config changes)."""
+        self._keys = {}
+        self._expires_at = 0.0
+        self._last_fetch_attempt = 0.0
+        self._unknown_kids.clear()
+
+    async def get_signing_key(self, kid: str) -> Optional[Dict[str, any]]:
+        """Returns the JWK for ``kid``, or None if Auth0 doesn't publish it."""
+        now = time.time()
+        fetched = False
+        if not self._keys or now >= self._expires_at:
+            fetched = await self._refresh()
+        elif now >= self._expires_at - settings.AUTH_JWKS_REFRESH_AHEAD_SECONDS:
+            self._refresh_in_background()
+
+        key_data = self._keys.get(kid)
+        if key_data is not None:
+            return key_data
+
+        if self._unknown_kids.get(kid) is not None:
+            return None
+
+        # An unseen kid may mean Auth0 rotated keys; refresh once, but not more often than allowed.
+        if time.time() - self._last_fetch_attempt >= settings.AUTH_JWKS_MIN_REFRESH_INTERVAL_SECONDS:
+            fetched = await self._refresh()
+            key_data = self._keys.get(kid)
+
+        # Only a kid missing from a key set we just fetched is known to be unknown. If the refresh was
+        # throttled (or failed), the kid may be a key rotated in since the last fetch: don't cache that.
+        if key_data is None and fetched:
+            self._unknown_kids.set(kid, True, ttl=settings.AUTH_JWKS_UNKNOWN_KID_TTL_SECONDS)
+        return key_data
+
+    async def _refresh(self) -> bool:
+        """Fetches the key set (or joins the fetch in flight); False if stale keys are being served."""
+        return await self._single_flight.do("jwks", self._fetch_and_store)
+
+    def _refresh_in_background(self) -> None:
+        if not self._single_flight.in_flight("jwks"):
+            self._single_flight.start("jwks", self._fetch_and_store)
+
+    async def _fetch_and_store(self) -> bool:
+        self._last_fetch_attempt = time.time()
+        try:
+            jwks_map = await self._fetch()
+        except HTTPException:
+            if not self._keys:
+                raise
+            # Serve stale keys, and retry no sooner than the min refresh interval.
+            print("Warning: JWKS refresh failed, continuing to serve cached keys.")
+            self._expires_at = time.time() + settings.AUTH_JWKS_MIN_REFRESH_INTERVAL_SECONDS
+            return False
+
+        if self._keys and set(jwks_map.keys()) != set(self._keys.keys()):
+            print("DEBUG: JWKS key set rotated, clearing verified token cache")
+            _verified_token_cache.clear()
+        self._keys = jwks_map
+        self._expires_at = time.time() + settings.AUTH_JWKS_TTL_SECONDS
+        self._unknown_kids.clear()
+        return True
+
+    async def _fetch(self) -> Dict[str, Dict[str, any]]:
+        jwks_url = self.jwks_url
+        try:
+            async with httpx.AsyncClient(
+                timeout=settings.AUTH_JWKS_FETCH_TIMEOUT_SECONDS, transport=self._transport
+            ) as client:
+                response = await client.get(jwks_url)
+            response.raise_for_status()
+            jwks = response.json()
+            # Ensure 'keys' exists and is a list before processing
+            if "keys" not in jwks or not isinstance(jwks["keys"], list):
+                raise ValueError("Invalid JWKS format: 'keys' array not found.")
+            return {key["kid"]: key for key in jwks["keys"] if "kid" in key} # Added check for "kid"
+        except httpx.HTTPError as e:
+            print(f"Error fetching JWKS: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Could not fetch JWKS from authentication server."
+            )
+        except (KeyError, TypeError, ValueError) as e: # Added ValueError
+            print(f"Invalid JWKS format or content: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Invalid JWKS format received from authentication server."
+            )
+
+
+jwks_manager = JWKSManager()
 
 
 # --- Token Verification Dependency ---
@@ -72,6 +185,10 @@ async def verify_token(
     token_value = token.credentials
     print(f"DEBUG: Token value length: {len(token_value) if token_value else 0}")
 
+    cached_payload = _verified_token_cache.get(_token_digest(token_value)) if token_value else None
+    if cached_payload is not None:
+        return dict(cached_payload) # Copy so callers can't mutate the cached entry
+
     try:
         # Check if we have required settings
         if not settings.AUTH0_DOMAIN or not settings.AUTH0_API_AUDIENCE:
@@ -81,7 +198,6 @@ async def verify_token(
                 detail="Authentication service configuration error"
             )
         
-        jwks_map = get_jwks() # This can now raise ValueError if domain not set, or HTTPException
         unverified_header = jwt.get_unverified_header(token_value)
         print(f"DEBUG: Token header: {unverified_header}")
         
@@ -90,16 +206,10 @@ async def verify_token(
             print("DEBUG: Token header missing 'kid'")
             raise credentials_exception
 
-        key_data = jwks_map.get(kid)
+        key_data = await jwks_manager.get_signing_key(kid) # Can raise HTTPException (503) on a cold cache
         if not key_data:
             print(f"DEBUG: 'kid' {kid} not found in JWKS")
-            # Attempt to refresh JWKS cache once if key not found
-            get_jwks.cache_clear()
-            jwks_map = get_jwks()
-            key_data = jwks_map.get(kid)
-            if not key_data:
-                print(f"DEBUG: 'kid' {kid} still not found in refreshed JWKS")
-                raise credentials_exception
+            raise credentials_exception
 
         # Construct RSA key from JWKS data
         rsa_key = {
@@ -128,8 +238,11 @@ async def verify_token(
             raise credentials_exception
 
         print(f"DEBUG: Token validation successful for user: {user_id}")
-        return payload 
+        _cache_verified_payload(token_value, payload)
+        return dict(payload)
 
+    except HTTPException:
+        raise
     except ExpiredSignatureError:
         print("DEBUG: Token has expired")
         raise HTTPException(
@@ -147,7 +260,7 @@ async def verify_token(
     except JWTError as e:
         print(f"DEBUG: JWT processing error: {e}")
         raise credentials_exception
-    except ValueError as e: # Catch configuration errors from get_jwks
+    except ValueError as e: # Catch configuration errors from the JWKS manager
         print(f"DEBUG: Configuration error for JWT validation: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -157,3 +270,33 @@ async def verify_token(
         print(f"DEBUG: Unexpected error during token validation: {type(e).__name__} - {e}")
         raise credentials_exception
 
+
+# --- Current User Dependency ---
+async def get_current_user(
+    current_user: Dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+) -> schemas.User:
+    """
+    FastAPI dependency resolving the verified token's 'sub' to our User record.
+    Served from an in-process TTL cache keyed by auth0_id, so most requests skip the
+    userdb lookup; the user is created on first login.
+    """
+    if not current_user.get("sub"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
+    user = await crud_users.get_cached_user_from_auth0(db, current_user)
+    db.info["user_id"] = user.user_id # Writes committed on the request's session open the user's read-your-writes window
+    return user
+
+
+# --- Read-Only Session Dependency ---
+async def get_read_db(user: schemas.User = Depends(get_current_user)):
+    """
+    FastAPI dependency for read-only endpoints: an AsyncSession on the read replica when one is
+    configured and caught up (see database.ReadSessionRouter), otherwise on the primary.
+    Lives here rather than in database.py because routing depends on the current user.
+    """
+    db: AsyncSession = await read_session_router.session(user.user_id)
+    try:
+        yield db
+    finally:
+        await db.close()
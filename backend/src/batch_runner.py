@@ -0,0 +1,205 @@
+# backend/src/batch_runner.py
+# Executes batch runs: one prompt version evaluated against every row of a dataset.
+
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.crud import crud_api_keys, crud_batch_runs
+from src.database import AsyncSessionLocal
+from src.llm_services import get_llm_response
+
+TEMPLATE_VARIABLE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+
+def render_template(template: str, variables: Dict[str, Any]) -> str:
+    """Substitutes {{name}} placeholders. Raises KeyError naming the first variable the row doesn't define."""
+    def substitute(match: re.Match) -> str:
+        name = match.group(1)
+        if name not in variables:
+            raise KeyError(name)
+        value = variables[name]
+        return "" if value is None else str(value)
+    return TEMPLATE_VARIABLE.sub(substitute, template)
+
+
+def parse_dataset(dataset: str, dataset_format: str) -> List[Dict[str, Any]]:
+    """Parses CSV (first line is the header) or JSONL (one JSON object per line) text into rows. Raises ValueError."""
+    if dataset_format == "csv":
+        return [dict(row) for row in csv.DictReader(io.StringIO(dataset))]
+    if dataset_format == "jsonl":
+        rows = []
+        for line_number, line in enumerate(dataset.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number} is not valid JSON: {e.msg}")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {line_number} is not a JSON object")
+            rows.append(row)
+        return rows
+    raise ValueError(f"Unsupported dataset format: {dataset_format}")
+
+
+class BatchRunner:
+    """
+    Runs batch runs as background asyncio tasks in this process.
+
+    - Rows are evaluated through get_llm_response with at most BATCH_RUN_CONCURRENCY_PER_KEY
+      calls in flight per (provider, API key), shared by every run using that key.
+    - Each row's result is committed as soon as it arrives, so a restart loses at most the
+      calls that were in flight; on resume only the still-pending rows are sent again.
+    - A run is executed under a lease in the database. The lease is renewed while the run
+      progresses, and a periodic sweep picks up runs whose lease expired (the process running
+      them stopped) or that were never started, so runs resume after a restart and two
+      workers never execute the same run.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self.worker_id = uuid.uuid4().hex
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._key_semaphores: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def start(self, run_id: int) -> None:
+        """Starts executing a run in the background (no-op if this process is already running it)."""
+        if run_id in self._tasks:
+            return
+        task = asyncio.create_task(self._execute(run_id))
+        self._tasks[run_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(run_id, None))
+
+    def is_running(self, run_id: int) -> bool:
+        return run_id in self._tasks
+
+    def abort(self, run_id: int) -> None:
+        """Stops executing a run in this process right away (other workers notice on their next lease renewal)."""
+        task = self._tasks.get(run_id)
+        if task is not None:
+            task.cancel()
+
+    def start_resume_sweeper(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def resume_pending_runs(self) -> List[int]:
+        """Starts every active run nobody holds a live lease on. Returns their ids."""
+        run_ids = await self._db(crud_batch_runs.get_resumable_batch_run_ids)
+        for run_id in run_ids:
+            self.start(run_id)
+        return run_ids
+
+    async def stop(self) -> None:
+        """Stops the sweeper and abandons in-flight runs; their leases expire and another process resumes them."""
+        tasks = list(self._tasks.values()) + ([self._sweeper] if self._sweeper else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._sweeper = None
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            try:
+                await self.resume_pending_runs()
+            except Exception as e:
+                print(f"Warning: batch run resume sweep failed: {e}")
+            await asyncio.sleep(settings.BATCH_RUN_RESUME_INTERVAL_SECONDS)
+
+    async def _db(self, fn, *args):
+        """Runs a crud function with its own session (concurrent row tasks can't share one AsyncSession)."""
+        async with self._session_factory() as db:
+            return await fn(db, *args)
+
+    def _semaphore(self, provider: str, api_key: str) -> asyncio.Semaphore:
+        key = (provider, hashlib.sha256(api_key.encode()).hexdigest())
+        semaphore = self._key_semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._key_semaphores[key] = asyncio.Semaphore(settings.BATCH_RUN_CONCURRENCY_PER_KEY)
+        return semaphore
+
+    async def _execute(self, run_id: int) -> None:
+        lease = settings.BATCH_RUN_LEASE_SECONDS
+        run = await self._db(crud_batch_runs.claim_batch_run, run_id, self.worker_id, lease)
+        if run is None:
+            return # Finished, cancelled, or another worker holds it
+        print(f"DEBUG: Executing batch run {run_id} as worker {self.worker_id}")
+
+        api_key = await self._db(crud_api_keys.get_decrypted_api_key, run["user_id"], run["llm_provider"])
+        if not api_key:
+            await self._db(crud_batch_runs.finish_batch_run, run_id, self.worker_id, "failed", "API_KEY_NOT_CONFIGURED")
+            return
+
+        pending = await self._db(crud_batch_runs.get_pending_batch_run_rows, run_id)
+        semaphore = self._semaphore(run["llm_provider"], api_key)
+
+        async def evaluate(row_id: int, variables: Dict[str, Any]) -> None:
+            try:
+                prompt_text = render_template(run["prompt_text"], variables)
+            except KeyError as e:
+                await self._db(crud_batch_runs.record_batch_run_row_result, run_id, row_id, None, f"MISSING_VARIABLE:{e.args[0]}", 0)
+                return
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    output_text, error = await get_llm_response(run["llm_provider"], api_key, run["model_id"], prompt_text)
+                except Exception as e:
+                    output_text, error = None, f"UNEXPECTED_ERROR:{str(e)}"
+                latency_ms = int((time.perf_counter() - started) * 1000)
+            await self._db(crud_batch_runs.record_batch_run_row_result, run_id, row_id, output_text, error, latency_ms)
+
+        async def work(queue: asyncio.Queue) -> None:
+            while True:
+                try:
+                    row_id, variables = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await evaluate(row_id, variables)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in pending:
+            queue.put_nowait(item)
+        # The per-key semaphore bounds calls across runs; this just avoids one task per row.
+        workers = [
+            asyncio.create_task(work(queue))
+            for _ in range(min(len(pending), settings.BATCH_RUN_CONCURRENCY_PER_KEY))
+        ]
+        keeper = asyncio.create_task(self._keep_lease(run_id, workers))
+        try:
+            results = await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            keeper.cancel()
+            for worker in workers:
+                worker.cancel()
+
+        if any(isinstance(result, asyncio.CancelledError) for result in results):
+            print(f"DEBUG: Batch run {run_id} was cancelled or taken over, stopping")
+            return
+        failure = next((result for result in results if isinstance(result, Exception)), None)
+        if failure is not None:
+            print(f"Error executing batch run {run_id}: {failure}")
+            await self._db(crud_batch_runs.finish_batch_run, run_id, self.worker_id, "failed", f"RUNNER_ERROR:{failure}")
+            return
+        await self._db(crud_batch_runs.finish_batch_run, run_id, self.worker_id, "completed")
+        print(f"DEBUG: Batch run {run_id} completed")
+
+    async def _keep_lease(self, run_id: int, workers: List[asyncio.Task]) -> None:
+        lease = settings.BATCH_RUN_LEASE_SECONDS
+        while True:
+            await asyncio.sleep(lease / 3)
+            if not await self._db(crud_batch_runs.renew_batch_run_lease, run_id, self.worker_id, lease):
+                for worker in workers: # Cancelled by the user, or our lease lapsed and someone else took over
+                    worker.cancel()
+                return
+
+
+batch_runner = BatchRunner()
@@ -0,0 +1,169 @@
+# backend/src/cache_utils.py
+# Small in-process caching primitives shared by the auth, user and LLM layers.
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe, bounded LRU cache where every entry carries its own expiry time.
+
+    Expiry times are absolute wall-clock timestamps (``time.time()``), so callers can
+    pin an entry to an externally defined deadline such as a JWT's ``exp`` claim.
+    A ``maxsize`` of 0 disables the cache: every ``set`` is a no-op.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        default_ttl: Optional[float] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._on_evict = on_evict
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value for ``key``, or ``default`` if missing or expired."""
+        evicted = None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self.misses += 1
+                self.evictions += 1
+                evicted = (key, value)
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+        self._notify_evicted([evicted])
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None) -> None:
+        """
+        Stores ``value`` under ``key``.
+        ``expires_at`` wins over ``ttl``, which wins over the cache's ``default_ttl``.
+        """
+        if self.maxsize <= 0:
+            return
+        if expires_at is None:
+            ttl = ttl if ttl is not None else self.default_ttl
+            expires_at = self._clock() + ttl if ttl is not None else None
+
+        evicted = []
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None and previous[0] is not value:
+                evicted.append((key, previous[0]))
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.maxsize:
+                old_key, (old_value, _) = self._data.popitem(last=False)
+                self.evictions += 1
+                evicted.append((old_key, old_value))
+        self._notify_evicted(evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Removes ``key`` and returns its value (expired or not), or ``default``."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self._notify_evicted([(key, entry[0])])
+        return entry[0]
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Returns a snapshot of the unexpired entries, least recently used first (doesn't count as use)."""
+        now = self._clock()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at) in self._data.items() if expires_at is None or expires_at > now]
+
+    def clear(self) -> None:
+        """Drops every entry."""
+        with self._lock:
+            evicted = [(key, value) for key, (value, _) in self._data.items()]
+            self._data.clear()
+        self._notify_evicted(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns counters suitable for a metrics endpoint."""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _notify_evicted(self, evicted) -> None:
+        if not self._on_evict:
+            return
+        for item in evicted:
+            if item is not None:
+                self._on_evict(*item)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls that share a key into one in-flight call.
+    The first caller starts ``fn()``; everyone who arrives before it finishes awaits
+    the same result (or exception). Cancelling one waiter doesn't cancel the call.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        future = self._inflight.get(key)
+        return future is not None and not future.done()
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> "asyncio.Future[Any]":
+        """Returns the in-flight future for ``key``, starting ``fn()`` if there is none."""
+        loop = asyncio.get_running_loop()
+        future = self._inflight.get(key)
+        # A future left over from another (closed) event loop can't be awaited here.
+        if future is not None and not future.done() and future.get_loop() is loop:
+            self.coalesced += 1
+            return future
+
+        self.calls += 1
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = future
+
+        def _forget(done: "asyncio.Future[Any]") -> None:
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+            if not done.cancelled():
+                done.exception() # Mark retrieved so unawaited background calls don't warn
+
+        future.add_done_callback(_forget)
+        return future
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs ``fn()`` unless a call for ``key`` is already in flight, then awaits it."""
+        return await asyncio.shield(self.start(key, fn))
+
+    def stats(self) -> Dict[str, int]:
+        """Returns counters suitable for a metrics endpoint."""
+        return {"in_flight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
@@ -12,10 +12,116 @@ load_dotenv(dotenv_path=env_path)
 class Settings:
     # GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "") # Removed, no longer used by playground
     FERNET_KEY: str = os.getenv("FERNET_KEY", "") # Key for encrypting/decrypting user API keys
+    # Comma-separated keys that were FERNET_KEY before a rotation: still accepted for decryption until
+    # scripts/rotate_fernet_key.py has re-encrypted every stored key with the current one.
+    FERNET_PREVIOUS_KEYS: list = [key.strip() for key in os.getenv("FERNET_PREVIOUS_KEYS", "").split(",") if key.strip()]
+    # In-process cache of decrypted user API keys per (user, provider). Writes in this process
+    # invalidate it; the TTL bounds how long other workers keep using a changed or deleted key.
+    API_KEY_CACHE_SIZE: int = int(os.getenv("API_KEY_CACHE_SIZE", "1024"))
+    API_KEY_CACHE_TTL_SECONDS: int = int(os.getenv("API_KEY_CACHE_TTL_SECONDS", "60"))
     
     # Auth0 settings
     AUTH0_DOMAIN: str = os.getenv("AUTH0_DOMAIN", "")
     AUTH0_API_AUDIENCE: str = os.getenv("AUTH0_API_AUDIENCE", "")
+    # Verified-token cache: max number of cached payloads (0 disables) and an upper bound
+    # on how long a payload is trusted, even if the token's own 'exp' is further out.
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "2048"))
+    AUTH_TOKEN_CACHE_MAX_TTL_SECONDS: int = int(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL_SECONDS", "900"))
+    # JWKS fetching. AUTH0_JWKS_URL overrides the URL derived from AUTH0_DOMAIN (e.g. a local stand-in).
+    AUTH0_JWKS_URL: str = os.getenv("AUTH0_JWKS_URL", "")
+    AUTH_JWKS_TTL_SECONDS: int = int(os.getenv("AUTH_JWKS_TTL_SECONDS", "600"))
+    AUTH_JWKS_REFRESH_AHEAD_SECONDS: int = int(os.getenv("AUTH_JWKS_REFRESH_AHEAD_SECONDS", "60"))
+    AUTH_JWKS_MIN_REFRESH_INTERVAL_SECONDS: int = int(os.getenv("AUTH_JWKS_MIN_REFRESH_INTERVAL_SECONDS", "30"))
+    AUTH_JWKS_UNKNOWN_KID_TTL_SECONDS: int = int(os.getenv("AUTH_JWKS_UNKNOWN_KID_TTL_SECONDS", "300"))
+    AUTH_JWKS_FETCH_TIMEOUT_SECONDS: float = float(os.getenv("AUTH_JWKS_FETCH_TIMEOUT_SECONDS", "5"))
+    # In-process cache of auth0_id -> User used by the get_current_user dependency.
+    # Writes in this process invalidate it; the TTL bounds staleness across workers.
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "4096"))
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+    # LLM provider clients. SDK clients are pooled per (provider, API key) and dropped after
+    # sitting idle; all clients of a provider share one HTTP connection pool with these limits.
+    LLM_CLIENT_POOL_SIZE: int = int(os.getenv("LLM_CLIENT_POOL_SIZE", "256"))
+    LLM_CLIENT_IDLE_TTL_SECONDS: int = int(os.getenv("LLM_CLIENT_IDLE_TTL_SECONDS", "300"))
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    LLM_HTTP_TIMEOUT_SECONDS: float = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "120"))
+    # The OpenAI and Anthropic SDKs read OPENAI_BASE_URL / ANTHROPIC_BASE_URL themselves; google-genai doesn't.
+    GEMINI_BASE_URL: str = os.getenv("GEMINI_BASE_URL", "")
+    # Outbound LLM rate limiting per (provider, API key): requests and tokens per minute and calls in
+    # flight (0 = no limit; set them to the key's quota), how long a call may queue before it fails,
+    # and how often a provider 429 is retried after its retry-after.
+    LLM_RATE_LIMITS: dict = {
+        provider: {
+            "rpm": int(os.getenv(f"{provider.upper()}_REQUESTS_PER_MINUTE", rpm)),
+            "tpm": int(os.getenv(f"{provider.upper()}_TOKENS_PER_MINUTE", "0")),
+            "concurrency": int(os.getenv(f"{provider.upper()}_MAX_CONCURRENT_REQUESTS", "8")),
+        }
+        for provider, rpm in (("openai", "500"), ("anthropic", "50"), ("gemini", "60"))
+    }
+    LLM_RATE_LIMIT_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_RATE_LIMIT_QUEUE_TIMEOUT_SECONDS", "30"))
+    LLM_RATE_LIMIT_MAX_RETRIES: int = int(os.getenv("LLM_RATE_LIMIT_MAX_RETRIES", "2"))
+    # Resilience of LLM calls: timeout per attempt and for the whole call including retries, retries
+    # of transient errors (timeouts, connection errors, 5xx) with jittered exponential backoff, the
+    # per-model circuit breaker, and hedging (a second request once an attempt exceeds the model's p95).
+    LLM_ATTEMPT_TIMEOUT_SECONDS: float = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "60"))
+    LLM_CALL_DEADLINE_SECONDS: float = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "120"))
+    LLM_RETRY_MAX_RETRIES: int = int(os.getenv("LLM_RETRY_MAX_RETRIES", "2"))
+    LLM_RETRY_BACKOFF_BASE_SECONDS: float = float(os.getenv("LLM_RETRY_BACKOFF_BASE_SECONDS", "0.5"))
+    LLM_RETRY_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_RETRY_BACKOFF_MAX_SECONDS", "8"))
+    LLM_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+    LLM_BREAKER_RESET_SECONDS: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    # Registers the offline `mock` provider (src/mock_llm.py) for load tests. Keep it off in production.
+    LLM_MOCK_PROVIDER_ENABLED: bool = os.getenv("LLM_MOCK_PROVIDER_ENABLED", "false").lower() in ("1", "true", "yes")
+    # Streaming playground: events buffered ahead of a slow client before the upstream call is
+    # paused, and how often an idle stream sends a keep-alive comment.
+    PLAYGROUND_STREAM_BUFFER_SIZE: int = int(os.getenv("PLAYGROUND_STREAM_BUFFER_SIZE", "64"))
+    PLAYGROUND_STREAM_HEARTBEAT_SECONDS: float = float(os.getenv("PLAYGROUND_STREAM_HEARTBEAT_SECONDS", "15"))
+    # /playground/compare: max models per request, and the (upper bound of the) per-model timeout
+    PLAYGROUND_COMPARE_MAX_TARGETS: int = int(os.getenv("PLAYGROUND_COMPARE_MAX_TARGETS", "6"))
+    PLAYGROUND_COMPARE_TIMEOUT_SECONDS: float = float(os.getenv("PLAYGROUND_COMPARE_TIMEOUT_SECONDS", "60"))
+
+    # Playground response cache (requests opt in with use_cache). LLM_RESPONSE_CACHE_SQL adds a
+    # database tier shared by all workers behind the in-process LRU.
+    LLM_RESPONSE_CACHE_SIZE: int = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", "1024"))
+    LLM_RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_RESPONSE_CACHE_TTL_SECONDS", "3600"))
+    LLM_RESPONSE_CACHE_SQL: bool = os.getenv("LLM_RESPONSE_CACHE_SQL", "false").lower() in ("1", "true", "yes")
+
+    # Batch runs: dataset size limit, LLM calls in flight per (provider, API key), and the lease a
+    # process holds on a run it executes. Runs whose lease lapsed are resumed by the periodic sweep.
+    BATCH_RUN_MAX_ROWS: int = int(os.getenv("BATCH_RUN_MAX_ROWS", "1000"))
+    BATCH_RUN_CONCURRENCY_PER_KEY: int = int(os.getenv("BATCH_RUN_CONCURRENCY_PER_KEY", "4"))
+    BATCH_RUN_LEASE_SECONDS: float = float(os.getenv("BATCH_RUN_LEASE_SECONDS", "60"))
+    BATCH_RUN_RESUME_INTERVAL_SECONDS: float = float(os.getenv("BATCH_RUN_RESUME_INTERVAL_SECONDS", "30"))
+
+    # GET /metrics (per-worker cache, pool and limiter counters) answers only requests that send
+    # this value in the X-Metrics-Token header. Unset, the endpoint responds 404.
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+
+    # Database connection pool (per engine; the async engine serves requests, the sync one scripts).
+    # Neon closes idle connections, so pooled ones are recycled before that and pinged on checkout.
+    # DB_STATEMENT_TIMEOUT_MS (0 = none) is sent as a startup parameter, which transaction-mode
+    # poolers don't forward: behind one, set it on the role (ALTER ROLE ... SET statement_timeout).
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "240"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    DB_CONNECT_TIMEOUT_SECONDS: int = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "10"))
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+    # DATABASE_URL points at a transaction-mode pooler (PgBouncer, Neon's "-pooler" endpoint):
+    # server-side prepared statements are disabled. "auto" detects Neon pooler hostnames.
+    DB_TRANSACTION_POOLER: str = os.getenv("DB_TRANSACTION_POOLER", "auto").lower()
+    # Optional read replica for read-only endpoints (get_read_db). It's used while its replay lag,
+    # checked every DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS, is within DB_REPLICA_MAX_LAG_SECONDS, and
+    # never for a user who committed a write in this process in the last DB_READ_YOUR_WRITES_SECONDS.
+    DATABASE_REPLICA_URL: str = os.getenv("DATABASE_REPLICA_URL", "")
+    DB_REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "2"))
+    DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL_SECONDS", "5"))
+    DB_READ_YOUR_WRITES_SECONDS: float = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
 
     # Stripe settings
     STRIPE_PUBLISHABLE_KEY: str = os.getenv("STRIPE_PUBLISHABLE_KEY", "")
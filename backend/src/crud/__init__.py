@@ -1,4 +1,6 @@
 # This file makes Python treat the directory 'crud' as a package.
+# CRUD functions are async and take an AsyncSession (database.get_db / AsyncSessionLocal);
+# the key rotation helpers in crud_api_keys are the exception and take a sync Session.
 
 from .crud_api_keys import (
     create_user_api_key,
@@ -6,6 +8,7 @@ from .crud_api_keys import (
     get_decrypted_api_key,
     update_user_api_key,
     delete_user_api_key,
+    invalidate_cached_api_key,
     _get_fernet_instance, # Exposing for potential direct use or testing if needed
     _mask_api_key # Exposing for potential direct use or testing if needed
 )
@@ -14,26 +17,43 @@ from .crud_prompts import (
     get_next_prompt_id_db,
     get_next_version_id_db,
     get_current_date_str,
+    encode_cursor,
+    decode_cursor,
     _map_prompt_db_to_schema,
+    _map_prompt_summary_row_to_schema,
+    _map_version_db_to_schema,
     get_prompt_by_prompt_id,
     get_prompts,
+    get_prompt_summaries,
     create_db_prompt,
     delete_db_prompt,
     update_db_prompt,
+    get_prompt_versions,
     create_db_version,
     update_db_version_notes,
     add_db_tag,
     remove_db_tag
 )
 
+from .crud_batch_runs import (
+    create_batch_run,
+    get_batch_run,
+    get_batch_runs_for_version,
+    get_batch_run_rows,
+    cancel_batch_run
+)
+
 from .crud_users import (
     get_user_by_auth0_id,
     get_user_by_user_id,
+    get_user_by_email,
     create_user,
     update_user_subscription,
     get_user_by_stripe_customer_id,
     get_user_tier_and_status,
     get_or_create_user_from_auth0,
+    get_cached_user_from_auth0,
+    invalidate_cached_user,
     count_user_prompts,
     count_prompt_versions
 )
@@ -45,6 +65,7 @@ __all__ = [
     "get_decrypted_api_key",
     "update_user_api_key",
     "delete_user_api_key",
+    "invalidate_cached_api_key",
     "_get_fernet_instance",
     "_mask_api_key",
 
@@ -52,25 +73,41 @@ __all__ = [
     "get_next_prompt_id_db",
     "get_next_version_id_db",
     "get_current_date_str",
+    "encode_cursor",
+    "decode_cursor",
     "_map_prompt_db_to_schema",
+    "_map_prompt_summary_row_to_schema",
+    "_map_version_db_to_schema",
     "get_prompt_by_prompt_id",
     "get_prompts",
+    "get_prompt_summaries",
     "create_db_prompt",
     "delete_db_prompt",
     "update_db_prompt",
+    "get_prompt_versions",
     "create_db_version",
     "update_db_version_notes",
     "add_db_tag",
     "remove_db_tag",
 
+    # Batch run CRUD functions
+    "create_batch_run",
+    "get_batch_run",
+    "get_batch_runs_for_version",
+    "get_batch_run_rows",
+    "cancel_batch_run",
+
     # User CRUD functions
     "get_user_by_auth0_id",
     "get_user_by_user_id",
+    "get_user_by_email",
     "create_user",
     "update_user_subscription",
     "get_user_by_stripe_customer_id",
     "get_user_tier_and_status",
     "get_or_create_user_from_auth0",
+    "get_cached_user_from_auth0",
+    "invalidate_cached_user",
     "count_user_prompts",
     "count_prompt_versions",
 ] 
\ No newline at end of file
@@ -1,14 +1,48 @@
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from cryptography.fernet import Fernet
+from sqlalchemy import select, update
+from cryptography.fernet import Fernet, MultiFernet
+from functools import lru_cache
+from typing import Iterator, List, Tuple
 import datetime
+import threading
 
 from src.models import UserApiKeyDB
 from src.config import settings
+from src.cache_utils import TTLCache
 
-def _get_fernet_instance():
+# Serializes wiping with reading, so a reader never decodes a key that's being wiped under it.
+# Re-entrant because a read can expire (and so wipe) the entry it's looking up.
+_wipe_lock = threading.RLock()
+
+def _wipe_cached_key(cache_key, key_bytes: bytearray) -> None:
+    with _wipe_lock:
+        key_bytes[:] = b"\0" * len(key_bytes) # Overwrite the cached plaintext once it leaves the cache
+
+# (user_id, provider) -> decrypted API key, held as a bytearray so eviction can wipe it. Writes
+# below invalidate their entry; the short TTL bounds staleness after writes in other workers.
+_decrypted_key_cache = TTLCache(
+    maxsize=settings.API_KEY_CACHE_SIZE,
+    default_ttl=settings.API_KEY_CACHE_TTL_SECONDS,
+    on_evict=_wipe_cached_key,
+)
+
+@lru_cache(maxsize=4)
+def _fernet_for_keys(fernet_keys: Tuple[str, ...]) -> MultiFernet:
+    return MultiFernet([Fernet(key.encode()) for key in fernet_keys]) # Ensure keys are bytes
+
+def _fernet_keys() -> Tuple[str, ...]:
+    """FERNET_KEY (used to encrypt) followed by FERNET_PREVIOUS_KEYS (still accepted when decrypting)."""
     if not settings.FERNET_KEY:
         raise ValueError("FERNET_KEY is not configured. Cannot perform encryption/decryption.")
-    return Fernet(settings.FERNET_KEY.encode()) # Ensure key is bytes
+    return (settings.FERNET_KEY, *settings.FERNET_PREVIOUS_KEYS)
+
+def _get_fernet_instance():
+    return _fernet_for_keys(_fernet_keys()) # Built once per key set rather than on every call
+
+def invalidate_cached_api_key(user_id: int, llm_provider: str) -> None:
+    """Drop (and wipe) a cached decrypted key after it changes."""
+    _decrypted_key_cache.pop((user_id, llm_provider.lower()))
 
 def _mask_api_key(api_key: str) -> str:
     """Masks an API key, showing only the first few and last few characters."""
@@ -16,7 +50,7 @@ def _mask_api_key(api_key: str) -> str:
         return api_key[:1] + "****" + api_key[-1:] if len(api_key) > 2 else "******"
     return f"{api_key[:4]}...{api_key[-4:]}"
 
-def create_user_api_key(db: Session, user_id: str, llm_provider: str, api_key_plain: str) -> UserApiKeyDB:
+async def create_user_api_key(db: AsyncSession, user_id: str, llm_provider: str, api_key_plain: str) -> UserApiKeyDB:
     """
     Creates a new API key entry for a user, encrypting the key before storage.
     Returns the database object.
@@ -33,72 +67,120 @@ def create_user_api_key(db: Session, user_id: str, llm_provider: str, api_key_pl
         # created_at and updated_at are handled by server_default
     )
     db.add(db_api_key)
-    db.commit()
-    db.refresh(db_api_key)
+    await db.commit()
+    await db.refresh(db_api_key)
+    invalidate_cached_api_key(user_id, llm_provider)
     return db_api_key
 
-def get_user_api_keys(db: Session, user_id: str) -> list[UserApiKeyDB]:
+async def _get_user_api_key_row(db: AsyncSession, user_id: str, llm_provider: str) -> UserApiKeyDB | None:
+    return (await db.execute(
+        select(UserApiKeyDB).
+        where(UserApiKeyDB.user_id == user_id, UserApiKeyDB.llm_provider == llm_provider.lower())
+    )).scalars().first()
+
+async def get_user_api_keys(db: AsyncSession, user_id: str) -> list[UserApiKeyDB]:
     """
     Retrieves all API key entries for a given user.
     The returned objects will contain the masked_api_key, not the encrypted one directly for list views.
     """
-    return db.query(UserApiKeyDB).filter(UserApiKeyDB.user_id == user_id).all()
+    return list((await db.execute(select(UserApiKeyDB).where(UserApiKeyDB.user_id == user_id))).scalars())
 
-def get_decrypted_api_key(db: Session, user_id: str, llm_provider: str) -> str | None:
+async def get_decrypted_api_key(db: AsyncSession, user_id: str, llm_provider: str) -> str | None:
     """
     Retrieves and decrypts a specific API key for a user and provider.
     Returns the plain text API key or None if not found.
+    Hits are served from memory for up to API_KEY_CACHE_TTL_SECONDS without touching the DB or Fernet.
     """
-    db_api_key = db.query(UserApiKeyDB).filter(
-        UserApiKeyDB.user_id == user_id,
-        UserApiKeyDB.llm_provider == llm_provider.lower()
-    ).first()
+    cache_key = (user_id, llm_provider.lower())
+    with _wipe_lock:
+        cached = _decrypted_key_cache.get(cache_key)
+        if cached is not None:
+            return cached.decode()
+
+    db_api_key = await _get_user_api_key_row(db, user_id, llm_provider)
 
     if db_api_key:
         fernet = _get_fernet_instance()
-        decrypted_key = fernet.decrypt(db_api_key.encrypted_api_key).decode()
+        key_bytes = bytearray(fernet.decrypt(db_api_key.encrypted_api_key))
+        decrypted_key = key_bytes.decode()
+        _decrypted_key_cache.set(cache_key, key_bytes)
         return decrypted_key
     return None
 
-def update_user_api_key(db: Session, user_id: str, llm_provider: str, new_api_key_plain: str) -> UserApiKeyDB | None:
+async def update_user_api_key(db: AsyncSession, user_id: str, llm_provider: str, new_api_key_plain: str) -> UserApiKeyDB | None:
     """
     Updates an existing API key for a user and provider.
     Encrypts the new key before storage.
     Returns the updated database object or None if not found.
     """
-    db_api_key = db.query(UserApiKeyDB).filter(
-        UserApiKeyDB.user_id == user_id,
-        UserApiKeyDB.llm_provider == llm_provider.lower()
-    ).first()
+    db_api_key = await _get_user_api_key_row(db, user_id, llm_provider)
 
     if db_api_key:
         fernet = _get_fernet_instance()
         db_api_key.encrypted_api_key = fernet.encrypt(new_api_key_plain.encode())
         db_api_key.masked_api_key = _mask_api_key(new_api_key_plain)
         db_api_key.updated_at = datetime.datetime.now(datetime.timezone.utc) # Explicitly set timestamp
-        db.commit()
-        db.refresh(db_api_key)
+        await db.commit()
+        await db.refresh(db_api_key)
+        invalidate_cached_api_key(user_id, llm_provider)
         return db_api_key
     return None
 
-def delete_user_api_key(db: Session, user_id: str, llm_provider_or_key_id: str | int) -> bool:
+async def delete_user_api_key(db: AsyncSession, user_id: str, llm_provider_or_key_id: str | int) -> bool:
     """
     Deletes an API key for a user, identified by llm_provider (str) or the key's database ID (int).
     Returns True if deletion was successful, False otherwise.
     """
-    query = db.query(UserApiKeyDB).filter(UserApiKeyDB.user_id == user_id)
+    query = select(UserApiKeyDB).where(UserApiKeyDB.user_id == user_id)
     
     if isinstance(llm_provider_or_key_id, int):
         # If it's an integer, assume it's the ID
-        db_api_key = query.filter(UserApiKeyDB.id == llm_provider_or_key_id).first()
+        query = query.where(UserApiKeyDB.id == llm_provider_or_key_id)
     elif isinstance(llm_provider_or_key_id, str):
         # If it's a string, assume it's the llm_provider
-        db_api_key = query.filter(UserApiKeyDB.llm_provider == llm_provider_or_key_id.lower()).first()
+        query = query.where(UserApiKeyDB.llm_provider == llm_provider_or_key_id.lower())
     else:
         return False # Invalid type for identifier
+    db_api_key = (await db.execute(query)).scalars().first()
 
     if db_api_key:
-        db.delete(db_api_key)
-        db.commit()
+        llm_provider = db_api_key.llm_provider
+        await db.delete(db_api_key)
+        await db.commit()
+        invalidate_cached_api_key(user_id, llm_provider)
         return True
-    return False 
\ No newline at end of file
+    return False
+
+# --- Key rotation (sync: run by scripts/rotate_fernet_key.py with database.SessionLocal) ---
+
+def stream_encrypted_api_keys(db: Session, after_id: int = 0, chunk_size: int = 500) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yields (id, encrypted_api_key) for every stored key with id > after_id, in id order, fetched
+    chunk_size rows at a time through a server-side cursor (for the key rotation job).
+    """
+    result = db.execute(
+        select(UserApiKeyDB.id, UserApiKeyDB.encrypted_api_key).
+        where(UserApiKeyDB.id > after_id).
+        order_by(UserApiKeyDB.id).
+        execution_options(yield_per=chunk_size)
+    )
+    for row_id, encrypted_api_key in result:
+        yield row_id, bytes(encrypted_api_key)
+
+def store_rotated_api_keys(db: Session, rotated: List[Tuple[int, bytes, bytes]]) -> int:
+    """
+    Writes re-encrypted keys given as (id, old_ciphertext, new_ciphertext) in one short transaction.
+    A row is only overwritten if it still holds old_ciphertext, so a key the user changed meanwhile wins.
+    Returns how many rows were updated. The plaintext doesn't change, so cached keys stay valid.
+    """
+    updated = 0
+    for row_id, old_token, new_token in rotated:
+        result = db.execute(
+            update(UserApiKeyDB).
+            where(UserApiKeyDB.id == row_id, UserApiKeyDB.encrypted_api_key == old_token).
+            values(encrypted_api_key=new_token).
+            execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+    db.commit()
+    return updated
@@ -0,0 +1,284 @@
+# backend/src/crud/crud_batch_runs.py
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, insert, func, or_
+from typing import List, Optional, Dict, Any, Tuple
+import datetime
+
+from src import models
+from src import schemas
+from src.crud.crud_prompts import encode_cursor, decode_cursor
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def _map_batch_run_to_schema(run: models.BatchRunDB, prompt_id: str, version_id: str) -> schemas.BatchRun:
+    return schemas.BatchRun(
+        id=run.id,
+        prompt_id=prompt_id,
+        version_id=version_id,
+        llm_provider=run.llm_provider,
+        model_id=run.model_id,
+        status=run.status,
+        error=run.error,
+        total_rows=run.total_rows,
+        completed_rows=run.completed_rows,
+        failed_rows=run.failed_rows,
+        created_at=run.created_at,
+        started_at=run.started_at,
+        finished_at=run.finished_at
+    )
+
+
+def _batch_run_query():
+    # Every read returns the run together with the prompt_id/version_id strings it was created for
+    return select(models.BatchRunDB, models.PromptDB.prompt_id, models.PromptVersionDB.version_id_str).\
+        join(models.PromptVersionDB, models.PromptVersionDB.id == models.BatchRunDB.prompt_version_id).\
+        join(models.PromptDB, models.PromptDB.id == models.PromptVersionDB.prompt_id)
+
+
+async def create_batch_run(
+    db: AsyncSession,
+    user_id: int,
+    prompt_id: str,
+    version_id: str,
+    llm_provider: str,
+    model_id: str,
+    rows: List[Dict[str, Any]]
+) -> Optional[schemas.BatchRun]:
+    """Creates a pending batch run and its rows for one of the user's prompt versions. None if the version doesn't exist."""
+    version_pk = (await db.execute(
+        select(models.PromptVersionDB.id).
+        join(models.PromptDB, models.PromptDB.id == models.PromptVersionDB.prompt_id).
+        where(
+            models.PromptDB.prompt_id == prompt_id,
+            models.PromptDB.user_id == user_id,
+            models.PromptVersionDB.version_id_str == version_id
+        )
+    )).scalar()
+    if version_pk is None:
+        return None
+
+    db_run = models.BatchRunDB(
+        user_id=user_id,
+        prompt_version_id=version_pk,
+        llm_provider=llm_provider.lower(),
+        model_id=model_id,
+        status="pending",
+        total_rows=len(rows),
+        completed_rows=0,
+        failed_rows=0
+    )
+    db.add(db_run)
+    await db.flush()
+    if rows:
+        # executemany, so a few hundred rows don't turn into a few hundred ORM objects
+        await db.execute(
+            insert(models.BatchRunRowDB),
+            [
+                {"batch_run_id": db_run.id, "row_index": index, "variables": variables, "status": "pending"}
+                for index, variables in enumerate(rows)
+            ]
+        )
+    await db.commit()
+    await db.refresh(db_run)
+    return _map_batch_run_to_schema(db_run, prompt_id, version_id)
+
+
+async def get_batch_run(db: AsyncSession, run_id: int, user_id: int) -> Optional[schemas.BatchRun]:
+    row = (await db.execute(
+        _batch_run_query().
+        where(models.BatchRunDB.id == run_id, models.BatchRunDB.user_id == user_id).
+        execution_options(populate_existing=True) # Commits don't expire loaded runs (expire_on_commit=False); read current values
+    )).first()
+    return _map_batch_run_to_schema(*row) if row else None
+
+
+async def get_batch_runs_for_version(db: AsyncSession, prompt_id: str, version_id: str, user_id: int) -> List[schemas.BatchRun]:
+    """Lists the batch runs of one prompt version, newest first."""
+    rows = (await db.execute(
+        _batch_run_query().
+        where(
+            models.PromptDB.prompt_id == prompt_id,
+            models.PromptDB.user_id == user_id,
+            models.PromptVersionDB.version_id_str == version_id
+        ).
+        order_by(models.BatchRunDB.id.desc())
+    )).all()
+    return [_map_batch_run_to_schema(*row) for row in rows]
+
+
+async def get_batch_run_rows(
+    db: AsyncSession, run_id: int, user_id: int, limit: int = 100, cursor: Optional[str] = None
+) -> Optional[Tuple[List[models.BatchRunRowDB], Optional[str]]]:
+    """
+    Retrieves one page of a run's rows in dataset order, using keyset pagination on row_index.
+    Returns (rows, next_cursor), or None if the run doesn't exist.
+    """
+    run_pk = (await db.execute(
+        select(models.BatchRunDB.id).
+        where(models.BatchRunDB.id == run_id, models.BatchRunDB.user_id == user_id)
+    )).scalar()
+    if run_pk is None:
+        return None
+
+    query = select(models.BatchRunRowDB).where(models.BatchRunRowDB.batch_run_id == run_pk)
+    if cursor:
+        query = query.where(models.BatchRunRowDB.row_index > decode_cursor(cursor, "row"))
+
+    rows = list((await db.execute(query.order_by(models.BatchRunRowDB.row_index).limit(limit + 1))).scalars())
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(row=rows[-1].row_index)
+    return rows, None
+
+
+async def cancel_batch_run(db: AsyncSession, run_id: int, user_id: int) -> Optional[schemas.BatchRun]:
+    """Marks a pending or running run cancelled. Returns the run (in whatever state it is), or None if not found."""
+    await db.execute(
+        update(models.BatchRunDB).
+        where(
+            models.BatchRunDB.id == run_id,
+            models.BatchRunDB.user_id == user_id,
+            models.BatchRunDB.status.in_(ACTIVE_STATUSES)
+        ).
+        values(status="cancelled", finished_at=func.now(), lease_owner=None, lease_expires_at=None).
+        execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return await get_batch_run(db, run_id, user_id)
+
+
+# --- Runner-side operations (see src/batch_runner.py) ---
+
+def _lease_is_free_or_ours(worker_id: str):
+    return or_(
+        models.BatchRunDB.lease_owner == worker_id,
+        models.BatchRunDB.lease_expires_at.is_(None),
+        models.BatchRunDB.lease_expires_at < func.now()
+    )
+
+
+async def claim_batch_run(db: AsyncSession, run_id: int, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+    """
+    Takes the lease on an active run whose lease is free or expired, and marks it running.
+    Returns what the runner needs to execute it, or None if the run is finished or owned by another worker.
+    """
+    claimed = (await db.execute(
+        update(models.BatchRunDB).
+        where(
+            models.BatchRunDB.id == run_id,
+            models.BatchRunDB.status.in_(ACTIVE_STATUSES),
+            _lease_is_free_or_ours(worker_id)
+        ).
+        values(
+            status="running",
+            lease_owner=worker_id,
+            lease_expires_at=func.now() + datetime.timedelta(seconds=lease_seconds),
+            started_at=func.coalesce(models.BatchRunDB.started_at, func.now())
+        ).
+        returning(
+            models.BatchRunDB.user_id,
+            models.BatchRunDB.llm_provider,
+            models.BatchRunDB.model_id,
+            models.BatchRunDB.prompt_version_id
+        ).
+        execution_options(synchronize_session=False)
+    )).first()
+    if claimed is None:
+        await db.rollback()
+        return None
+    version_text = (await db.execute(
+        select(models.PromptVersionDB.text).where(models.PromptVersionDB.id == claimed.prompt_version_id)
+    )).scalar()
+    await db.commit()
+    return {
+        "user_id": claimed.user_id,
+        "llm_provider": claimed.llm_provider,
+        "model_id": claimed.model_id,
+        "prompt_text": version_text
+    }
+
+
+async def renew_batch_run_lease(db: AsyncSession, run_id: int, worker_id: str, lease_seconds: float) -> bool:
+    """Extends our lease. False means the run was cancelled or taken over, and the worker should stop."""
+    result = await db.execute(
+        update(models.BatchRunDB).
+        where(
+            models.BatchRunDB.id == run_id,
+            models.BatchRunDB.status == "running",
+            models.BatchRunDB.lease_owner == worker_id
+        ).
+        values(lease_expires_at=func.now() + datetime.timedelta(seconds=lease_seconds)).
+        execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def get_pending_batch_run_rows(db: AsyncSession, run_id: int) -> List[Tuple[int, Dict[str, Any]]]:
+    """Returns (row id, variables) for every row still without a result, in dataset order."""
+    return [
+        (row.id, row.variables)
+        for row in await db.execute(
+            select(models.BatchRunRowDB.id, models.BatchRunRowDB.variables).
+            where(models.BatchRunRowDB.batch_run_id == run_id, models.BatchRunRowDB.status == "pending").
+            order_by(models.BatchRunRowDB.row_index)
+        )
+    ]
+
+
+async def record_batch_run_row_result(
+    db: AsyncSession, run_id: int, row_id: int, output_text: Optional[str], error: Optional[str], latency_ms: int
+) -> bool:
+    """
+    Stores one row's result and bumps the run's counters in the same transaction.
+    Only a still-pending row is written, so a row can't be counted twice after a takeover.
+    """
+    row_status = "failed" if error else "completed"
+    result = await db.execute(
+        update(models.BatchRunRowDB).
+        where(models.BatchRunRowDB.id == row_id, models.BatchRunRowDB.status == "pending").
+        values(status=row_status, output_text=output_text, error=error, latency_ms=latency_ms, completed_at=func.now()).
+        execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        return False
+    counter = models.BatchRunDB.failed_rows if error else models.BatchRunDB.completed_rows
+    await db.execute(
+        update(models.BatchRunDB).
+        where(models.BatchRunDB.id == run_id).
+        values({counter: counter + 1}).
+        execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return True
+
+
+async def finish_batch_run(db: AsyncSession, run_id: int, worker_id: str, status: str, error: Optional[str] = None) -> bool:
+    """Marks our running run completed or failed and releases the lease."""
+    result = await db.execute(
+        update(models.BatchRunDB).
+        where(
+            models.BatchRunDB.id == run_id,
+            models.BatchRunDB.status == "running",
+            models.BatchRunDB.lease_owner == worker_id
+        ).
+        values(status=status, error=error, finished_at=func.now(), lease_owner=None, lease_expires_at=None).
+        execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def get_resumable_batch_run_ids(db: AsyncSession) -> List[int]:
+    """Active runs nobody holds a live lease on: never started, or left behind by a stopped process."""
+    return list((await db.execute(
+        select(models.BatchRunDB.id).
+        where(
+            models.BatchRunDB.status.in_(ACTIVE_STATUSES),
+            or_(models.BatchRunDB.lease_expires_at.is_(None), models.BatchRunDB.lease_expires_at < func.now())
+        ).
+        order_by(models.BatchRunDB.id)
+    )).scalars())
@@ -0,0 +1,38 @@
+# backend/src/crud/crud_llm_cache.py
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Optional
+import datetime
+
+from src.models import LLMResponseCacheDB
+
+
+async def get_cached_llm_response(db: AsyncSession, cache_key: str) -> Optional[LLMResponseCacheDB]:
+    """Returns the unexpired cache entry for cache_key, or None."""
+    return (await db.execute(
+        select(LLMResponseCacheDB).
+        where(LLMResponseCacheDB.cache_key == cache_key, LLMResponseCacheDB.expires_at > func.now())
+    )).scalar_one_or_none()
+
+
+async def store_llm_response(db: AsyncSession, cache_key: str, llm_provider: str, model_id: str, output_text: str, ttl_seconds: float) -> None:
+    """Inserts or refreshes a cache entry."""
+    expires_at = func.now() + datetime.timedelta(seconds=ttl_seconds)
+    await db.execute(
+        pg_insert(LLMResponseCacheDB).
+        values(cache_key=cache_key, llm_provider=llm_provider, model_id=model_id, output_text=output_text, expires_at=expires_at).
+        on_conflict_do_update(
+            index_elements=["cache_key"],
+            set_={"output_text": output_text, "created_at": func.now(), "expires_at": expires_at}
+        )
+    )
+    await db.commit()
+
+
+async def delete_expired_llm_responses(db: AsyncSession) -> int:
+    """Removes expired entries; returns how many were deleted."""
+    result = await db.execute(delete(LLMResponseCacheDB).where(LLMResponseCacheDB.expires_at <= func.now()))
+    await db.commit()
+    return result.rowcount
@@ -1,50 +1,58 @@
 # backend/src/crud.py
 
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy import select, delete, update, func
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
 from src import models # SQLAlchemy models
 from src import schemas # Pydantic models
 import datetime
 import hashlib
+from functools import lru_cache
+import base64
+import json
 
 # --- Helper Functions ---
 
-def get_next_prompt_id_db(db: Session, user_id: int) -> str:
-    """Generates the next sequential prompt ID based on DB data for a specific user."""
-    # Create a short hash of user_id to make prompt IDs user-specific
-    user_hash = hashlib.md5(str(user_id).encode()).hexdigest()[:8]
-    
-    last_prompt = db.query(models.PromptDB).filter(models.PromptDB.user_id == user_id).order_by(models.PromptDB.id.desc()).first()
-    if not last_prompt or not last_prompt.prompt_id.startswith(f"prompt_{user_hash}_"):
-        return f"prompt_{user_hash}_1"
-    try:
-        # Extract the number from prompt_{user_hash}_{number}
-        prefix = f"prompt_{user_hash}_"
-        last_num = int(last_prompt.prompt_id[len(prefix):])
-        return f"prompt_{user_hash}_{last_num + 1}"
-    except ValueError:
-        return f"prompt_{user_hash}_{last_prompt.id + 1}"
+@lru_cache(maxsize=4096)
+def _user_prompt_prefix(user_id: int) -> str:
+    """Returns the user-specific prompt ID prefix, prompt_{short hash of user_id}_ (hashed once per user)."""
+    return f"prompt_{hashlib.md5(str(user_id).encode()).hexdigest()[:8]}_"
+
+async def get_next_prompt_id_db(db: AsyncSession, user_id: int) -> str:
+    """
+    Allocates the next sequential prompt ID for a user from userdb.next_prompt_number.
+    The UPDATE row-locks the user until the caller commits or rolls back, so concurrent
+    creates get distinct IDs and a rolled-back create doesn't burn a number.
+    """
+    prompt_number = (await db.execute(
+        update(models.User).
+        where(models.User.user_id == user_id).
+        values(next_prompt_number=models.User.next_prompt_number + 1).
+        returning(models.User.next_prompt_number - 1).
+        execution_options(synchronize_session=False)
+    )).scalar_one()
+    return f"{_user_prompt_prefix(user_id)}{prompt_number}"
 
 def get_next_version_id_db(prompt: models.PromptDB) -> str:
-    """Generates the next sequential version ID for a given prompt (e.g., v1, v2)."""
-    if not prompt.versions:
-        return "v1"
-    max_num = 0
-    for version_db in prompt.versions: # These are now PromptVersionDB instances
-        if hasattr(version_db, 'version_id_str') and version_db.version_id_str.startswith("v"):
-            try:
-                num = int(version_db.version_id_str[len("v"):])
-                if num > max_num:
-                    max_num = num
-            except ValueError:
-                continue
-        elif hasattr(version_db, 'version_number'): # Fallback or handling for just number if needed, though we aim for vN
-            if version_db.version_number > max_num:
-                 max_num = version_db.version_number
-
-    return f"v{max_num + 1}"
+    """Returns the version ID the next version of a prompt will get (e.g., v1, v2), from its stored counter."""
+    return f"v{prompt.next_version_number}"
+
+def encode_cursor(**position: Any) -> str:
+    """Encodes a keyset position (e.g. id=42) as an opaque, URL-safe pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, key: str) -> int:
+    """Decodes a cursor produced by encode_cursor and returns its integer ``key``. Raises ValueError if invalid."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode(padded.encode()))[key]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid pagination cursor") from e
+    if not isinstance(value, int):
+        raise ValueError("Invalid pagination cursor")
+    return value
 
 def get_current_date_str() -> str:
     """Returns the current date as a YYYY-MM-DD string."""
@@ -63,66 +71,138 @@ def _map_prompt_db_to_schema(prompt_db: models.PromptDB) -> schemas.Prompt:
         reverse=True
     )
     for version_db in sorted_db_versions: # These are PromptVersionDB instances
-        # Map SQLAlchemy PromptVersionDB to Pydantic Version schema
-        versions_dict[version_db.version_id_str] = schemas.Version(
-            id=version_db.id, # This is the integer PK
-            version_id=version_db.version_id_str, # This is the "vN" string
-            text=version_db.text,
-            notes=version_db.notes,
-            date=version_db.created_at.isoformat() if hasattr(version_db, 'created_at') and version_db.created_at else get_current_date_str(), # Use created_at, provide fallback
-            llm_provider=version_db.llm_provider if hasattr(version_db, 'llm_provider') else None,
-            model_id_used=version_db.model_id_used if hasattr(version_db, 'model_id_used') else None
-        )
+        versions_dict[version_db.version_id_str] = _map_version_db_to_schema(version_db)
     
-    # Map tags from list of dicts in DB to list of Pydantic Tag schemas
-    tags_list = [schemas.Tag(name=t.get("name"), color=t.get("color")) for t in prompt_db.tags if isinstance(t, dict) and "name" in t and "color" in t]
-
     return schemas.Prompt(
         id=prompt_db.prompt_id,
         title=prompt_db.title,
-        tags=tags_list,
+        tags=_map_tags(prompt_db.tags),
         versions=versions_dict,
         latest_version=prompt_db.latest_version
     )
 
+def _map_version_db_to_schema(version_db: models.PromptVersionDB) -> schemas.Version:
+    """Helper to map SQLAlchemy PromptVersionDB model to Pydantic Version schema."""
+    return schemas.Version(
+        id=version_db.id, # This is the integer PK
+        version_id=version_db.version_id_str, # This is the "vN" string
+        text=version_db.text,
+        notes=version_db.notes,
+        date=version_db.created_at.isoformat() if hasattr(version_db, 'created_at') and version_db.created_at else get_current_date_str(), # Use created_at, provide fallback
+        llm_provider=version_db.llm_provider if hasattr(version_db, 'llm_provider') else None,
+        model_id_used=version_db.model_id_used if hasattr(version_db, 'model_id_used') else None
+    )
+
+def _map_tags(tags: Optional[List[Any]]) -> List[schemas.Tag]:
+    """Map tags from list of dicts in DB to list of Pydantic Tag schemas."""
+    return [schemas.Tag(name=t.get("name"), color=t.get("color")) for t in tags or [] if isinstance(t, dict) and "name" in t and "color" in t]
+
+def _map_prompt_summary_row_to_schema(row: Any) -> schemas.PromptSummary:
+    """Helper to map a get_prompt_summaries row to the Pydantic PromptSummary schema."""
+    return schemas.PromptSummary(
+        id=row.prompt_id,
+        title=row.title,
+        tags=_map_tags(row.tags),
+        latest_version=row.latest_version,
+        version_count=row.version_count,
+        updated_at=row.updated_at
+    )
+
 # --- Prompt CRUD ---
 
-def get_prompt_by_prompt_id(db: Session, prompt_id: str, user_id: int) -> Optional[models.PromptDB]:
+async def get_prompt_by_prompt_id(db: AsyncSession, prompt_id: str, user_id: int) -> Optional[models.PromptDB]:
     """Retrieves a prompt by its string ID for a specific user, with versions eagerly loaded."""
-    return db.query(models.PromptDB).\
-        options(joinedload(models.PromptDB.versions)).\
-        filter(models.PromptDB.prompt_id == prompt_id, models.PromptDB.user_id == user_id).\
-        first()
-
-def get_prompts(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[models.PromptDB]:
-    """Retrieves a list of prompts for a specific user with pagination, with versions eagerly loaded."""
-    return db.query(models.PromptDB).\
-        options(joinedload(models.PromptDB.versions)).\
-        filter(models.PromptDB.user_id == user_id).\
-        order_by(models.PromptDB.id).\
-        offset(skip).\
-        limit(limit).\
-        all()
-
-def create_db_prompt(db: Session, prompt_data: schemas.PromptCreate, user_id: int) -> models.PromptDB:
+    return (await db.execute(
+        select(models.PromptDB).
+        options(joinedload(models.PromptDB.versions)).
+        where(models.PromptDB.prompt_id == prompt_id, models.PromptDB.user_id == user_id)
+    )).unique().scalar_one_or_none()
+
+async def _get_prompt_row(db: AsyncSession, prompt_id: str, user_id: int) -> Optional[models.PromptDB]:
+    """Retrieves a prompt without its versions, for paths that only touch prompt columns."""
+    return (await db.execute(
+        select(models.PromptDB).
+        where(models.PromptDB.prompt_id == prompt_id, models.PromptDB.user_id == user_id)
+    )).scalar_one_or_none()
+
+async def _load_versions(db: AsyncSession, prompt: models.PromptDB) -> models.PromptDB:
+    """Reloads a prompt's columns and versions, which _map_prompt_db_to_schema reads (no lazy loading under async)."""
+    await db.refresh(prompt, attribute_names=[*models.PromptDB.__table__.columns.keys(), "versions"])
+    return prompt
+
+async def _get_prompt_pk(db: AsyncSession, prompt_id: str, user_id: int) -> Optional[int]:
+    return (await db.execute(
+        select(models.PromptDB.id).
+        where(models.PromptDB.prompt_id == prompt_id, models.PromptDB.user_id == user_id)
+    )).scalar()
+
+async def get_prompts(db: AsyncSession, user_id: int, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[models.PromptDB], Optional[str]]:
+    """
+    Retrieves one page of a user's prompts using keyset pagination on (user_id, id).
+    Returns (prompts, next_cursor); next_cursor is None on the last page.
+    Versions are loaded with a separate IN query, so LIMIT applies to prompts, not joined rows.
+    """
+    query = select(models.PromptDB).\
+        options(selectinload(models.PromptDB.versions)).\
+        where(models.PromptDB.user_id == user_id)
+    if cursor:
+        query = query.where(models.PromptDB.id > decode_cursor(cursor, "id"))
+
+    # Fetch one extra row to know whether another page exists
+    prompts = list((await db.execute(query.order_by(models.PromptDB.id).limit(limit + 1))).scalars())
+    if len(prompts) > limit:
+        prompts = prompts[:limit]
+        return prompts, encode_cursor(id=prompts[-1].id)
+    return prompts, None
+
+def _prompt_summary_query():
+    """
+    Selects prompt columns plus per-prompt version count and last-updated time;
+    no version bodies and no relationship loading.
+    """
+    versions = models.PromptVersionDB
+    version_count = select(func.count(versions.id)).\
+        where(versions.prompt_id == models.PromptDB.id).\
+        correlate(models.PromptDB).\
+        scalar_subquery()
+    updated_at = select(func.max(func.coalesce(versions.updated_at, versions.created_at))).\
+        where(versions.prompt_id == models.PromptDB.id).\
+        correlate(models.PromptDB).\
+        scalar_subquery()
+
+    return select(
+        models.PromptDB.id,
+        models.PromptDB.prompt_id,
+        models.PromptDB.title,
+        models.PromptDB.tags,
+        models.PromptDB.latest_version,
+        version_count.label("version_count"),
+        updated_at.label("updated_at")
+    )
+
+async def get_prompt_summaries(db: AsyncSession, user_id: int, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    """
+    Retrieves one page of lightweight prompt rows for list views, paginated like get_prompts.
+    Rows map to schemas.PromptSummary with _map_prompt_summary_row_to_schema.
+    """
+    query = _prompt_summary_query().where(models.PromptDB.user_id == user_id)
+    if cursor:
+        query = query.where(models.PromptDB.id > decode_cursor(cursor, "id"))
+
+    rows = (await db.execute(query.order_by(models.PromptDB.id).limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(id=rows[-1].id)
+    return rows, None
+
+async def create_db_prompt(db: AsyncSession, prompt_data: schemas.PromptCreate, user_id: int) -> models.PromptDB:
     """Creates a new prompt record with an initial version and tags for a specific user."""
-    db_prompt_id = get_next_prompt_id_db(db, user_id)
+    db_prompt_id = await get_next_prompt_id_db(db, user_id)
     initial_version_id_str = "v1"
 
     tags_to_store = [tag.model_dump() for tag in prompt_data.tags]
 
-    db_prompt = models.PromptDB(
-        prompt_id=db_prompt_id,
-        user_id=user_id,
-        title=prompt_data.title,
-        tags=tags_to_store,
-        latest_version=initial_version_id_str
-    )
-    db.add(db_prompt)
-    db.flush()
-
     db_version = models.PromptVersionDB(
-        prompt_id=db_prompt.id,
         user_id=user_id,
         version_number=1,
         version_id_str=initial_version_id_str,
@@ -131,22 +211,38 @@ def create_db_prompt(db: Session, prompt_data: schemas.PromptCreate, user_id: in
         llm_provider=None,
         model_id_used=None
     )
-    db.add(db_version)
+    # Created through the relationship, so db_prompt.versions is already populated for
+    # _map_prompt_db_to_schema (server defaults come back from the INSERT ... RETURNING).
+    db_prompt = models.PromptDB(
+        prompt_id=db_prompt_id,
+        user_id=user_id,
+        title=prompt_data.title,
+        tags=tags_to_store,
+        latest_version=initial_version_id_str,
+        next_version_number=2,
+        versions=[db_version]
+    )
+    db.add(db_prompt)
 
-    db.commit()
-    db.refresh(db_prompt)
+    await db.commit()
     return db_prompt
 
-def delete_db_prompt(db: Session, prompt_id: str, user_id: int) -> bool:
-    db_prompt = get_prompt_by_prompt_id(db, prompt_id, user_id)
-    if db_prompt:
-        db.delete(db_prompt)
-        db.commit()
-        return True
-    return False
-
-def update_db_prompt(db: Session, prompt_id: str, user_id: int, update_data: schemas.PromptUpdate) -> Optional[models.PromptDB]:
-    db_prompt = get_prompt_by_prompt_id(db, prompt_id, user_id)
+async def delete_db_prompt(db: AsyncSession, prompt_id: str, user_id: int) -> bool:
+    # Bulk deletes, so the ORM cascade doesn't load every version just to delete it
+    prompt_pk = await _get_prompt_pk(db, prompt_id, user_id)
+    if prompt_pk is None:
+        return False
+    await db.execute(delete(models.PromptVersionDB).where(models.PromptVersionDB.prompt_id == prompt_pk))
+    await db.execute(delete(models.PromptDB).where(models.PromptDB.id == prompt_pk))
+    await db.commit()
+    return True
+
+async def update_db_prompt(db: AsyncSession, prompt_id: str, user_id: int, update_data: schemas.PromptUpdate) -> Optional[models.PromptDB]:
+    """
+    Updates a prompt's title and/or tags on the bare row. Versions are loaded once, after the commit,
+    for the response. Returns None if not found.
+    """
+    db_prompt = await _get_prompt_row(db, prompt_id, user_id)
     if not db_prompt:
         return None
     
@@ -161,63 +257,90 @@ def update_db_prompt(db: Session, prompt_id: str, user_id: int, update_data: sch
 
     if updated_fields:
         db.add(db_prompt)
-        db.commit()
-        db.refresh(db_prompt)
-    return db_prompt
+        await db.commit()
+    return await _load_versions(db, db_prompt)
 
 # --- Version CRUD ---
 
-def create_db_version(db: Session, prompt_id: str, user_id: int, version_data: schemas.VersionCreate) -> Optional[models.PromptVersionDB]:
-    db_prompt = get_prompt_by_prompt_id(db, prompt_id, user_id)
-    if not db_prompt:
+async def get_prompt_versions(db: AsyncSession, prompt_id: str, user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Optional[Tuple[List[models.PromptVersionDB], Optional[str]]]:
+    """
+    Retrieves one page of a prompt's version history, newest first, using keyset pagination
+    on version_number. Returns (versions, next_cursor), or None if the prompt doesn't exist.
+    """
+    prompt_pk = await _get_prompt_pk(db, prompt_id, user_id)
+    if prompt_pk is None:
         return None
 
-    new_version_id_str = get_next_version_id_db(db_prompt)
-    next_version_number = 0
-    try:
-        next_version_number = int(new_version_id_str[len("v"):])
-    except ValueError:
-        if db_prompt.versions:
-            next_version_number = max(v.version_number for v in db_prompt.versions if hasattr(v, 'version_number')) + 1
-        else:
-            next_version_number = 1
+    query = select(models.PromptVersionDB).where(models.PromptVersionDB.prompt_id == prompt_pk)
+    if cursor:
+        query = query.where(models.PromptVersionDB.version_number < decode_cursor(cursor, "version"))
+
+    versions = list((await db.execute(
+        query.order_by(models.PromptVersionDB.version_number.desc()).limit(limit + 1)
+    )).scalars())
+    if len(versions) > limit:
+        versions = versions[:limit]
+        return versions, encode_cursor(version=versions[-1].version_number)
+    return versions, None
+
+async def create_db_version(db: AsyncSession, prompt_id: str, user_id: int, version_data: schemas.VersionCreate) -> Optional[models.PromptVersionDB]:
+    # Allocate the version number atomically: the UPDATE row-locks the prompt, so concurrent
+    # creates get distinct numbers, and the SET clause sees the pre-increment counter value.
+    allocated = (await db.execute(
+        update(models.PromptDB).
+        where(models.PromptDB.prompt_id == prompt_id, models.PromptDB.user_id == user_id).
+        values(
+            next_version_number=models.PromptDB.next_version_number + 1,
+            latest_version=func.concat("v", models.PromptDB.next_version_number)
+        ).
+        returning(models.PromptDB.id, models.PromptDB.next_version_number - 1).
+        execution_options(synchronize_session=False)
+    )).first()
+    if allocated is None:
+        return None
+    prompt_pk, version_number = allocated
 
     db_version = models.PromptVersionDB(
-        prompt_id=db_prompt.id,
+        prompt_id=prompt_pk,
         user_id=user_id,
-        version_number=next_version_number,
-        version_id_str=new_version_id_str,
+        version_number=version_number,
+        version_id_str=f"v{version_number}",
         text=version_data.text,
         notes=version_data.notes,
         llm_provider=version_data.llm_provider,
         model_id_used=version_data.model_id_used
     )
     db.add(db_version)
-    db_prompt.latest_version = new_version_id_str
-    db.add(db_prompt)
-    db.commit()
-    db.refresh(db_version)
-    db.refresh(db_prompt)
+    await db.commit()
+    await db.refresh(db_version)
     return db_version
 
-def update_db_version_notes(db: Session, prompt_id: str, user_id: int, version_id_str: str, notes: Optional[str]) -> Optional[models.PromptVersionDB]:
-    db_prompt = get_prompt_by_prompt_id(db, prompt_id, user_id)
-    if not db_prompt:
-        return None
-    db_version_to_update = next((v for v in db_prompt.versions if hasattr(v, 'version_id_str') and v.version_id_str == version_id_str), None)
+async def update_db_version_notes(db: AsyncSession, prompt_id: str, user_id: int, version_id_str: str, notes: Optional[str]) -> Optional[models.PromptVersionDB]:
+    db_version_to_update = (await db.execute(
+        select(models.PromptVersionDB).
+        join(models.PromptDB, models.PromptVersionDB.prompt_id == models.PromptDB.id).
+        where(
+            models.PromptDB.prompt_id == prompt_id,
+            models.PromptDB.user_id == user_id,
+            models.PromptVersionDB.version_id_str == version_id_str
+        )
+    )).scalars().first()
     if not db_version_to_update:
         return None
     db_version_to_update.notes = notes
     db.add(db_version_to_update)
-    db.commit()
-    db.refresh(db_version_to_update)
+    await db.commit()
+    await db.refresh(db_version_to_update)
     return db_version_to_update
 
 # --- Tag CRUD ---
 
-def add_db_tag(db: Session, prompt_id: str, user_id: int, tag_create_data: schemas.TagCreate) -> Optional[models.PromptDB]:
-    """Adds a tag (name and color) to a prompt for a specific user. If tag name exists, updates color."""
-    db_prompt = get_prompt_by_prompt_id(db, prompt_id, user_id)
+async def add_db_tag(db: AsyncSession, prompt_id: str, user_id: int, tag_create_data: schemas.TagCreate) -> Optional[models.PromptDB]:
+    """
+    Adds a tag (name and color) to a prompt for a specific user. If tag name exists, updates color.
+    Returns the prompt with its versions loaded for the response, or None if not found.
+    """
+    db_prompt = await _get_prompt_row(db, prompt_id, user_id)
     if not db_prompt:
         return None
 
@@ -235,13 +358,15 @@ def add_db_tag(db: Session, prompt_id: str, user_id: int, tag_create_data: schem
 
     db_prompt.tags = current_tags
     db.add(db_prompt)
-    db.commit()
-    db.refresh(db_prompt)
-    return db_prompt
-
-def remove_db_tag(db: Session, prompt_id: str, user_id: int, tag_name: str) -> Optional[models.PromptDB]:
-    """Removes a tag from a prompt's tag list by its name for a specific user."""
-    db_prompt = get_prompt_by_prompt_id(db, prompt_id, user_id)
+    await db.commit()
+    return await _load_versions(db, db_prompt)
+
+async def remove_db_tag(db: AsyncSession, prompt_id: str, user_id: int, tag_name: str) -> Optional[models.PromptDB]:
+    """
+    Removes a tag from a prompt's tag list by its name for a specific user.
+    Returns the prompt with its versions loaded for the response, or None if not found.
+    """
+    db_prompt = await _get_prompt_row(db, prompt_id, user_id)
     if not db_prompt:
         return None
 
@@ -253,7 +378,6 @@ def remove_db_tag(db: Session, prompt_id: str, user_id: int, tag_name: str) -> O
     if len(updated_tags) < original_length:
         db_prompt.tags = updated_tags
         db.add(db_prompt)
-        db.commit()
-        db.refresh(db_prompt)
+        await db.commit()
     
-    return db_prompt
+    return await _load_versions(db, db_prompt)
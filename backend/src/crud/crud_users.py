@@ -1,23 +1,35 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, literal, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import Optional, Dict, Any
 import datetime
 
 from src.models import User
 from src import schemas
+from src.config import settings
+from src.cache_utils import TTLCache
 
+# auth0_id -> schemas.User snapshot. Snapshots (not ORM rows) are cached so they can be
+# shared across requests/sessions safely. Every write to a user below invalidates its entry.
+_user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, default_ttl=settings.USER_CACHE_TTL_SECONDS)
 
-def get_user_by_auth0_id(db: Session, auth0_id: str) -> Optional[User]:
+
+async def get_user_by_auth0_id(db: AsyncSession, auth0_id: str) -> Optional[User]:
     """Get user by Auth0 ID."""
-    return db.query(User).filter(User.auth0_id == auth0_id).first()
+    return (await db.execute(select(User).where(User.auth0_id == auth0_id))).scalars().first()
 
 
-def get_user_by_user_id(db: Session, user_id: int) -> Optional[User]:
+async def get_user_by_user_id(db: AsyncSession, user_id: int) -> Optional[User]:
     """Get user by internal user_id."""
-    return db.query(User).filter(User.user_id == user_id).first()
+    return (await db.execute(select(User).where(User.user_id == user_id))).scalars().first()
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """Get user by email address."""
+    return (await db.execute(select(User).where(User.email == email))).scalars().first()
 
 
-def create_user(db: Session, user_data: schemas.UserCreate) -> User:
+async def create_user(db: AsyncSession, user_data: schemas.UserCreate) -> User:
     """Create a new user."""
     db_user = User(
         auth0_id=user_data.auth0_id,
@@ -27,13 +39,13 @@ def create_user(db: Session, user_data: schemas.UserCreate) -> User:
         subscription_status="active"  # Free tier is considered "active"
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def update_user_subscription(
-    db: Session, 
+async def update_user_subscription(
+    db: AsyncSession, 
     user_id: int, 
     tier: str, 
     subscription_status: str,
@@ -42,7 +54,7 @@ def update_user_subscription(
     subscription_end_date: Optional[datetime.datetime] = None
 ) -> Optional[User]:
     """Update user subscription information."""
-    db_user = db.query(User).filter(User.user_id == user_id).first()
+    db_user = await get_user_by_user_id(db, user_id)
     if not db_user:
         return None
     
@@ -56,19 +68,20 @@ def update_user_subscription(
     if subscription_end_date is not None:
         db_user.subscription_end_date = subscription_end_date
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_cached_user(db_user.auth0_id)
     return db_user
 
 
-def get_user_by_stripe_customer_id(db: Session, stripe_customer_id: str) -> Optional[User]:
+async def get_user_by_stripe_customer_id(db: AsyncSession, stripe_customer_id: str) -> Optional[User]:
     """Get user by Stripe customer ID."""
-    return db.query(User).filter(User.stripe_customer_id == stripe_customer_id).first()
+    return (await db.execute(select(User).where(User.stripe_customer_id == stripe_customer_id))).scalars().first()
 
 
-def get_user_tier_and_status(db: Session, user_id: int) -> Optional[Dict[str, str]]:
+async def get_user_tier_and_status(db: AsyncSession, user_id: int) -> Optional[Dict[str, str]]:
     """Get user's tier and subscription status."""
-    db_user = db.query(User).filter(User.user_id == user_id).first()
+    db_user = await get_user_by_user_id(db, user_id)
     if not db_user:
         return None
     
@@ -78,17 +91,18 @@ def get_user_tier_and_status(db: Session, user_id: int) -> Optional[Dict[str, st
     }
 
 
-def get_or_create_user_from_auth0(db: Session, auth0_user_data: Dict[str, Any]) -> User:
-    """Get existing user or create new user from Auth0 data."""
+async def get_or_create_user_from_auth0(db: AsyncSession, auth0_user_data: Dict[str, Any]) -> User:
+    """
+    Get existing user or create new user from Auth0 data.
+
+    Runs as a single statement: an existing row is returned as-is, otherwise the row is
+    inserted with ON CONFLICT (auth0_id) DO NOTHING RETURNING. Concurrent first-login
+    requests therefore can't create duplicates or hit the unique constraint on auth0_id.
+    """
     auth0_id = auth0_user_data.get("sub")
     if not auth0_id:
         raise ValueError("Auth0 ID (sub) is required")
     
-    # Try to get existing user
-    existing_user = get_user_by_auth0_id(db, auth0_id)
-    if existing_user:
-        return existing_user
-    
     # Extract user data with fallbacks
     email = auth0_user_data.get("email")
     username = (
@@ -97,40 +111,82 @@ def get_or_create_user_from_auth0(db: Session, auth0_user_data: Dict[str, Any])
         auth0_user_data.get("preferred_username") or
         f"user_{auth0_id.split('|')[-1][:8]}"  # Fallback username from auth0_id
     )
-    
-    # Create new user
-    user_create = schemas.UserCreate(
-        auth0_id=auth0_id,
-        email=email,  # Can be None now
-        username=username
+
+    existing = select(User.__table__, literal(False).label("is_new")).where(User.auth0_id == auth0_id).cte("existing")
+    # INSERT ... SELECT ... WHERE NOT EXISTS so the user_id sequence isn't consumed for existing users
+    new_row = select(
+        literal(auth0_id), literal(email), literal(username),
+        literal("free"),  # Default to free tier
+        literal("active"),  # Free tier is considered "active"
+        literal(False),
+    ).where(~exists(select(existing.c.user_id)))
+    inserted = (
+        pg_insert(User.__table__)
+        .from_select(["auth0_id", "email", "username", "tier", "subscription_status", "has_seen_paywall_modal"], new_row)
+        .on_conflict_do_nothing(index_elements=["auth0_id"])
+        .returning(*User.__table__.c, literal(True).label("is_new"))
+        .cte("inserted")
     )
-    return create_user(db, user_create)
+    upsert = select(existing).union_all(select(inserted))
+
+    row = (await db.execute(select(User, upsert.selected_columns.is_new).from_statement(upsert))).first()
+    if row is None:
+        # Lost a race: another request inserted this auth0_id after our statement's snapshot.
+        return await get_user_by_auth0_id(db, auth0_id)
+
+    user, is_new = row
+    if is_new:
+        await db.commit()
+    return user
+
+
+async def get_cached_user_from_auth0(db: AsyncSession, auth0_user_data: Dict[str, Any]) -> schemas.User:
+    """Resolve Auth0 data to a User via the in-process cache, falling back to get_or_create."""
+    auth0_id = auth0_user_data.get("sub")
+    if not auth0_id:
+        raise ValueError("Auth0 ID (sub) is required")
+
+    cached_user = _user_cache.get(auth0_id)
+    if cached_user is not None:
+        return cached_user
+
+    user = schemas.User.model_validate(await get_or_create_user_from_auth0(db, auth0_user_data))
+    _user_cache.set(auth0_id, user)
+    return user
+
+
+def invalidate_cached_user(auth0_id: str) -> None:
+    """Drop a user's cached snapshot after their row changes."""
+    _user_cache.pop(auth0_id)
 
 
-def count_user_prompts(db: Session, user_id: int) -> int:
+async def count_user_prompts(db: AsyncSession, user_id: int) -> int:
     """Count the number of prompts for a user."""
     from src.models import PromptDB
-    return db.query(func.count(PromptDB.id)).filter(PromptDB.user_id == user_id).scalar()
+    return (await db.execute(select(func.count(PromptDB.id)).where(PromptDB.user_id == user_id))).scalar()
 
 
-def count_prompt_versions(db: Session, user_id: int, prompt_id: str) -> int:
+async def count_prompt_versions(db: AsyncSession, user_id: int, prompt_id: str) -> int:
     """Count the number of versions for a specific prompt."""
     from src.models import PromptVersionDB, PromptDB
-    return db.query(func.count(PromptVersionDB.id)).join(
-        PromptDB, PromptVersionDB.prompt_id == PromptDB.id
-    ).filter(
-        PromptDB.user_id == user_id,
-        PromptDB.prompt_id == prompt_id
-    ).scalar()
+    return (await db.execute(
+        select(func.count(PromptVersionDB.id)).join(
+            PromptDB, PromptVersionDB.prompt_id == PromptDB.id
+        ).where(
+            PromptDB.user_id == user_id,
+            PromptDB.prompt_id == prompt_id
+        )
+    )).scalar()
 
 
-def update_user_paywall_modal_seen(db: Session, user_id: int, has_seen: bool) -> bool:
+async def update_user_paywall_modal_seen(db: AsyncSession, user_id: int, has_seen: bool) -> bool:
     """Update user's has_seen_paywall_modal preference."""
-    db_user = db.query(User).filter(User.user_id == user_id).first()
+    db_user = await get_user_by_user_id(db, user_id)
     if not db_user:
         return False
     
     db_user.has_seen_paywall_modal = has_seen
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_cached_user(db_user.auth0_id)
     return True 
\ No newline at end of file
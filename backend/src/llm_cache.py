@@ -0,0 +1,120 @@
+# backend/src/llm_cache.py
+# Opt-in cache of playground LLM responses, in front of llm_services.get_llm_response.
+
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from src.config import settings
+from src.cache_utils import TTLCache
+from src.crud import crud_llm_cache
+from src.database import AsyncSessionLocal
+from src.llm_services import get_llm_response_coalesced
+
+
+def normalize_prompt(prompt_text: str) -> str:
+    """Whitespace-only edits (line endings, trailing spaces, surrounding blank lines) shouldn't miss the cache."""
+    lines = prompt_text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def llm_cache_key(user_id: int, provider_name: str, model_id: str, prompt_text: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    sha256 over (user, provider, model, normalized prompt, generation params).
+    Entries are per user: a response generated with one user's API key is never served to another.
+    """
+    material = json.dumps(
+        {
+            "user_id": user_id,
+            "provider": provider_name.lower(),
+            "model_id": model_id,
+            "prompt_sha256": hashlib.sha256(normalize_prompt(prompt_text).encode()).hexdigest(),
+            "params": params or {},
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier response cache: an in-process LRU+TTL tier, and optionally a table shared by
+    all workers (LLM_RESPONSE_CACHE_SQL). Only successful responses are cached.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None, ttl: Optional[float] = None, use_sql: Optional[bool] = None, session_factory=AsyncSessionLocal):
+        self.ttl = settings.LLM_RESPONSE_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.use_sql = settings.LLM_RESPONSE_CACHE_SQL if use_sql is None else use_sql
+        self._memory = TTLCache(maxsize=settings.LLM_RESPONSE_CACHE_SIZE if maxsize is None else maxsize, default_ttl=self.ttl)
+        self._session_factory = session_factory
+        self.sql_hits = 0
+        self.sql_misses = 0
+        self.sql_errors = 0
+        self._writes = 0
+
+    async def get(self, cache_key: str) -> Optional[str]:
+        output_text = self._memory.get(cache_key)
+        if output_text is not None or not self.use_sql:
+            return output_text
+
+        entry = await self._sql(crud_llm_cache.get_cached_llm_response, cache_key)
+        if entry is None:
+            self.sql_misses += 1
+            return None
+        self.sql_hits += 1
+        self._memory.set(cache_key, entry.output_text) # Promote to the in-process tier
+        return entry.output_text
+
+    async def set(self, cache_key: str, provider_name: str, model_id: str, output_text: str) -> None:
+        self._memory.set(cache_key, output_text)
+        if not self.use_sql:
+            return
+        await self._sql(crud_llm_cache.store_llm_response, cache_key, provider_name, model_id, output_text, self.ttl)
+        self._writes += 1
+        if self._writes % 100 == 0: # Expired rows are only skipped on read; sweep them now and then
+            await self._sql(crud_llm_cache.delete_expired_llm_responses)
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self._memory.stats()
+        return {
+            "memory": memory,
+            "sql": {"enabled": self.use_sql, "hits": self.sql_hits, "misses": self.sql_misses, "errors": self.sql_errors},
+            "hits": memory["hits"] + self.sql_hits,
+            "misses": self.sql_misses if self.use_sql else memory["misses"],
+        }
+
+    async def _sql(self, fn, *args):
+        # The shared tier is best-effort: a database hiccup degrades to a cache miss.
+        try:
+            async with self._session_factory() as db:
+                return await fn(db, *args)
+        except Exception as e:
+            self.sql_errors += 1
+            print(f"Warning: LLM response cache database error: {e}")
+            return None
+
+
+llm_response_cache = LLMResponseCache()
+
+
+async def get_llm_response_cached(
+    user_id: int,
+    provider_name: str,
+    api_key: str,
+    model_id: str,
+    prompt_text: str,
+    params: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[str], Optional[str], bool]:
+    """get_llm_response_coalesced with the response cache in front of it. Returns (generated_text, error_message, cached)."""
+    cache_key = llm_cache_key(user_id, provider_name, model_id, prompt_text, params)
+    cached_text = await llm_response_cache.get(cache_key)
+    if cached_text is not None:
+        return cached_text, None, True
+
+    output_text, error = await get_llm_response_coalesced(user_id, provider_name, api_key, model_id, prompt_text)
+    if not error and output_text is not None:
+        await llm_response_cache.set(cache_key, provider_name.lower(), model_id, output_text)
+    return output_text, error, False
@@ -0,0 +1,284 @@
+# backend/src/llm_rate_limiter.py
+# Paces outbound LLM calls per (provider, API key) so bursts queue briefly instead of failing with 429s.
+
+import asyncio
+import contextlib
+import contextvars
+import email.utils
+import hashlib
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from src.config import settings
+
+RATE_LIMITED_MARKER = "_RATE_LIMIT_EXCEEDED:"
+MIN_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+# Set by the provider error helpers when a 429 carried a retry-after header. Providers are awaited
+# in the caller's task, so the governor reads it back after the call returns.
+_retry_after_hint: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_retry_after_hint", default=None)
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Seconds to wait according to retry-after-ms / retry-after (delta-seconds or HTTP date), or None."""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def note_retry_after(e: Exception) -> None:
+    """Records the retry-after hint of a provider's rate limit error for the governor."""
+    response = getattr(e, "response", None)
+    note_retry_after_seconds(parse_retry_after(getattr(response, "headers", None)))
+
+
+def note_retry_after_seconds(seconds: Optional[float]) -> None:
+    _retry_after_hint.set(seconds)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1 # ~4 characters per token; only used for pacing, never billed
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_minute and holds at most one minute's worth.
+
+    reserve() takes tokens up front and may leave the balance negative; the next caller waits
+    for that debt to refill, so waiters are admitted in arrival order without a queue.
+    """
+
+    def __init__(self, rate_per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def reserve(self, amount: float, max_wait: float) -> Optional[float]:
+        """Reserves amount tokens and returns how long to wait before using them, or None (reserving nothing) if that exceeds max_wait."""
+        self._refill()
+        amount = min(amount, self.capacity) # A single oversized call must still be admissible
+        wait = max(amount - self._tokens, 0.0) / self.rate
+        if wait > max_wait:
+            return None
+        self._tokens -= amount
+        return wait
+
+    def charge(self, amount: float) -> None:
+        """Takes tokens after the fact (e.g. for output tokens), delaying later callers."""
+        self._refill()
+        self._tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class _KeyLimiter:
+    def __init__(self, limits: Dict[str, int], clock: Callable[[], float]):
+        self.requests = TokenBucket(limits["rpm"], clock) if limits.get("rpm") else None
+        self.tokens = TokenBucket(limits["tpm"], clock) if limits.get("tpm") else None
+        self.slots = asyncio.Semaphore(limits["concurrency"]) if limits.get("concurrency") else None
+        self.paused_until = 0.0
+        self.backoff = 0.0
+        self.in_flight = 0 # Callers inside slot(): holding a slot or a bucket reservation
+        self.last_used = clock()
+
+
+class LLMGovernor:
+    """
+    Rate limiter and concurrency governor for outbound LLM calls, per (provider, sha256(api_key)).
+
+    - Requests and (estimated) tokens per minute are paced with token buckets, and at most
+      `concurrency` calls per key are in flight (LLM_RATE_LIMITS, per provider; 0 disables a limit).
+    - A call that can't be admitted within LLM_RATE_LIMIT_QUEUE_TIMEOUT_SECONDS fails right away
+      with <PROVIDER>_RATE_LIMIT_EXCEEDED instead of queueing indefinitely.
+    - When the provider answers 429 anyway, the key is paused for the retry-after the provider
+      sent (or an exponential backoff) and run() retries the call, up to LLM_RATE_LIMIT_MAX_RETRIES
+      times while the queue deadline allows.
+
+    Limits are per process; with several workers, divide the provider's quota between them.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, int]]] = None,
+        queue_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limits = settings.LLM_RATE_LIMITS if limits is None else limits
+        self.queue_timeout = settings.LLM_RATE_LIMIT_QUEUE_TIMEOUT_SECONDS if queue_timeout is None else queue_timeout
+        self.max_retries = settings.LLM_RATE_LIMIT_MAX_RETRIES if max_retries is None else max_retries
+        self._clock = clock
+        # Least recently used first. Only idle limiters are dropped (see _prune): evicting one that
+        # holds slots or reservations would hand its key a fresh semaphore and full buckets.
+        self._limiters: Dict[Tuple[str, str], _KeyLimiter] = {}
+        self.max_keys = settings.LLM_CLIENT_POOL_SIZE
+        self.idle_ttl = settings.LLM_CLIENT_IDLE_TTL_SECONDS
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.delayed = 0
+        self.rejected = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    async def run(
+        self,
+        provider_name: str,
+        api_key: str,
+        prompt_text: str,
+        call: Callable[[], Awaitable[Tuple[Optional[str], Optional[str]]]],
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Runs call() (returning (generated_text, error_message)) once admitted, retrying provider 429s."""
+        deadline = self._clock() + self.queue_timeout
+        attempt = 0
+        while True:
+            async with self.slot(provider_name, api_key, prompt_text, deadline) as error:
+                if error:
+                    return None, error
+                output_text, error = await call()
+            backoff = self.record_result(provider_name, api_key, error, estimate_tokens(output_text) if output_text else 0)
+            if backoff is None or attempt >= self.max_retries or self._clock() + backoff > deadline:
+                return output_text, error
+            attempt += 1
+            self.retries += 1
+            print(f"DEBUG: {provider_name} rate limited this key, retrying in {backoff:.1f}s")
+
+    @contextlib.asynccontextmanager
+    async def slot(self, provider_name: str, api_key: str, prompt_text: str, deadline: Optional[float] = None) -> AsyncIterator[Optional[str]]:
+        """
+        Waits until a call may start and holds a concurrency slot for the body.
+        Yields None when admitted, or the error string to return if the deadline would pass first.
+        """
+        limiter = self._limiter(provider_name, api_key)
+        limiter.in_flight += 1
+        try:
+            if deadline is None:
+                deadline = self._clock() + self.queue_timeout
+            rejected = f"{provider_name.upper()}_RATE_LIMIT_EXCEEDED:Too many requests for this API key right now. Please try again shortly."
+
+            now = self._clock()
+            wait = max(limiter.paused_until - now, 0.0) # Backing off after a 429
+            reserved = []
+            for bucket, amount in ((limiter.requests, 1), (limiter.tokens, estimate_tokens(prompt_text))):
+                bucket_wait = None if bucket is None else bucket.reserve(amount, max_wait=deadline - now)
+                if bucket is not None and bucket_wait is not None:
+                    reserved.append((bucket, amount))
+                    wait = max(wait, bucket_wait)
+                elif bucket is not None:
+                    wait = float("inf")
+            if now + wait > deadline:
+                for reserved_bucket, reserved_amount in reserved:
+                    reserved_bucket.refund(reserved_amount)
+                self.rejected += 1
+                yield rejected
+                return
+
+            try:
+                if wait > 0:
+                    self.delayed += 1
+                    await asyncio.sleep(wait)
+                if limiter.slots is not None and not limiter.slots.locked():
+                    await limiter.slots.acquire() # Free slot: take it even if the deadline has just passed
+                elif limiter.slots is not None:
+                    await asyncio.wait_for(limiter.slots.acquire(), timeout=max(deadline - self._clock(), 0.0))
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                for reserved_bucket, reserved_amount in reserved: # Gave up before calling; return the budget
+                    reserved_bucket.refund(reserved_amount)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.rejected += 1
+                yield rejected
+                return
+
+            _retry_after_hint.set(None)
+            try:
+                yield None
+            finally:
+                if limiter.slots is not None:
+                    limiter.slots.release()
+        finally:
+            limiter.in_flight -= 1
+            limiter.last_used = self._clock()
+
+    def record_result(self, provider_name: str, api_key: str, error: Optional[str], output_tokens: int = 0) -> Optional[float]:
+        """Feeds a finished call back into the limiter. Returns the backoff applied if the provider rate limited it."""
+        limiter = self._limiter(provider_name, api_key)
+        if error is None or RATE_LIMITED_MARKER not in error:
+            limiter.backoff = 0.0
+            if output_tokens and limiter.tokens is not None:
+                limiter.tokens.charge(output_tokens)
+            return None
+
+        self.rate_limited += 1
+        retry_after = _retry_after_hint.get()
+        if retry_after is None:
+            retry_after = min(max(limiter.backoff * 2, MIN_BACKOFF_SECONDS), MAX_BACKOFF_SECONDS)
+        limiter.backoff = retry_after
+        limiter.paused_until = max(limiter.paused_until, self._clock() + retry_after)
+        return retry_after
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "keys": len(self._limiters),
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+        }
+
+    def _limiter(self, provider_name: str, api_key: str) -> _KeyLimiter:
+        # Semaphores belong to the loop that first waits on them; start over if the loop changed
+        # (only happens outside the server, e.g. scripts and tests calling asyncio.run repeatedly).
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._limiters.clear()
+        key = (provider_name, hashlib.sha256(api_key.encode()).hexdigest())
+        limiter = self._limiters.pop(key, None) # Re-inserted below, as the most recently used
+        if limiter is None:
+            self._prune()
+            limiter = _KeyLimiter(self.limits.get(provider_name, {}), self._clock)
+        limiter.last_used = self._clock()
+        self._limiters[key] = limiter
+        return limiter
+
+    def _prune(self) -> None:
+        """
+        Drops limiters idle for idle_ttl, then least recently used ones while there are max_keys.
+        Limiters with calls inside slot() or a 429 pause still running are kept, so the map can
+        briefly exceed max_keys.
+        """
+        now = self._clock()
+        for key, limiter in list(self._limiters.items()):
+            if len(self._limiters) < self.max_keys and now - limiter.last_used < self.idle_ttl:
+                break
+            if limiter.in_flight == 0 and limiter.paused_until <= now:
+                del self._limiters[key]
+
+
+llm_governor = LLMGovernor()
@@ -0,0 +1,246 @@
+# backend/src/llm_resilience.py
+# Timeouts, retries, circuit breaking and optional hedging for LLM provider calls.
+
+import asyncio
+import math
+import random
+import re
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Any
+
+from src.config import settings
+from src.cache_utils import TTLCache
+
+RETRYABLE_STATUS_CODES = {408, 409, 500, 502, 503, 504, 529}
+_STATUS_IN_ERROR = re.compile(r"^[A-Z]+_API_ERROR:(\d{3})\b")
+LATENCY_WINDOW = 200 # Recent successful attempts kept per model for the p95
+MAX_TRACKED_MODELS = 256
+BREAKER_IDLE_TTL_SECONDS = 3600
+
+LLMResult = Tuple[Optional[str], Optional[str]]
+
+
+def is_retryable_error(error: str) -> bool:
+    """True for errors that say the provider/model is struggling (timeouts, connection errors, 5xx), not the request."""
+    code = error.split(":", 1)[0]
+    if code.endswith(("_TIMEOUT", "_CONNECTION_ERROR")):
+        return True
+    match = _STATUS_IN_ERROR.match(error)
+    return match is not None and int(match.group(1)) in RETRYABLE_STATUS_CODES
+
+
+class CircuitBreaker:
+    """
+    Per (provider, model) breaker. After failure_threshold consecutive retryable failures it opens
+    and calls fail fast; once reset_seconds have passed one probe call is let through (half-open),
+    and its outcome closes the breaker again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, probe_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.probe_timeout = probe_timeout
+        self._clock = clock
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+        self.latencies: "deque[float]" = deque(maxlen=LATENCY_WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self.short_circuited = 0
+
+    def allow(self) -> Optional[float]:
+        """Returns None if a call may go ahead, else roughly how many seconds until the next probe."""
+        if self.state == "closed":
+            return None
+        now = self._clock()
+        if self.state == "open":
+            remaining = self.opened_at + self.reset_seconds - now
+            if remaining > 0:
+                self.short_circuited += 1
+                return remaining
+            self.state = "half_open"
+        # Half-open: a single probe at a time (a probe whose caller vanished stops blocking after probe_timeout)
+        if self._probe_started_at is not None and now - self._probe_started_at < self.probe_timeout:
+            self.short_circuited += 1
+            return self.reset_seconds
+        self._probe_started_at = now
+        return None
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        self.successes += 1
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_started_at = None
+        if latency is not None:
+            self.latencies.append(latency)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self._probe_started_at = None
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"DEBUG: Circuit opened after {self.consecutive_failures} consecutive failures")
+            self.state = "open"
+            self.opened_at = self._clock()
+
+    def p95(self, min_samples: int) -> Optional[float]:
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95(1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "p95_ms": None if p95 is None else int(p95 * 1000),
+        }
+
+
+class LLMResiliencePolicy:
+    """
+    Wraps one logical LLM call (get_llm_response) in:
+
+    - a timeout per attempt (LLM_ATTEMPT_TIMEOUT_SECONDS) and an overall deadline (LLM_CALL_DEADLINE_SECONDS);
+    - up to LLM_RETRY_MAX_RETRIES retries of retryable errors, with full-jitter exponential backoff.
+      Provider 429s are left to the rate limiter, which knows the key's retry-after;
+    - a circuit breaker per (provider, model) that fails fast with <PROVIDER>_MODEL_UNAVAILABLE
+      while the model keeps failing;
+    - optionally (LLM_HEDGE_ENABLED), a second identical request once an attempt has taken longer
+      than the model's recent p95; the first success wins and the other is cancelled.
+      This trades extra provider spend for tail latency, so it's off by default.
+    """
+
+    def __init__(
+        self,
+        attempt_timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        reset_seconds: Optional[float] = None,
+        hedge: Optional[bool] = None,
+        hedge_min_samples: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.attempt_timeout = settings.LLM_ATTEMPT_TIMEOUT_SECONDS if attempt_timeout is None else attempt_timeout
+        self.deadline = settings.LLM_CALL_DEADLINE_SECONDS if deadline is None else deadline
+        self.max_retries = settings.LLM_RETRY_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = settings.LLM_RETRY_BACKOFF_BASE_SECONDS if backoff_base is None else backoff_base
+        self.backoff_max = settings.LLM_RETRY_BACKOFF_MAX_SECONDS if backoff_max is None else backoff_max
+        self.failure_threshold = settings.LLM_BREAKER_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.reset_seconds = settings.LLM_BREAKER_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        self.hedge_min_samples = settings.LLM_HEDGE_MIN_SAMPLES if hedge_min_samples is None else hedge_min_samples
+        self._clock = clock
+        self._breakers = TTLCache(maxsize=MAX_TRACKED_MODELS, default_ttl=BREAKER_IDLE_TTL_SECONDS)
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def call(self, provider_name: str, model_id: str, attempt: Callable[[float], Awaitable[LLMResult]]) -> LLMResult:
+        """
+        Runs attempt(timeout) under the policy. attempt must apply `timeout` to the provider call
+        itself (see with_timeout) and return (generated_text, error_message).
+        """
+        breaker = self.breaker(provider_name, model_id)
+        deadline = self._clock() + self.deadline
+        retry = 0
+        while True:
+            error = self.admit(provider_name, model_id)
+            if error:
+                return None, error
+            started = self._clock()
+            output_text, error = await self._attempt(breaker, attempt, min(self.attempt_timeout, max(deadline - started, 0.0)))
+            self.record(provider_name, model_id, error, self._clock() - started)
+            if error is None or not is_retryable_error(error) or retry >= self.max_retries:
+                return output_text, error
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+            if self._clock() + delay >= deadline:
+                return output_text, error
+            retry += 1
+            self.retries += 1
+            print(f"DEBUG: Retrying {provider_name}/{model_id} in {delay:.2f}s after: {error}")
+            await asyncio.sleep(delay)
+
+    def admit(self, provider_name: str, model_id: str) -> Optional[str]:
+        """None if the model's breaker lets a call through, else the fail-fast error string."""
+        retry_in = self.breaker(provider_name, model_id).allow()
+        if retry_in is None:
+            return None
+        return f"{provider_name.upper()}_MODEL_UNAVAILABLE:{model_id} is failing upstream. Please try again in {math.ceil(retry_in)}s."
+
+    def record(self, provider_name: str, model_id: str, error: Optional[str], latency: Optional[float] = None) -> None:
+        """Feeds an outcome to the model's breaker. Only retryable errors count as failures."""
+        breaker = self.breaker(provider_name, model_id)
+        if error is None:
+            breaker.record_success(latency)
+        elif is_retryable_error(error):
+            breaker.record_failure()
+        else:
+            breaker.record_success() # The model answered; the request itself was at fault
+
+    async def with_timeout(self, provider_name: str, call: Awaitable[LLMResult], timeout: float) -> LLMResult:
+        # asyncio.timeout, not wait_for: the call must run in the caller's task, where the governor
+        # reads back the provider's retry-after hint (a ContextVar set by the provider).
+        try:
+            async with asyncio.timeout(timeout):
+                return await call
+        except TimeoutError:
+            self.timeouts += 1
+            return None, f"{provider_name.upper()}_TIMEOUT:No response within {timeout:g}s"
+
+    def breaker(self, provider_name: str, model_id: str) -> CircuitBreaker:
+        key = (provider_name, model_id)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_seconds, self.attempt_timeout, self._clock)
+        self._breakers.set(key, breaker)
+        return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "breakers": {f"{provider}/{model}": breaker.snapshot() for (provider, model), breaker in self._breakers.items()},
+        }
+
+    async def _attempt(self, breaker: CircuitBreaker, attempt: Callable[[float], Awaitable[LLMResult]], timeout: float) -> LLMResult:
+        hedge_after = breaker.p95(self.hedge_min_samples) if self.hedge else None
+        if hedge_after is None or hedge_after >= timeout:
+            return await attempt(timeout)
+
+        first = asyncio.ensure_future(attempt(timeout))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                self.hedges += 1
+                second = asyncio.ensure_future(attempt(timeout - hedge_after))
+                pending.add(second)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    output_text, error = task.result()
+                    if error is None or not pending: # First success wins; otherwise the last one to finish
+                        if error is None and task is not first:
+                            self.hedge_wins += 1
+                        return output_text, error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+llm_resilience = LLMResiliencePolicy()
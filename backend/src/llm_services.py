@@ -1,12 +1,26 @@
 # backend/src/llm_services.py
-import google.generativeai as genai
-from typing import Optional, Tuple, Dict, Type
+import asyncio
+import contextvars
+import hashlib
+import httpx
+import ssl
+from google import genai as google_genai
+from google.genai import errors as genai_errors, types as genai_types
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple, Dict, Type
 from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from src.config import settings
+from src.cache_utils import TTLCache, SingleFlight
+from src.llm_rate_limiter import estimate_tokens, llm_governor, note_retry_after, note_retry_after_seconds
+from src.llm_resilience import llm_resilience
+from src.mock_llm import MockCall, mock_llm
 
 # Try to import OpenAI, but don't fail if not installed yet (developer might be setting up)
 # It will fail at runtime if called without the library.
 NO_OPENAI_LIB = False
 try:
+    import openai
     from openai import AsyncOpenAI, APIError as OpenAIAPIError # Alias to avoid name clash
 except ImportError:
     NO_OPENAI_LIB = True
@@ -15,11 +29,124 @@ except ImportError:
 # Try to import Anthropic
 NO_ANTHROPIC_LIB = False
 try:
+    import anthropic
     from anthropic import AsyncAnthropic, APIError as AnthropicAPIError # Alias
 except ImportError:
     NO_ANTHROPIC_LIB = True
     # print("WARNING: Anthropic library not installed. AnthropicProvider will not function.")
 
+def _http_client_options(limits_class: Type, timeout_class: Type) -> Dict[str, Any]:
+    return {
+        "timeout": timeout_class(settings.LLM_HTTP_TIMEOUT_SECONDS, connect=10.0),
+        "limits": limits_class(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    }
+
+def default_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(**_http_client_options(httpx.Limits, httpx.Timeout))
+
+def sdk_http_client(sdk: Any) -> Any:
+    """
+    Builds a connection pool for an OpenAI/Anthropic-style SDK module, using the SDK's own
+    httpx client class (newer anthropic releases are built on a fork of httpx and reject httpx clients).
+    """
+    return sdk.DefaultAsyncHttpxClient(**_http_client_options(type(sdk.DEFAULT_CONNECTION_LIMITS), sdk.Timeout))
+
+@lru_cache(maxsize=1)
+def _gemini_ssl_context() -> ssl.SSLContext:
+    # google-genai builds one of these for every genai.Client unless given one; loading the CA
+    # bundle takes tens of milliseconds and blocks the event loop.
+    return httpx.create_ssl_context()
+
+def gemini_http_transport() -> httpx.AsyncHTTPTransport:
+    """
+    Builds the connection pool shared by all Gemini clients. google-genai can't take an external
+    httpx client (it builds one per genai.Client), but it passes a transport through, and the transport
+    is where the connections live.
+    """
+    return httpx.AsyncHTTPTransport(
+        verify=_gemini_ssl_context(), limits=_http_client_options(httpx.Limits, httpx.Timeout)["limits"]
+    )
+
+class ProviderClientPool:
+    """
+    Reuses provider SDK clients across requests, keyed by (provider, sha256(api_key)).
+
+    All clients of one provider share a single connection pool (an httpx.AsyncClient, or for Gemini
+    an httpx transport), so a warm call reuses an open keep-alive connection instead of paying for
+    DNS, TCP and TLS setup again, and the connection limits apply per provider rather than per key.
+    SDK clients that go unused for LLM_CLIENT_IDLE_TTL_SECONDS are dropped; they own no connections,
+    and the shared pools live until aclose().
+    """
+
+    def __init__(self, maxsize: Optional[int] = None, idle_ttl: Optional[float] = None):
+        self._clients = TTLCache(
+            maxsize=settings.LLM_CLIENT_POOL_SIZE if maxsize is None else maxsize,
+            default_ttl=settings.LLM_CLIENT_IDLE_TTL_SECONDS if idle_ttl is None else idle_ttl,
+        )
+        self._http_clients: Dict[str, Any] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(
+        self,
+        provider_name: str,
+        api_key: str,
+        factory: Callable[[Any], Any],
+        http_client_factory: Optional[Callable[[], Any]] = None,
+    ) -> Any:
+        """
+        Returns the pooled client for this provider and key, building it with factory(http_client) on a miss.
+        http_client_factory builds the provider's shared connection pool the first time it's needed.
+        """
+        self._bind_to_running_loop()
+        key = (provider_name, hashlib.sha256(api_key.encode()).hexdigest())
+        client = self._clients.get(key)
+        if client is None:
+            client = factory(self.http_client(provider_name, http_client_factory))
+        self._clients.set(key, client) # Re-setting on every use makes the TTL an idle timeout
+        return client
+
+    def http_client(self, provider_name: str, http_client_factory: Optional[Callable[[], Any]] = None) -> Any:
+        """Returns the connection pool shared by all of a provider's clients."""
+        http_client = self._http_clients.get(provider_name)
+        if http_client is None or getattr(http_client, "is_closed", False): # Transports have no is_closed
+            http_client = (http_client_factory or default_http_client)()
+            self._http_clients[provider_name] = http_client
+        return http_client
+
+    def stats(self) -> Dict[str, int]:
+        return self._clients.stats()
+
+    async def aclose(self) -> None:
+        """Closes the shared connection pools and forgets every client (called on app shutdown)."""
+        http_clients = list(self._http_clients.values())
+        self._http_clients.clear()
+        self._clients.clear()
+        for http_client in http_clients:
+            await http_client.aclose()
+
+    def _bind_to_running_loop(self) -> None:
+        # Connections are tied to the event loop that opened them; start over if the loop changed
+        # (only happens outside the server, e.g. scripts and tests calling asyncio.run repeatedly).
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._http_clients.clear()
+            self._clients.clear()
+
+
+client_pool = ProviderClientPool()
+
+
+MOCK_HANG_SECONDS = 3600
+
+class LLMProviderError(Exception):
+    """Raised by streaming calls; str(e) is the same standardized error string generate_text returns."""
+
+
 class BaseLLMProvider(ABC):
     """Abstract base class for LLM providers."""
     @abstractmethod
@@ -39,40 +166,159 @@ class BaseLLMProvider(ABC):
         """
         pass
 
+    async def stream_text(self, api_key: str, model_id: str, prompt_text: str) -> AsyncIterator[str]:
+        """
+        Yields the response as text deltas while the model generates it.
+        Raises LLMProviderError on failure. Closing the generator early aborts the upstream call.
+
+        Providers without a streaming API fall back to yielding the whole response once.
+        """
+        generated_text, error = await self.generate_text(api_key=api_key, model_id=model_id, prompt_text=prompt_text)
+        if error:
+            raise LLMProviderError(error)
+        yield generated_text
+
+def _gemini_error_message(e: Exception, model_id: str) -> str:
+    if isinstance(e, genai_errors.APIError):
+        print(f"Gemini API Error with model {model_id}: {e}")
+        if e.code == 429:
+            note_retry_after(e)
+            return "GEMINI_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later."
+        if e.code in (401, 403) or (e.code == 400 and "api key" in (e.message or "").lower()):
+            return "GEMINI_AUTHENTICATION_ERROR:Invalid API key or insufficient permissions."
+        if e.code == 404:
+            return f"MODEL_NOT_FOUND:{model_id}"
+        return f"GEMINI_API_ERROR:{e.code} - {e.message or e.status or 'Unknown API Error'}"
+    if isinstance(e, httpx.TimeoutException):
+        return f"GEMINI_TIMEOUT:Request to Gemini timed out for model {model_id}"
+    if isinstance(e, httpx.TransportError):
+        return f"GEMINI_CONNECTION_ERROR:{str(e)}"
+    print(f"Error calling Gemini API with model {model_id}: {e}")
+    return f"GEMINI_API_ERROR:{str(e)}"
+
+def _gemini_blocked_message(response: Any) -> Optional[str]:
+    feedback = getattr(response, "prompt_feedback", None)
+    if feedback and feedback.block_reason:
+        return f"PROMPT_BLOCKED:{feedback.block_reason_message or feedback.block_reason}"
+    return None
+
+# google-genai never closes a stream's HTTP response itself (its segment iterator and response form a
+# reference cycle, left to the garbage collector), so stream_text captures the response through a client
+# event hook and closes it. Only set while a stream's request is being sent.
+_gemini_stream_responses: contextvars.ContextVar[Optional[List[httpx.Response]]] = contextvars.ContextVar(
+    "gemini_stream_responses", default=None
+)
+
+async def _capture_gemini_stream_response(response: httpx.Response) -> None:
+    captured = _gemini_stream_responses.get()
+    if captured is not None:
+        captured.append(response)
+
+async def _start_gemini_stream(client: Any, model_id: str, prompt_text: str) -> Tuple[AsyncIterator[Any], Any, List[httpx.Response]]:
+    """Sends a streamed generation request; returns (chunks, first chunk or None, the HTTP responses to close)."""
+    responses: List[httpx.Response] = []
+    token = _gemini_stream_responses.set(responses)
+    try:
+        stream = await client.aio.models.generate_content_stream(model=model_id, contents=prompt_text)
+        first_chunk = await anext(stream, None) # The request goes out on the first iteration
+    finally:
+        _gemini_stream_responses.reset(token)
+    return stream, first_chunk, responses
+
 class GeminiProvider(BaseLLMProvider):
-    """LLM Provider for Google Gemini models."""
+    """
+    LLM Provider for Google Gemini models, via the google-genai SDK.
+    Each API key gets its own genai.Client from the client pool (the older google-generativeai SDK
+    only had a process-global genai.configure(), which let concurrent requests swap keys).
+    """
+    def _client(self, api_key: str):
+        return client_pool.get(
+            "gemini", api_key,
+            lambda transport: google_genai.Client(
+                api_key=api_key,
+                http_options=genai_types.HttpOptions(
+                    base_url=settings.GEMINI_BASE_URL or None,
+                    timeout=int(settings.LLM_HTTP_TIMEOUT_SECONDS * 1000), # Milliseconds
+                    async_client_args={
+                        "transport": transport,
+                        "verify": _gemini_ssl_context(), # Also used for the SDK's (unused) sync client
+                        "event_hooks": {"response": [_capture_gemini_stream_response]},
+                    },
+                ),
+            ),
+            http_client_factory=gemini_http_transport
+        )
+
     async def generate_text(self, api_key: str, model_id: str, prompt_text: str) -> Tuple[Optional[str], Optional[str]]:
         if not api_key:
             return None, "API_KEY_NOT_CONFIGURED" # Standardized error key
 
         try:
-            genai.configure(api_key=api_key)
-            # Use the model_id passed from the request
-            model = genai.GenerativeModel(model_id) 
-            response = await model.generate_content_async(prompt_text)
-            
-            if response.parts:
-                generated_text = "".join(part.text for part in response.parts if hasattr(part, 'text'))
-            elif hasattr(response, 'text') and response.text: # Fallback for older response structures if any
-                generated_text = response.text
-            else: # Handle cases where no usable text parts are found, including blocked prompts
-                if response.prompt_feedback and response.prompt_feedback.block_reason:
-                    return None, f"PROMPT_BLOCKED:{response.prompt_feedback.block_reason_message or response.prompt_feedback.block_reason}"
-                return None, "NO_TEXT_CONTENT_IN_RESPONSE"
-
-            return generated_text, None
-
-        except ValueError as ve: # Specific handling for model_id issues
-            print(f"ValueError with Gemini model {model_id}: {ve}")
-            if "model not found" in str(ve).lower() or "service not found" in str(ve).lower():
-                return None, f"MODEL_NOT_FOUND:{model_id}"
-            return None, f"GEMINI_API_ERROR:Invalid configuration or model ID '{model_id}'. {str(ve)}"
+            response = await self._client(api_key).aio.models.generate_content(model=model_id, contents=prompt_text)
+            if response.text:
+                return response.text, None
+            # Handle cases where no usable text parts are found, including blocked prompts
+            return None, _gemini_blocked_message(response) or "NO_TEXT_CONTENT_IN_RESPONSE"
         except Exception as e:
-            print(f"Error calling Gemini API with model {model_id}: {e}")
-            return None, f"GEMINI_API_ERROR:{str(e)}"
+            return None, _gemini_error_message(e, model_id)
+
+    async def stream_text(self, api_key: str, model_id: str, prompt_text: str) -> AsyncIterator[str]:
+        if not api_key:
+            raise LLMProviderError("API_KEY_NOT_CONFIGURED")
+
+        try:
+            stream, chunk, responses = await _start_gemini_stream(self._client(api_key), model_id, prompt_text)
+            yielded_any = False
+            last_chunk = None
+            try:
+                while chunk is not None:
+                    last_chunk = chunk
+                    if chunk.text:
+                        yielded_any = True
+                        yield chunk.text
+                    chunk = await anext(stream, None)
+            finally:
+                await stream.aclose()
+                for response in responses:
+                    await response.aclose() # Closes the HTTP response, aborting generation, if we stop early
+            if not yielded_any:
+                raise LLMProviderError(_gemini_blocked_message(last_chunk) or "NO_TEXT_CONTENT_IN_RESPONSE")
+        except LLMProviderError:
+            raise
+        except Exception as e:
+            raise LLMProviderError(_gemini_error_message(e, model_id))
+
+def _openai_error_message(e: Exception, model_id: str) -> str:
+    if isinstance(e, OpenAIAPIError) and getattr(e, "status_code", None) is not None:
+        # Handle API errors (e.g., rate limits, server errors from OpenAI)
+        print(f"OpenAI API Error with model {model_id}: {e}")
+        error_message = f"OPENAI_API_ERROR:{e.status_code} - {e.message or e.code or 'Unknown API Error'}"
+        if e.status_code == 401: # Authentication error
+            error_message = "OPENAI_AUTHENTICATION_ERROR:Invalid API key or insufficient permissions."
+        elif e.status_code == 404: # Model not found (though often caught by model validation first)
+             error_message = f"OPENAI_MODEL_NOT_FOUND:{model_id}"
+        elif e.status_code == 429: # Rate limit
+            error_message = "OPENAI_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later."
+            note_retry_after(e)
+        # Add more specific status code handling if needed
+        return error_message
+    if isinstance(e, openai.APITimeoutError):
+        return f"OPENAI_TIMEOUT:Request to OpenAI timed out for model {model_id}"
+    if isinstance(e, openai.APIConnectionError):
+        return f"OPENAI_CONNECTION_ERROR:{str(e)}"
+    # Handle other unexpected errors
+    print(f"Unexpected error calling OpenAI API with model {model_id}: {e}")
+    return f"OPENAI_UNEXPECTED_ERROR:{str(e)}"
 
 class OpenAIProvider(BaseLLMProvider):
     """LLM Provider for OpenAI models (e.g., GPT-3.5, GPT-4)."""
+    def _client(self, api_key: str):
+        return client_pool.get(
+            "openai", api_key,
+            lambda http_client: AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0),
+            http_client_factory=lambda: sdk_http_client(openai)
+        )
+
     async def generate_text(self, api_key: str, model_id: str, prompt_text: str) -> Tuple[Optional[str], Optional[str]]:
         if NO_OPENAI_LIB:
             print("OpenAI library is not installed. Please run 'pip install openai'")
@@ -81,7 +327,7 @@ class OpenAIProvider(BaseLLMProvider):
         if not api_key:
             return None, "API_KEY_NOT_CONFIGURED"
 
-        client = AsyncOpenAI(api_key=api_key)
+        client = self._client(api_key)
         try:
             response = await client.chat.completions.create(
                 model=model_id,
@@ -94,25 +340,59 @@ class OpenAIProvider(BaseLLMProvider):
                 # This case might indicate an unexpected response structure or an empty message
                 print(f"OpenAI API response for model {model_id} lacked expected content: {response}")
                 return None, "OPENAI_UNEXPECTED_RESPONSE_STRUCTURE"
-        except OpenAIAPIError as e:
-            # Handle API errors (e.g., rate limits, server errors from OpenAI)
-            print(f"OpenAI API Error with model {model_id}: {e}")
-            error_message = f"OPENAI_API_ERROR:{e.status_code} - {e.message or e.code or 'Unknown API Error'}"
-            if e.status_code == 401: # Authentication error
-                error_message = "OPENAI_AUTHENTICATION_ERROR:Invalid API key or insufficient permissions."
-            elif e.status_code == 404: # Model not found (though often caught by model validation first)
-                 error_message = f"OPENAI_MODEL_NOT_FOUND:{model_id}"
-            elif e.status_code == 429: # Rate limit
-                error_message = "OPENAI_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later."
-            # Add more specific status code handling if needed
-            return None, error_message
         except Exception as e:
-            # Handle other unexpected errors (network issues, etc.)
-            print(f"Unexpected error calling OpenAI API with model {model_id}: {e}")
-            return None, f"OPENAI_UNEXPECTED_ERROR:{str(e)}"
+            return None, _openai_error_message(e, model_id)
+
+    async def stream_text(self, api_key: str, model_id: str, prompt_text: str) -> AsyncIterator[str]:
+        if NO_OPENAI_LIB:
+            raise LLMProviderError("OPENAI_LIB_NOT_INSTALLED")
+        if not api_key:
+            raise LLMProviderError("API_KEY_NOT_CONFIGURED")
+
+        try:
+            stream = await self._client(api_key).chat.completions.create(
+                model=model_id,
+                messages=[{"role": "user", "content": prompt_text}],
+                stream=True
+            )
+            async with stream: # Closes the HTTP response, aborting generation, if we stop early
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise LLMProviderError(_openai_error_message(e, model_id))
+
+def _anthropic_error_message(e: Exception, model_id: str) -> str:
+    if isinstance(e, AnthropicAPIError) and getattr(e, "status_code", None) is not None:
+        print(f"Anthropic API Error with model {model_id}: {e}")
+        error_message = f"ANTHROPIC_API_ERROR:{e.status_code} - {e.message or e.body.get('error', {}).get('message', 'Unknown API Error') if e.body else 'Unknown API Error'}"
+        if e.status_code == 401: # Authentication error
+            error_message = "ANTHROPIC_AUTHENTICATION_ERROR:Invalid API key or insufficient permissions."
+        elif e.status_code == 403: # Permission denied, often for specific model access or feature
+            error_message = f"ANTHROPIC_PERMISSION_DENIED:Permission denied for model {model_id} or feature. {e.message or ''}"
+        elif e.status_code == 404: # Not found (can be model or endpoint)
+             error_message = f"ANTHROPIC_NOT_FOUND:{model_id} or endpoint not found."
+        elif e.status_code == 429: # Rate limit
+            error_message = "ANTHROPIC_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later."
+            note_retry_after(e)
+        # Add more specific status code handling if needed
+        return error_message
+    if isinstance(e, anthropic.APITimeoutError):
+        return f"ANTHROPIC_TIMEOUT:Request to Anthropic timed out for model {model_id}"
+    if isinstance(e, anthropic.APIConnectionError):
+        return f"ANTHROPIC_CONNECTION_ERROR:{str(e)}"
+    print(f"Unexpected error calling Anthropic API with model {model_id}: {e}")
+    return f"ANTHROPIC_UNEXPECTED_ERROR:{str(e)}"
 
 class AnthropicProvider(BaseLLMProvider):
     """LLM Provider for Anthropic Claude models."""
+    def _client(self, api_key: str):
+        return client_pool.get(
+            "anthropic", api_key,
+            lambda http_client: AsyncAnthropic(api_key=api_key, http_client=http_client, max_retries=0),
+            http_client_factory=lambda: sdk_http_client(anthropic)
+        )
+
     async def generate_text(self, api_key: str, model_id: str, prompt_text: str, max_tokens_to_sample: int = 2048) -> Tuple[Optional[str], Optional[str]]:
         if NO_ANTHROPIC_LIB:
             print("Anthropic library is not installed. Please run 'pip install anthropic'")
@@ -121,7 +401,7 @@ class AnthropicProvider(BaseLLMProvider):
         if not api_key:
             return None, "API_KEY_NOT_CONFIGURED"
 
-        client = AsyncAnthropic(api_key=api_key)
+        client = self._client(api_key)
         try:
             response = await client.messages.create(
                 model=model_id,
@@ -133,22 +413,68 @@ class AnthropicProvider(BaseLLMProvider):
             else:
                 print(f"Anthropic API response for model {model_id} lacked expected content: {response}")
                 return None, "ANTHROPIC_UNEXPECTED_RESPONSE_STRUCTURE"
-        except AnthropicAPIError as e:
-            print(f"Anthropic API Error with model {model_id}: {e}")
-            error_message = f"ANTHROPIC_API_ERROR:{e.status_code} - {e.message or e.body.get('error', {}).get('message', 'Unknown API Error') if e.body else 'Unknown API Error'}"
-            if e.status_code == 401: # Authentication error
-                error_message = "ANTHROPIC_AUTHENTICATION_ERROR:Invalid API key or insufficient permissions."
-            elif e.status_code == 403: # Permission denied, often for specific model access or feature
-                error_message = f"ANTHROPIC_PERMISSION_DENIED:Permission denied for model {model_id} or feature. {e.message or ''}"
-            elif e.status_code == 404: # Not found (can be model or endpoint)
-                 error_message = f"ANTHROPIC_NOT_FOUND:{model_id} or endpoint not found."
-            elif e.status_code == 429: # Rate limit
-                error_message = "ANTHROPIC_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later."
-            # Add more specific status code handling if needed
-            return None, error_message
         except Exception as e:
-            print(f"Unexpected error calling Anthropic API with model {model_id}: {e}")
-            return None, f"ANTHROPIC_UNEXPECTED_ERROR:{str(e)}"
+            return None, _anthropic_error_message(e, model_id)
+
+    async def stream_text(self, api_key: str, model_id: str, prompt_text: str, max_tokens_to_sample: int = 2048) -> AsyncIterator[str]:
+        if NO_ANTHROPIC_LIB:
+            raise LLMProviderError("ANTHROPIC_LIB_NOT_INSTALLED")
+        if not api_key:
+            raise LLMProviderError("API_KEY_NOT_CONFIGURED")
+
+        try:
+            async with self._client(api_key).messages.stream(
+                model=model_id,
+                max_tokens=max_tokens_to_sample,
+                messages=[{"role": "user", "content": prompt_text}]
+            ) as stream: # Leaving the block early closes the HTTP response
+                async for text in stream.text_stream:
+                    if text:
+                        yield text
+        except Exception as e:
+            raise LLMProviderError(_anthropic_error_message(e, model_id))
+
+def _mock_error_message(call: MockCall, model_id: str) -> str:
+    if call.error == "429":
+        note_retry_after_seconds(call.retry_after)
+        return "MOCK_RATE_LIMIT_EXCEEDED:Injected rate limit."
+    return f"MOCK_API_ERROR:{call.error} - Injected error for {model_id}"
+
+class MockProvider(BaseLLMProvider):
+    """
+    Offline provider for load tests, registered only when LLM_MOCK_PROVIDER_ENABLED is set.
+    Latency, streaming rate, injected errors and output all come from the model_id (see src.mock_llm.MockSpec);
+    outputs are deterministic per prompt. Any API key works.
+    """
+    async def generate_text(self, api_key: str, model_id: str, prompt_text: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            call = mock_llm.plan(model_id, prompt_text)
+        except ValueError as e:
+            return None, f"MOCK_API_ERROR:400 - {str(e)}"
+        await asyncio.sleep(call.first_token_delay)
+        if call.error == "timeout":
+            await asyncio.sleep(MOCK_HANG_SECONDS) # Hangs until the caller's timeout gives up
+            return None, "MOCK_TIMEOUT:Injected timeout"
+        if call.error:
+            return None, _mock_error_message(call, model_id)
+        await asyncio.sleep(call.chunk_delay * (len(call.chunks) - 1))
+        return call.text, None
+
+    async def stream_text(self, api_key: str, model_id: str, prompt_text: str) -> AsyncIterator[str]:
+        try:
+            call = mock_llm.plan(model_id, prompt_text)
+        except ValueError as e:
+            raise LLMProviderError(f"MOCK_API_ERROR:400 - {str(e)}")
+        await asyncio.sleep(call.first_token_delay)
+        if call.error == "timeout":
+            await asyncio.sleep(MOCK_HANG_SECONDS)
+            raise LLMProviderError("MOCK_TIMEOUT:Injected timeout")
+        if call.error:
+            raise LLMProviderError(_mock_error_message(call, model_id))
+        for i, chunk in enumerate(call.chunks):
+            if i and call.chunk_delay:
+                await asyncio.sleep(call.chunk_delay)
+            yield chunk
 
 # Provider Registry
 PROVIDER_REGISTRY: Dict[str, Type[BaseLLMProvider]] = {
@@ -157,6 +483,8 @@ PROVIDER_REGISTRY: Dict[str, Type[BaseLLMProvider]] = {
     "anthropic": AnthropicProvider,
     # Add other providers here
 }
+if settings.LLM_MOCK_PROVIDER_ENABLED:
+    PROVIDER_REGISTRY["mock"] = MockProvider
 
 async def get_llm_response(provider_name: str, api_key: str, model_id: str, prompt_text: str) -> Tuple[Optional[str], Optional[str]]:
     """
@@ -175,8 +503,60 @@ async def get_llm_response(provider_name: str, api_key: str, model_id: str, prom
     if not provider_class:
         return None, f"UNSUPPORTED_PROVIDER:{provider_name}"
 
+    # Resilience policy (breaker, retries, hedging) -> rate limiter (pacing, 429 backoff) -> provider call with a timeout
+    provider_name = provider_name.lower()
     provider_instance = provider_class()
-    return await provider_instance.generate_text(api_key=api_key, model_id=model_id, prompt_text=prompt_text)
 
+    async def attempt(timeout: float) -> Tuple[Optional[str], Optional[str]]:
+        return await llm_governor.run(
+            provider_name, api_key, prompt_text,
+            lambda: llm_resilience.with_timeout(
+                provider_name,
+                provider_instance.generate_text(api_key=api_key, model_id=model_id, prompt_text=prompt_text),
+                timeout
+            )
+        )
 
+    return await llm_resilience.call(provider_name, model_id, attempt)
 
+llm_single_flight = SingleFlight()
+
+async def get_llm_response_coalesced(
+    user_id: int, provider_name: str, api_key: str, model_id: str, prompt_text: str
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    get_llm_response, except that identical calls from the same user that overlap in time
+    (double-clicks, client retries) share a single upstream call and its result.
+    """
+    key = (user_id, provider_name.lower(), model_id, hashlib.sha256(prompt_text.encode()).hexdigest())
+    return await llm_single_flight.do(key, lambda: get_llm_response(provider_name, api_key, model_id, prompt_text))
+
+async def stream_llm_response(provider_name: str, api_key: str, model_id: str, prompt_text: str) -> AsyncIterator[str]:
+    """
+    Streams a response from the specified LLM provider and model as text deltas.
+    Raises LLMProviderError (with the same error strings as get_llm_response) on failure.
+    """
+    provider_class = PROVIDER_REGISTRY.get(provider_name.lower())
+    if not provider_class:
+        raise LLMProviderError(f"UNSUPPORTED_PROVIDER:{provider_name}")
+
+    # Streams respect the model's circuit breaker and hold a rate limiter slot until they end. They
+    # aren't retried or hedged (deltas may already be out), but failures still count.
+    provider_name = provider_name.lower()
+    error = llm_resilience.admit(provider_name, model_id)
+    if error:
+        raise LLMProviderError(error)
+    async with llm_governor.slot(provider_name, api_key, prompt_text) as error:
+        if error:
+            raise LLMProviderError(error)
+        output_tokens = 0
+        try:
+            async for delta in provider_class().stream_text(api_key=api_key, model_id=model_id, prompt_text=prompt_text):
+                output_tokens += estimate_tokens(delta)
+                yield delta
+        except LLMProviderError as e:
+            llm_governor.record_result(provider_name, api_key, str(e))
+            llm_resilience.record(provider_name, model_id, str(e))
+            raise
+        llm_governor.record_result(provider_name, api_key, None, output_tokens)
+        llm_resilience.record(provider_name, model_id, None)
@@ -1,21 +1,35 @@
 # backend/src/main.py
-from fastapi import FastAPI, HTTPException, status, Body, Depends
+from fastapi import FastAPI, HTTPException, status, Body, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict # Added Dict
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+import asyncio
+import time
+from typing import List, Dict, Optional # Added Dict
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src import schemas, crud, models
 from src.database import get_db
 from src.config import settings
-from src.llm_services import get_llm_response # New import
-from src.auth_utils import verify_token # Import the new dependency
+from src.llm_services import get_llm_response, get_llm_response_coalesced, stream_llm_response, LLMProviderError, client_pool
+from src.llm_cache import get_llm_response_cached
+from src.streaming import sse_response
+from src.auth_utils import get_current_user, get_read_db # Resolves the verified token to our User
 from src import tier_utils  # Import tier enforcement utilities
 from src.crud import crud_users  # Import user CRUD operations
 
 # Import the routers
-from src.routers import user_settings_router, stripe_billing_router
+from src.routers import user_settings_router, stripe_billing_router, batch_runs_router, metrics_router
+from src.batch_runner import batch_runner
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    batch_runner.start_resume_sweeper() # Picks up batch runs left unfinished by a restart
+    yield
+    await batch_runner.stop()
+    await client_pool.aclose() # Close the pooled LLM provider connections
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Prompt Library API",
     description="API for managing prompts, versions, notes, tags, and testing with LLMs.",
     version="0.6.0", # Incremented version for monetization features
@@ -36,53 +50,34 @@ async def read_root():
 # Include routers
 app.include_router(user_settings_router)
 app.include_router(stripe_billing_router)
+app.include_router(batch_runs_router)
+app.include_router(metrics_router)
 
 # -- User Tier Info Endpoint --
 @app.get("/user/tier-info", response_model=schemas.UserTierInfo, tags=["User"])
 async def get_user_tier_info(
-    db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    db: AsyncSession = Depends(get_read_db),
+    user: schemas.User = Depends(get_current_user)
 ):
     """Get user's tier information and limits."""
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
-    return tier_utils.check_user_tier_info(db, user.user_id)
+    return await tier_utils.check_user_tier_info(db, user.user_id)
 
 # -- User Preferences Endpoint --
 @app.get("/user/profile", response_model=schemas.User, tags=["User"])
 async def get_user_profile(
-    db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    user: schemas.User = Depends(get_current_user)
 ):
     """Get the user's profile data including tier and preferences."""
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
     return user
 
 @app.put("/user/paywall-modal-seen", status_code=status.HTTP_204_NO_CONTENT, tags=["User"])
 async def mark_paywall_modal_seen(
-    db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
     """Mark that the user has seen the paywall/tier selection modal."""
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
     # Update the user's has_seen_paywall_modal flag
-    success = crud_users.update_user_paywall_modal_seen(db, user.user_id, True)
+    success = await crud_users.update_user_paywall_modal_seen(db, user.user_id, True)
     if not success:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update user preference")
     
@@ -91,215 +86,301 @@ async def mark_paywall_modal_seen(
 # -- Prompt Endpoints --
 @app.get("/prompts", response_model=schemas.PromptListResponse, tags=["Prompts"])
 async def read_prompts(
-    skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    limit: int = Query(100, ge=1, le=500), cursor: Optional[str] = None,
+    skip: Optional[int] = Query(None, deprecated=True, description="Removed: pass next_cursor as ?cursor= instead"),
+    db: AsyncSession = Depends(get_read_db), user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
-    db_prompts = crud.get_prompts(db, user_id=user.user_id, skip=skip, limit=limit)
+    if skip: # Offset paging was replaced by keyset paging; fail loudly rather than return page 1 again
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The skip parameter is no longer supported. Pass the previous page's next_cursor as ?cursor= instead."
+        )
+    try:
+        db_prompts, next_cursor = await crud.get_prompts(db, user_id=user.user_id, limit=limit, cursor=cursor)
+    except ValueError as ve: # Malformed cursor
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
     schema_prompts = [crud._map_prompt_db_to_schema(p) for p in db_prompts]
-    return schemas.PromptListResponse(prompts=schema_prompts)
+    return schemas.PromptListResponse(prompts=schema_prompts, next_cursor=next_cursor)
+
+@app.get("/prompts/summary", response_model=schemas.PromptSummaryListResponse, tags=["Prompts"])
+async def read_prompt_summaries(
+    limit: int = Query(100, ge=1, le=500), cursor: Optional[str] = None, db: AsyncSession = Depends(get_read_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """Lightweight prompt list for the sidebar: no version bodies. Use GET /prompts/{prompt_id} for full detail."""
+    try:
+        rows, next_cursor = await crud.get_prompt_summaries(db, user_id=user.user_id, limit=limit, cursor=cursor)
+    except ValueError as ve: # Malformed cursor
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    summaries = [crud._map_prompt_summary_row_to_schema(row) for row in rows]
+    return schemas.PromptSummaryListResponse(prompts=summaries, next_cursor=next_cursor)
 
 @app.post("/prompts", response_model=schemas.Prompt, status_code=status.HTTP_201_CREATED, tags=["Prompts"])
 async def create_prompt(
-    prompt: schemas.PromptCreate, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    prompt: schemas.PromptCreate, db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
     # Enforce tier limits for prompt creation
-    tier_utils.enforce_prompt_creation_limit(db, user.user_id)
+    await tier_utils.enforce_prompt_creation_limit(db, user.user_id)
     
-    db_prompt = crud.create_db_prompt(db=db, prompt_data=prompt, user_id=user.user_id)
+    db_prompt = await crud.create_db_prompt(db=db, prompt_data=prompt, user_id=user.user_id)
     return crud._map_prompt_db_to_schema(db_prompt)
 
 @app.get("/prompts/{prompt_id}", response_model=schemas.Prompt, tags=["Prompts"])
 async def read_prompt(
-    prompt_id: str, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    prompt_id: str, db: AsyncSession = Depends(get_read_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
-    db_prompt = crud.get_prompt_by_prompt_id(db, prompt_id=prompt_id, user_id=user.user_id)
+    db_prompt = await crud.get_prompt_by_prompt_id(db, prompt_id=prompt_id, user_id=user.user_id)
     if db_prompt is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
     return crud._map_prompt_db_to_schema(db_prompt)
 
 @app.delete("/prompts/{prompt_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Prompts"])
 async def delete_prompt(
-    prompt_id: str, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    prompt_id: str, db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
-    success = crud.delete_db_prompt(db, prompt_id=prompt_id, user_id=user.user_id)
+    success = await crud.delete_db_prompt(db, prompt_id=prompt_id, user_id=user.user_id)
     if not success:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
 
 @app.put("/prompts/{prompt_id}", response_model=schemas.Prompt, tags=["Prompts"])
 async def update_prompt(
-    prompt_id: str, prompt_update: schemas.PromptUpdate, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    prompt_id: str, prompt_update: schemas.PromptUpdate, db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
-    db_prompt = crud.update_db_prompt(db, prompt_id=prompt_id, user_id=user.user_id, update_data=prompt_update)
+    db_prompt = await crud.update_db_prompt(db, prompt_id=prompt_id, user_id=user.user_id, update_data=prompt_update)
     if db_prompt is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
     return crud._map_prompt_db_to_schema(db_prompt)
 
 # -- Version Endpoints --
+@app.get("/prompts/{prompt_id}/versions", response_model=schemas.VersionListResponse, tags=["Versions"])
+async def read_versions(
+    prompt_id: str, limit: int = Query(20, ge=1, le=200), cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db), user: schemas.User = Depends(get_current_user)
+):
+    """Page through a prompt's version history, newest first."""
+    try:
+        result = await crud.get_prompt_versions(db, prompt_id=prompt_id, user_id=user.user_id, limit=limit, cursor=cursor)
+    except ValueError as ve: # Malformed cursor
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(ve))
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
+    db_versions, next_cursor = result
+    return schemas.VersionListResponse(
+        versions=[crud._map_version_db_to_schema(v) for v in db_versions],
+        next_cursor=next_cursor
+    )
+
 @app.post("/prompts/{prompt_id}/versions", response_model=schemas.Version, status_code=status.HTTP_201_CREATED, tags=["Versions"])
 async def create_version(
-    prompt_id: str, version: schemas.VersionCreate, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    prompt_id: str, version: schemas.VersionCreate, db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
     # Enforce tier limits for version creation
-    tier_utils.enforce_version_creation_limit(db, user.user_id, prompt_id)
+    await tier_utils.enforce_version_creation_limit(db, user.user_id, prompt_id)
     
-    db_version = crud.create_db_version(db=db, prompt_id=prompt_id, user_id=user.user_id, version_data=version)
+    db_version = await crud.create_db_version(db=db, prompt_id=prompt_id, user_id=user.user_id, version_data=version)
     if db_version is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
     
-    return schemas.Version(
-        id=db_version.id,
-        version_id=db_version.version_id_str,
-        text=db_version.text,
-        notes=db_version.notes,
-        date=db_version.created_at.isoformat() if db_version.created_at else crud.get_current_date_str(),
-        llm_provider=db_version.llm_provider,
-        model_id_used=db_version.model_id_used
-    )
+    return crud._map_version_db_to_schema(db_version)
 
 @app.put("/prompts/{prompt_id}/versions/{version_id}/notes", response_model=schemas.Version, tags=["Versions"])
 async def update_version_notes(
-    prompt_id: str, version_id: str, note_update: schemas.NoteUpdate, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    prompt_id: str, version_id: str, note_update: schemas.NoteUpdate, db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
-    db_version = crud.update_db_version_notes(db, prompt_id=prompt_id, user_id=user.user_id, version_id_str=version_id, notes=note_update.notes)
+    db_version = await crud.update_db_version_notes(db, prompt_id=prompt_id, user_id=user.user_id, version_id_str=version_id, notes=note_update.notes)
     if db_version is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt or version not found")
     
-    return schemas.Version(
-        id=db_version.id,
-        version_id=db_version.version_id_str,
-        text=db_version.text,
-        notes=db_version.notes,
-        date=db_version.created_at.isoformat() if db_version.created_at else crud.get_current_date_str(),
-        llm_provider=db_version.llm_provider,
-        model_id_used=db_version.model_id_used
-    )
+    return crud._map_version_db_to_schema(db_version)
 
 # -- Tag Endpoints --
 @app.post("/prompts/{prompt_id}/tags", response_model=schemas.Prompt, tags=["Tags"])
 async def add_tag(
-    prompt_id: str, tag: schemas.SingleTagAdd, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    prompt_id: str, tag: schemas.SingleTagAdd, db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
-    db_prompt = crud.add_db_tag(db, prompt_id=prompt_id, user_id=user.user_id, tag_create_data=tag)
+    db_prompt = await crud.add_db_tag(db, prompt_id=prompt_id, user_id=user.user_id, tag_create_data=tag)
     if db_prompt is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
     return crud._map_prompt_db_to_schema(db_prompt)
 
 @app.delete("/prompts/{prompt_id}/tags/{tag_name}", response_model=schemas.Prompt, tags=["Tags"])
 async def remove_tag(
-    prompt_id: str, tag_name: str, db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    prompt_id: str, tag_name: str, db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User ID not found in token")
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
-    
-    db_prompt = crud.remove_db_tag(db, prompt_id=prompt_id, user_id=user.user_id, tag_name=tag_name)
+    db_prompt = await crud.remove_db_tag(db, prompt_id=prompt_id, user_id=user.user_id, tag_name=tag_name)
     if db_prompt is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
     return crud._map_prompt_db_to_schema(db_prompt)
 
 # --- Playground Endpoint ---
+async def _get_playground_api_key(db: AsyncSession, user: schemas.User, llm_provider: str) -> str:
+    decrypted_key = await crud.get_decrypted_api_key(db=db, user_id=user.user_id, llm_provider=llm_provider)
+    if not decrypted_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No API key found for provider '{llm_provider}'. Please add your API key in settings."
+        )
+    return decrypted_key
+
 @app.post("/playground/test", response_model=schemas.PlaygroundResponse, tags=["Playground"])
 async def test_prompt_in_playground(
     request: schemas.PlaygroundRequest,
-    db: Session = Depends(get_db), # Added db session dependency
-    current_user: Dict = Depends(verify_token) # Protect endpoint
+    db: AsyncSession = Depends(get_db), # Added db session dependency
+    user: schemas.User = Depends(get_current_user) # Protect endpoint
 ):
-    auth0_id = current_user.get('sub')
-    if not auth0_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials or user ID missing."
+    llm_provider_from_request = request.llm_provider.lower() # Normalize to lowercase
+    decrypted_key = await _get_playground_api_key(db, user, llm_provider_from_request)
+
+    try:
+        # Call the LLM service with the user's API key
+        cached = False
+        if request.use_cache:
+            output_text, error, cached = await get_llm_response_cached(
+                user_id=user.user_id,
+                provider_name=llm_provider_from_request,
+                api_key=decrypted_key,
+                model_id=request.model_id,
+                prompt_text=request.prompt_text
+            )
+        else:
+            output_text, error = await get_llm_response_coalesced(
+                user_id=user.user_id,
+                provider_name=llm_provider_from_request,
+                api_key=decrypted_key,
+                model_id=request.model_id,
+                prompt_text=request.prompt_text
+            )
+        if error:
+            return schemas.PlaygroundResponse(error=error)
+        return schemas.PlaygroundResponse(output_text=output_text, cached=cached)
+    except Exception as e:
+        return schemas.PlaygroundResponse(error=str(e))
+
+@app.post("/playground/test/stream", tags=["Playground"])
+async def stream_prompt_in_playground(
+    request: schemas.PlaygroundRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """
+    Streams the model's output as Server-Sent Events:
+    `delta` events carry {"text": ...} chunks, followed by a final `done` ({}) or `error` ({"error": ...}) event.
+    Closing the connection aborts the upstream provider call.
+    """
+    llm_provider_from_request = request.llm_provider.lower()
+    decrypted_key = await _get_playground_api_key(db, user, llm_provider_from_request) # Fails before the stream starts
+
+    async def events():
+        deltas = stream_llm_response(
+            provider_name=llm_provider_from_request,
+            api_key=decrypted_key,
+            model_id=request.model_id,
+            prompt_text=request.prompt_text
         )
+        try:
+            async for delta in deltas:
+                yield "delta", {"text": delta}
+            yield "done", {}
+        except LLMProviderError as e:
+            yield "error", {"error": str(e)}
+        finally:
+            await deltas.aclose()
 
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
+    return sse_response(http_request, events())
 
-    llm_provider_from_request = request.llm_provider.lower() # Normalize to lowercase
 
-    # If not using dev override, fetch user's key
-    decrypted_key = crud.get_decrypted_api_key(db=db, user_id=user.user_id, llm_provider=llm_provider_from_request)
-    if not decrypted_key:
+# --- Playground Compare Endpoints ---
+async def _prepare_compare_targets(db: AsyncSession, user: schemas.User, request: schemas.PlaygroundCompareRequest):
+    """Validates the request and resolves each target's API key (a missing key becomes that target's error)."""
+    if len(request.targets) > settings.PLAYGROUND_COMPARE_MAX_TARGETS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"No API key found for provider '{llm_provider_from_request}'. Please add your API key in settings."
+            detail=f"At most {settings.PLAYGROUND_COMPARE_MAX_TARGETS} models can be compared at once."
         )
+    timeout = min(request.timeout_seconds or settings.PLAYGROUND_COMPARE_TIMEOUT_SECONDS, settings.PLAYGROUND_COMPARE_TIMEOUT_SECONDS)
+    api_keys = {} # Looked up once per provider, before fanning out (the session isn't shared with the tasks)
+    for target in request.targets:
+        provider = target.llm_provider.lower()
+        if provider not in api_keys:
+            api_keys[provider] = await crud.get_decrypted_api_key(db=db, user_id=user.user_id, llm_provider=provider)
+    return timeout, api_keys
 
-    try:
-        # Call the LLM service with the user's API key
-        output_text = get_llm_response(
-            prompt_text=request.prompt_text,
-            llm_provider=llm_provider_from_request,
-            api_key=decrypted_key,
-            model_id=request.model_id
-        )
-        return schemas.PlaygroundResponse(output_text=output_text)
-    except Exception as e:
-        return schemas.PlaygroundResponse(error=str(e))
+async def _run_compare_target(target: schemas.CompareTarget, api_key: Optional[str], prompt_text: str, timeout: float) -> schemas.CompareResult:
+    started = time.perf_counter()
+    output_text, error = None, None
+    if not api_key:
+        error = "API_KEY_NOT_CONFIGURED"
+    else:
+        try:
+            output_text, error = await asyncio.wait_for(
+                get_llm_response(
+                    provider_name=target.llm_provider.lower(),
+                    api_key=api_key,
+                    model_id=target.model_id,
+                    prompt_text=prompt_text
+                ),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            error = f"TIMEOUT:No response within {timeout:g}s"
+        except Exception as e:
+            error = str(e)
+    return schemas.CompareResult(
+        llm_provider=target.llm_provider,
+        model_id=target.model_id,
+        output_text=output_text,
+        error=error,
+        latency_ms=int((time.perf_counter() - started) * 1000)
+    )
+
+@app.post("/playground/compare", response_model=schemas.PlaygroundCompareResponse, tags=["Playground"])
+async def compare_prompt_in_playground(
+    request: schemas.PlaygroundCompareRequest,
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """Runs the prompt on every target concurrently; takes as long as the slowest target (or its timeout)."""
+    timeout, api_keys = await _prepare_compare_targets(db, user, request)
+    results = await asyncio.gather(*(
+        _run_compare_target(target, api_keys[target.llm_provider.lower()], request.prompt_text, timeout)
+        for target in request.targets
+    ))
+    return schemas.PlaygroundCompareResponse(results=results)
+
+@app.post("/playground/compare/stream", tags=["Playground"])
+async def stream_compare_prompt_in_playground(
+    request: schemas.PlaygroundCompareRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """
+    Like /playground/compare, but sends each target's result as a Server-Sent `result` event
+    ({"index": <position in targets>, ...CompareResult}) as soon as it finishes, then `done`.
+    """
+    timeout, api_keys = await _prepare_compare_targets(db, user, request)
+
+    async def events():
+        async def indexed(index, target):
+            return index, await _run_compare_target(target, api_keys[target.llm_provider.lower()], request.prompt_text, timeout)
+
+        tasks = [asyncio.create_task(indexed(index, target)) for index, target in enumerate(request.targets)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result = await next_done
+                yield "result", {"index": index, **result.model_dump()}
+            yield "done", {}
+        finally:
+            for task in tasks:
+                task.cancel() # Abandon the remaining calls if the client went away
 
+    return sse_response(http_request, events())
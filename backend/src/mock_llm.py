@@ -0,0 +1,117 @@
+# backend/src/mock_llm.py
+# Deterministic fake LLM behaviour for load tests, shared by the `mock` provider in llm_services
+# (LLM_MOCK_PROVIDER_ENABLED) and the wire-format stand-in in scripts/mock_llm_server.py.
+
+import hashlib
+import math
+import random
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from src.cache_utils import TTLCache
+
+WORDS = (
+    "the model considered your prompt and produced this deterministic mock answer with enough "
+    "varied words to look like text while staying identical for identical prompts every time"
+).split()
+ERROR_KINDS = ("429", "500", "503", "529", "timeout")
+
+
+class MockSpec:
+    """
+    Behaviour of one mock model, parsed from its model_id: a name plus optional query parameters,
+    e.g. "fast?latency_ms=20&p99_ms=200&tps=100&tokens=64&errors=429:0.05,500:0.01,timeout:0.01&seed=7".
+
+    - latency_ms / p99_ms: median and 99th percentile time to first token (log-normal; no jitter if p99 is omitted)
+    - tps: output tokens streamed per second after the first (0 = everything at once)
+    - tokens: output length in tokens (words)
+    - errors: injected failure rates by kind (429, 500, 503, 529, timeout)
+    - retry_after: seconds advertised with injected 429s
+    - seed: seeds the latency/error sequence, so a run replays identically
+    """
+
+    def __init__(self, model_id: str):
+        name, _, query = model_id.partition("?")
+        params = dict(parse_qsl(query))
+        self.name = name or "mock"
+        self.latency_ms = float(params.get("latency_ms", 200))
+        self.p99_ms = float(params.get("p99_ms", self.latency_ms))
+        self.tokens_per_second = float(params.get("tps", 0))
+        self.output_tokens = int(params.get("tokens", 32))
+        self.retry_after = float(params.get("retry_after", 1))
+        self.seed = int(params.get("seed", 0))
+        self.error_rates: Dict[str, float] = {}
+        for item in filter(None, params.get("errors", "").split(",")):
+            kind, _, rate = item.partition(":")
+            if kind not in ERROR_KINDS:
+                raise ValueError(f"Unknown mock error kind '{kind}' (expected one of {', '.join(ERROR_KINDS)})")
+            self.error_rates[kind] = float(rate)
+        if self.p99_ms < self.latency_ms:
+            raise ValueError("p99_ms must be at least latency_ms")
+
+
+class MockCall:
+    """What one mock call does: wait first_token_delay, then fail with `error` or emit `chunks` chunk_delay apart."""
+
+    def __init__(self, first_token_delay: float, error: Optional[str], chunks: List[str], chunk_delay: float, retry_after: float):
+        self.first_token_delay = first_token_delay
+        self.error = error
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.retry_after = retry_after
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+def mock_text(model_name: str, prompt_text: str, tokens: int) -> List[str]:
+    """Deterministic output for (model, prompt), as one chunk per token."""
+    digest = b""
+    counter = 0
+    while len(digest) < tokens:
+        digest += hashlib.sha256(f"{model_name}\0{prompt_text}\0{counter}".encode()).digest()
+        counter += 1
+    return [("" if i == 0 else " ") + WORDS[digest[i] % len(WORDS)] for i in range(tokens)]
+
+
+class MockLLM:
+    """
+    Plans mock calls. Each model_id gets its own seeded random sequence (latency and injected errors).
+    model_ids come from requests, so only the max_sequences most recently used are kept; an evicted
+    one starts over from its seed.
+    """
+
+    def __init__(self, max_sequences: int = 1024):
+        self._rngs = TTLCache(maxsize=max_sequences)
+        self._lock = threading.Lock() # The HTTP stand-in plans calls from several threads
+
+    def plan(self, model_id: str, prompt_text: str) -> MockCall:
+        spec = MockSpec(model_id)
+        with self._lock:
+            rng = self._rngs.get(model_id)
+            if rng is None:
+                rng = random.Random(spec.seed)
+                self._rngs.set(model_id, rng)
+            latency = spec.latency_ms
+            if spec.p99_ms > spec.latency_ms:
+                sigma = math.log(spec.p99_ms / spec.latency_ms) / 2.326 # z-score of the 99th percentile
+                latency = spec.latency_ms * math.exp(rng.gauss(0, sigma))
+            roll = rng.random()
+        error = None
+        for kind, rate in spec.error_rates.items():
+            if roll < rate:
+                error = kind
+                break
+            roll -= rate
+        chunks = mock_text(spec.name, prompt_text, spec.output_tokens)
+        chunk_delay = 1 / spec.tokens_per_second if spec.tokens_per_second > 0 else 0.0
+        return MockCall(latency / 1000, error, chunks, chunk_delay, spec.retry_after)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._rngs.clear()
+
+
+mock_llm = MockLLM()
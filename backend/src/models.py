@@ -1,7 +1,7 @@
 # Defines SQLAlchemy ORM models corresponding to database tables
 
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Text, ForeignKey, JSON, Index, DateTime, func, LargeBinary, Boolean
+    create_engine, Column, Integer, String, Text, ForeignKey, JSON, Index, DateTime, func, LargeBinary, Boolean, text
 )
 from sqlalchemy.orm import relationship, declarative_base, Mapped, mapped_column
 from sqlalchemy.ext.mutable import MutableDict # Needed for JSON mutation tracking
@@ -26,6 +26,12 @@ class User(Base):
     subscription_end_date = Column(DateTime(timezone=True), nullable=True) # e.g., "2025-01-01 00:00:00"
     stripe_customer_id = Column(String(255), nullable=True) # Stripe customer id
     has_seen_paywall_modal = Column(Boolean, nullable=False, default=False) # Track if user has seen tier selection modal
+    next_prompt_number = Column(Integer, nullable=False, default=1, server_default="1") # Suffix of the user's next prompt_id
+
+    __table_args__ = (
+        Index('ix_userdb_stripe_customer_id', 'stripe_customer_id', postgresql_where=text('stripe_customer_id IS NOT NULL')),
+        Index('ix_userdb_email', 'email', postgresql_where=text('email IS NOT NULL')),
+    )
 
 class PromptDB(Base):
     """SQLAlchemy model for the 'prompts' table."""
@@ -40,6 +46,8 @@ class PromptDB(Base):
     # For complex tag querying, a separate Tag table and many-to-many relationship is better
     tags: Mapped[list] = mapped_column(JSON, nullable=False, default=[])
     latest_version: Mapped[str] = mapped_column(String, nullable=False) # e.g., "v3"
+    # Number the next version will get; incremented with UPDATE ... RETURNING when a version is created
+    next_version_number: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationship to versions (one-to-many)
     # 'cascade="all, delete-orphan"' means versions are deleted when the prompt is deleted
@@ -50,10 +58,9 @@ class PromptDB(Base):
         foreign_keys="[PromptVersionDB.prompt_id]"
     )
 
-    # Add an index for searching by title
+    # Keyset pagination of a user's prompts (WHERE user_id = ? AND id > ? ORDER BY id)
     __table_args__ = (
-        Index('ix_prompt_title', 'title'),
-        Index('ix_prompt_user_id', 'user_id'),
+        Index('ix_prompts_user_id_id', 'user_id', 'id'),
         {"extend_existing": True}
     )
 
@@ -92,3 +99,73 @@ class PromptVersionDB(Base):
         back_populates="versions",
         foreign_keys="[PromptVersionDB.prompt_id]"
     )
+
+    # A prompt's versions in order; the included columns cover the summary list's count/max subqueries
+    __table_args__ = (
+        Index(
+            'ix_prompt_versions_prompt_id_version_number', 'prompt_id', 'version_number',
+            postgresql_include=['id', 'created_at', 'updated_at']
+        ),
+    )
+
+class BatchRunDB(Base):
+    """One prompt version evaluated against a dataset of template variables."""
+    __tablename__ = "batch_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("userdb.user_id", ondelete="CASCADE"), nullable=False)
+    prompt_version_id: Mapped[int] = mapped_column(Integer, ForeignKey("prompt_versions.id", ondelete="CASCADE"), nullable=False)
+    llm_provider: Mapped[str] = mapped_column(String, nullable=False)
+    model_id: Mapped[str] = mapped_column(String, nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False, default="pending") # pending, running, completed, failed, cancelled
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    total_rows: Mapped[int] = mapped_column(Integer, nullable=False)
+    completed_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0) # Rows with an output
+    failed_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0) # Rows that ended with an error
+    # The process currently executing the run; another process may take over once the lease expires
+    lease_owner: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    lease_expires_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    started_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    prompt_version = relationship("PromptVersionDB")
+
+    __table_args__ = (
+        Index('ix_batch_runs_prompt_version_id', 'prompt_version_id'),
+        Index('ix_batch_runs_user_id', 'user_id'),
+        Index('ix_batch_runs_status', 'status'),
+    )
+
+class BatchRunRowDB(Base):
+    """One dataset row of a batch run and the model's result for it."""
+    __tablename__ = "batch_run_rows"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    batch_run_id: Mapped[int] = mapped_column(Integer, ForeignKey("batch_runs.id", ondelete="CASCADE"), nullable=False)
+    row_index: Mapped[int] = mapped_column(Integer, nullable=False)
+    variables: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False, default="pending") # pending, completed, failed
+    output_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    latency_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    completed_at: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('ix_batch_run_rows_run_id_row_index', 'batch_run_id', 'row_index', unique=True),
+    )
+
+class LLMResponseCacheDB(Base):
+    """Optional shared tier of the playground response cache (see src/llm_cache.py)."""
+    __tablename__ = "llm_response_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True) # sha256 of user, provider, model, prompt and params
+    llm_provider: Mapped[str] = mapped_column(String, nullable=False)
+    model_id: Mapped[str] = mapped_column(String, nullable=False)
+    output_text: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    expires_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index('ix_llm_response_cache_expires_at', 'expires_at'),
+    )
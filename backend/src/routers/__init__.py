@@ -1,4 +1,6 @@
 from .user_settings import router as user_settings_router
 from .stripe_billing import router as stripe_billing_router
+from .batch_runs import router as batch_runs_router
+from .metrics import router as metrics_router
 
-__all__ = ["user_settings_router", "stripe_billing_router"] 
\ No newline at end of file
+__all__ = ["user_settings_router", "stripe_billing_router", "batch_runs_router", "metrics_router"] 
\ No newline at end of file
@@ -0,0 +1,155 @@
+# backend/src/routers/batch_runs.py
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from src import schemas
+from src.config import settings
+from src.crud import crud_batch_runs
+from src.database import get_db, AsyncSessionLocal
+from src.auth_utils import get_current_user # For securing endpoints
+from src.batch_runner import batch_runner, parse_dataset
+from src.streaming import sse_response
+
+router = APIRouter(tags=["Batch Runs"])
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+PROGRESS_POLL_SECONDS = 1.0
+
+
+@router.post(
+    "/prompts/{prompt_id}/versions/{version_id}/batch-runs",
+    response_model=schemas.BatchRun,
+    status_code=status.HTTP_201_CREATED
+)
+async def create_batch_run_endpoint(
+    prompt_id: str,
+    version_id: str,
+    run_data: schemas.BatchRunCreate,
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """
+    Starts evaluating a prompt version against every row of a dataset. The version's {{variable}}
+    placeholders are filled from each row. Poll GET /batch-runs/{id} or stream /batch-runs/{id}/events for progress.
+    """
+    if run_data.rows is not None:
+        rows = run_data.rows
+    else:
+        try:
+            rows = parse_dataset(run_data.dataset, run_data.dataset_format)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid dataset: {str(e)}")
+    if not rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The dataset has no rows.")
+    if len(rows) > settings.BATCH_RUN_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch run can have at most {settings.BATCH_RUN_MAX_ROWS} rows."
+        )
+
+    run = await crud_batch_runs.create_batch_run(
+        db=db,
+        user_id=user.user_id,
+        prompt_id=prompt_id,
+        version_id=version_id,
+        llm_provider=run_data.llm_provider,
+        model_id=run_data.model_id,
+        rows=rows
+    )
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt or version not found")
+    batch_runner.start(run.id)
+    return run
+
+
+@router.get("/prompts/{prompt_id}/versions/{version_id}/batch-runs", response_model=List[schemas.BatchRun])
+async def list_batch_runs_endpoint(
+    prompt_id: str,
+    version_id: str,
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    return await crud_batch_runs.get_batch_runs_for_version(db, prompt_id=prompt_id, version_id=version_id, user_id=user.user_id)
+
+
+@router.get("/batch-runs/{run_id}", response_model=schemas.BatchRun)
+async def get_batch_run_endpoint(
+    run_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    run = await crud_batch_runs.get_batch_run(db, run_id=run_id, user_id=user.user_id)
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch run not found")
+    return run
+
+
+@router.get("/batch-runs/{run_id}/rows", response_model=schemas.BatchRunRowListResponse)
+async def get_batch_run_rows_endpoint(
+    run_id: int,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    try:
+        page = await crud_batch_runs.get_batch_run_rows(db, run_id=run_id, user_id=user.user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch run not found")
+    rows, next_cursor = page
+    return schemas.BatchRunRowListResponse(rows=rows, next_cursor=next_cursor)
+
+
+@router.post("/batch-runs/{run_id}/cancel", response_model=schemas.BatchRun)
+async def cancel_batch_run_endpoint(
+    run_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    run = await crud_batch_runs.cancel_batch_run(db, run_id=run_id, user_id=user.user_id)
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch run not found")
+    batch_runner.abort(run_id)
+    return run
+
+
+@router.get("/batch-runs/{run_id}/events")
+async def stream_batch_run_progress_endpoint(
+    run_id: int,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
+):
+    """
+    Streams progress as Server-Sent Events: a `progress` event (the BatchRun) whenever the
+    counters or status change, ending with `done` once the run is completed, failed or cancelled.
+    """
+    user_id = user.user_id
+    if await crud_batch_runs.get_batch_run(db, run_id=run_id, user_id=user_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch run not found")
+
+    async def read_progress() -> Optional[schemas.BatchRun]:
+        async with AsyncSessionLocal() as session: # Own session: the request's is closed once streaming starts
+            return await crud_batch_runs.get_batch_run(session, run_id=run_id, user_id=user_id)
+
+    async def events():
+        last_sent = None
+        while True:
+            run = await read_progress()
+            if run is None:
+                yield "error", {"error": "BATCH_RUN_DELETED"}
+                return
+            snapshot = (run.status, run.completed_rows, run.failed_rows)
+            if snapshot != last_sent:
+                last_sent = snapshot
+                yield "progress", run.model_dump(mode="json")
+            if run.status in TERMINAL_STATUSES:
+                yield "done", {}
+                return
+            await asyncio.sleep(PROGRESS_POLL_SECONDS)
+
+    return sse_response(http_request, events())
@@ -0,0 +1,43 @@
+# backend/src/routers/metrics.py
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from typing import Any, Dict, Optional
+
+from src.auth_utils import _verified_token_cache
+from src.config import settings
+from src.crud.crud_api_keys import _decrypted_key_cache
+from src.crud.crud_users import _user_cache
+from src.database import pool_metrics, read_session_router
+from src import llm_cache
+from src.llm_rate_limiter import llm_governor
+from src.llm_resilience import llm_resilience
+from src.llm_services import client_pool, llm_single_flight
+
+def require_metrics_token(x_metrics_token: Optional[str] = Header(None)) -> None:
+    """Admits scrapers holding settings.METRICS_TOKEN; without one configured the endpoint doesn't exist."""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_metrics_token or not secrets.compare_digest(x_metrics_token.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing X-Metrics-Token header")
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+    dependencies=[Depends(require_metrics_token)],
+)
+
+@router.get("")
+async def get_metrics() -> Dict[str, Any]:
+    """In-process cache and connection pool counters for this worker (no user data)."""
+    return {
+        "llm_response_cache": llm_cache.llm_response_cache.stats(),
+        "llm_client_pool": client_pool.stats(),
+        "llm_single_flight": llm_single_flight.stats(),
+        "llm_rate_limiter": llm_governor.stats(),
+        "llm_resilience": llm_resilience.stats(),
+        "auth_token_cache": _verified_token_cache.stats(),
+        "user_cache": _user_cache.stats(),
+        "api_key_cache": _decrypted_key_cache.stats(),
+        "db_pool": pool_metrics.stats(),
+        "db_read_routing": read_session_router.stats(),
+    }
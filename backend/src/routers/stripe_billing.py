@@ -1,7 +1,7 @@
 # backend/src/routers/stripe_billing.py
 from fastapi import APIRouter, HTTPException, status, Depends, Request, Header
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Optional
 import stripe
 import hmac
@@ -14,7 +14,7 @@ from src.database import get_db
 from src.config import settings
 from src import schemas
 from src.crud import crud_users
-from src.auth_utils import verify_token
+from src.auth_utils import get_current_user
 
 # Configure Stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -27,8 +27,8 @@ router = APIRouter(prefix="/billing", tags=["Billing"])
 @router.post("/create-checkout-session", response_model=schemas.StripeCheckoutResponse)
 async def create_checkout_session(
     request: schemas.StripeCheckoutRequest,
-    current_user: Dict = Depends(verify_token),
-    db: Session = Depends(get_db)
+    user: schemas.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a Stripe Checkout session for subscription upgrade."""
     if not settings.STRIPE_SECRET_KEY:
@@ -37,15 +37,7 @@ async def create_checkout_session(
             detail="Stripe is not configured"
         )
     
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User ID not found in token"
-        )
-    
-    # Get or create user in our database
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
+    auth0_id = user.auth0_id
     
     try:
         # Create Stripe customer if doesn't exist
@@ -58,7 +50,7 @@ async def create_checkout_session(
                 }
             )
             # Update user with Stripe customer ID
-            crud_users.update_user_subscription(
+            await crud_users.update_user_subscription(
                 db, user.user_id, user.tier, user.subscription_status,
                 stripe_customer_id=stripe_customer.id
             )
@@ -98,8 +90,7 @@ async def create_checkout_session(
 @router.post("/create-customer-portal-session", response_model=schemas.StripeCustomerPortalResponse)
 async def create_customer_portal_session(
     request: schemas.StripeCustomerPortalRequest,
-    current_user: Dict = Depends(verify_token),
-    db: Session = Depends(get_db)
+    user: schemas.User = Depends(get_current_user)
 ):
     """Create a Stripe Customer Portal session for subscription management."""
     if not settings.STRIPE_SECRET_KEY:
@@ -108,15 +99,7 @@ async def create_customer_portal_session(
             detail="Stripe is not configured"
         )
     
-    auth0_id = current_user.get("sub")
-    if not auth0_id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User ID not found in token"
-        )
-    
-    user = crud_users.get_user_by_auth0_id(db, auth0_id)
-    if not user or not user.stripe_customer_id:
+    if not user.stripe_customer_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No subscription found for this user"
@@ -143,7 +126,7 @@ async def create_customer_portal_session(
 async def handle_stripe_webhook(
     request: Request,
     stripe_signature: str = Header(None, alias="stripe-signature"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Handle Stripe webhook events."""
     if not settings.STRIPE_WEBHOOK_SECRET:
@@ -194,24 +177,24 @@ async def handle_stripe_webhook(
     return {"status": "success"}
 
 
-async def _handle_checkout_completed(db: Session, session):
+async def _handle_checkout_completed(db: AsyncSession, session):
     """Handle successful checkout completion."""
     customer_id = session.get('customer')
     if not customer_id:
         return
     
-    user = crud_users.get_user_by_stripe_customer_id(db, customer_id)
+    user = await crud_users.get_user_by_stripe_customer_id(db, customer_id)
     if not user:
         return
     
     # Update user to Pro tier
-    crud_users.update_user_subscription(
+    await crud_users.update_user_subscription(
         db, user.user_id, "pro", "active",
         stripe_customer_id=customer_id
     )
 
 
-async def _handle_subscription_updated(db: Session, subscription):
+async def _handle_subscription_updated(db: AsyncSession, subscription):
     """Handle subscription updates."""
     customer_id = subscription.get('customer')
     status = subscription.get('status')
@@ -219,7 +202,7 @@ async def _handle_subscription_updated(db: Session, subscription):
     if not customer_id:
         return
     
-    user = crud_users.get_user_by_stripe_customer_id(db, customer_id)
+    user = await crud_users.get_user_by_stripe_customer_id(db, customer_id)
     if not user:
         return
     
@@ -237,29 +220,29 @@ async def _handle_subscription_updated(db: Session, subscription):
         tier = user.tier  # Keep current tier
         subscription_status = status
     
-    crud_users.update_user_subscription(
+    await crud_users.update_user_subscription(
         db, user.user_id, tier, subscription_status
     )
 
 
-async def _handle_subscription_deleted(db: Session, subscription):
+async def _handle_subscription_deleted(db: AsyncSession, subscription):
     """Handle subscription cancellation."""
     customer_id = subscription.get('customer')
     
     if not customer_id:
         return
     
-    user = crud_users.get_user_by_stripe_customer_id(db, customer_id)
+    user = await crud_users.get_user_by_stripe_customer_id(db, customer_id)
     if not user:
         return
     
     # Downgrade to free tier
-    crud_users.update_user_subscription(
+    await crud_users.update_user_subscription(
         db, user.user_id, "free", "cancelled"
     )
 
 
-async def _handle_payment_succeeded(db: Session, invoice):
+async def _handle_payment_succeeded(db: AsyncSession, invoice):
     """Handle successful payment."""
     customer_id = invoice.get('customer')
     customer_email = invoice.get('customer_email')
@@ -271,7 +254,7 @@ async def _handle_payment_succeeded(db: Session, invoice):
         return
 
     # 1. Try to find user by Stripe customer ID
-    user = crud_users.get_user_by_stripe_customer_id(db, customer_id)
+    user = await crud_users.get_user_by_stripe_customer_id(db, customer_id)
     if user:
         logging.info(f"Stripe webhook: Found user by stripe_customer_id: {user.user_id}")
     else:
@@ -283,18 +266,18 @@ async def _handle_payment_succeeded(db: Session, invoice):
                 user_id = metadata.get('user_id')
                 auth0_id = metadata.get('auth0_id')
                 if user_id:
-                    user = crud_users.get_user_by_user_id(db, int(user_id))
+                    user = await crud_users.get_user_by_user_id(db, int(user_id))
                     if user:
                         logging.info(f"Stripe webhook: Fallback found user by user_id in subscription metadata: {user.user_id}. Updating stripe_customer_id.")
-                        crud_users.update_user_subscription(
+                        await crud_users.update_user_subscription(
                             db, user.user_id, "pro", "active", stripe_customer_id=customer_id
                         )
                         return
                 elif auth0_id:
-                    user = crud_users.get_user_by_auth0_id(db, auth0_id)
+                    user = await crud_users.get_user_by_auth0_id(db, auth0_id)
                     if user:
                         logging.info(f"Stripe webhook: Fallback found user by auth0_id in subscription metadata: {user.user_id}. Updating stripe_customer_id.")
-                        crud_users.update_user_subscription(
+                        await crud_users.update_user_subscription(
                             db, user.user_id, "pro", "active", stripe_customer_id=customer_id
                         )
                         return
@@ -304,10 +287,10 @@ async def _handle_payment_succeeded(db: Session, invoice):
                 logging.error(f"Stripe webhook: Error fetching subscription {subscription_id}: {e}")
         # 3. Fallback: try to find user by email
         if not user and customer_email:
-            user = db.query(crud_users.User).filter(crud_users.User.email == customer_email).first()
+            user = await crud_users.get_user_by_email(db, customer_email)
             if user:
                 logging.info(f"Stripe webhook: Fallback found user by email: {user.user_id}. Updating stripe_customer_id.")
-                crud_users.update_user_subscription(
+                await crud_users.update_user_subscription(
                     db, user.user_id, "pro", "active", stripe_customer_id=customer_id
                 )
                 return
@@ -319,23 +302,23 @@ async def _handle_payment_succeeded(db: Session, invoice):
 
     # Always update user to pro/active after payment succeeded
     logging.info(f"Stripe webhook: Updating user {user.user_id} to pro/active after payment succeeded.")
-    crud_users.update_user_subscription(
+    await crud_users.update_user_subscription(
         db, user.user_id, "pro", "active", stripe_customer_id=customer_id
     )
 
 
-async def _handle_payment_failed(db: Session, invoice):
+async def _handle_payment_failed(db: AsyncSession, invoice):
     """Handle failed payment."""
     customer_id = invoice.get('customer')
     
     if not customer_id:
         return
     
-    user = crud_users.get_user_by_stripe_customer_id(db, customer_id)
+    user = await crud_users.get_user_by_stripe_customer_id(db, customer_id)
     if not user:
         return
     
     # Mark as past due
-    crud_users.update_user_subscription(
+    await crud_users.update_user_subscription(
         db, user.user_id, user.tier, "past_due"
     ) 
\ No newline at end of file
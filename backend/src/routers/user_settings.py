@@ -1,12 +1,12 @@
 # backend/src/routers/user_settings.py
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Union
 
 from src import schemas
-from src.crud import crud_api_keys, crud_users # Import crud_users
+from src.crud import crud_api_keys
 from src.database import get_db
-from src.auth_utils import verify_token # For securing endpoints
+from src.auth_utils import get_current_user, get_read_db # For securing endpoints
 
 router = APIRouter(
     prefix="/user/api-keys",
@@ -16,15 +16,13 @@ router = APIRouter(
 @router.post("", response_model=schemas.UserApiKey, status_code=status.HTTP_201_CREATED)
 async def create_user_api_key_endpoint(
     api_key_data: schemas.UserApiKeyCreate,
-    db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    # Get or create user and get internal user_id
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
     user_id = user.user_id
 
     try:
-        db_api_key = crud_api_keys.create_user_api_key(
+        db_api_key = await crud_api_keys.create_user_api_key(
             db=db,
             user_id=user_id,
             llm_provider=api_key_data.llm_provider,
@@ -49,14 +47,12 @@ async def create_user_api_key_endpoint(
 
 @router.get("", response_model=List[schemas.UserApiKey])
 async def list_user_api_keys_endpoint(
-    db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    db: AsyncSession = Depends(get_read_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    # Get or create user and get internal user_id
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
     user_id = user.user_id
 
-    db_api_keys = crud_api_keys.get_user_api_keys(db=db, user_id=user_id)
+    db_api_keys = await crud_api_keys.get_user_api_keys(db=db, user_id=user_id)
     # Pydantic will automatically convert the list of UserApiKeyDB model instances
     # to a list of UserApiKey schema instances.
     return db_api_keys
@@ -65,15 +61,13 @@ async def list_user_api_keys_endpoint(
 async def update_user_api_key_endpoint(
     llm_provider: str,
     api_key_update_data: schemas.UserApiKeyUpdate,
-    db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    # Get or create user and get internal user_id
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
     user_id = user.user_id
 
     try:
-        updated_db_api_key = crud_api_keys.update_user_api_key(
+        updated_db_api_key = await crud_api_keys.update_user_api_key(
             db=db,
             user_id=user_id,
             llm_provider=llm_provider, # llm_provider from path
@@ -94,11 +88,9 @@ async def update_user_api_key_endpoint(
 @router.delete("/{key_identifier}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user_api_key_endpoint(
     key_identifier: str, # Will be string from path, try to convert to int if possible
-    db: Session = Depends(get_db),
-    current_user: Dict = Depends(verify_token)
+    db: AsyncSession = Depends(get_db),
+    user: schemas.User = Depends(get_current_user)
 ):
-    # Get or create user and get internal user_id
-    user = crud_users.get_or_create_user_from_auth0(db, current_user)
     user_id = user.user_id
 
     identifier_to_use: Union[str, int]
@@ -108,7 +100,7 @@ async def delete_user_api_key_endpoint(
         identifier_to_use = key_identifier # It's not an int, so treat as string (llm_provider)
 
     try:
-        deleted_successfully = crud_api_keys.delete_user_api_key(
+        deleted_successfully = await crud_api_keys.delete_user_api_key(
             db=db,
             user_id=user_id,
             llm_provider_or_key_id=identifier_to_use
@@ -1,8 +1,8 @@
 # backend/src/schemas.py
 # Defines Pydantic models for data validation and serialization
 
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Dict, Optional
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import Any, List, Dict, Literal, Optional
 import datetime
 
 # --- Tag Schemas ---
@@ -64,6 +64,24 @@ class SingleTagAdd(TagCreate):
 
 class PromptListResponse(BaseModel):
     prompts: List[Prompt]
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= to fetch the next page; null on the last page")
+
+class VersionListResponse(BaseModel):
+    versions: List[Version]
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= to fetch the next (older) page; null on the last page")
+
+class PromptSummary(BaseModel):
+    """List-view projection of a prompt: no version bodies."""
+    id: str
+    title: str
+    tags: List[Tag] = []
+    latest_version: str
+    version_count: int
+    updated_at: Optional[datetime.datetime] = None
+
+class PromptSummaryListResponse(BaseModel):
+    prompts: List[PromptSummary]
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= to fetch the next page; null on the last page")
 
 # --- Playground Schemas ---
 class PlaygroundRequest(BaseModel):
@@ -72,11 +90,83 @@ class PlaygroundRequest(BaseModel):
     llm_provider: str = Field(..., description="The LLM provider to use for this test (e.g., 'gemini', 'openai')")
     # user_api_key: Optional[str] = None
     model_id: str = Field(..., description="The specific model ID to use for the selected provider (e.g., 'gemini-1.5-flash', 'gpt-4')")
+    use_cache: bool = Field(False, description="Reuse an earlier response to the same prompt and model instead of calling the LLM again")
 
 class PlaygroundResponse(BaseModel):
     """Response model for the playground endpoint."""
     output_text: Optional[str] = None
     error: Optional[str] = None
+    cached: bool = False # True if output_text was served from the response cache
+
+class CompareTarget(BaseModel):
+    llm_provider: str = Field(..., description="The LLM provider to run the prompt on (e.g., 'gemini', 'openai')")
+    model_id: str = Field(..., description="The model ID to use for this provider")
+
+class PlaygroundCompareRequest(BaseModel):
+    """Request model for running one prompt against several models at once."""
+    prompt_text: str
+    targets: List[CompareTarget] = Field(..., min_length=1)
+    timeout_seconds: Optional[float] = Field(None, gt=0, description="Per-target timeout; capped by the server's limit")
+
+class CompareResult(BaseModel):
+    llm_provider: str
+    model_id: str
+    output_text: Optional[str] = None
+    error: Optional[str] = None
+    latency_ms: int
+
+class PlaygroundCompareResponse(BaseModel):
+    results: List[CompareResult] # Same order as the request's targets
+
+
+# --- Batch Run Schemas ---
+class BatchRunCreate(BaseModel):
+    """
+    Runs one prompt version against a dataset. Each row supplies values for the version's
+    {{variable}} placeholders; pass the rows as JSON objects, or as CSV/JSONL text in `dataset`.
+    """
+    llm_provider: str = Field(..., description="The LLM provider to run the batch on (e.g., 'gemini', 'openai')")
+    model_id: str = Field(..., description="The model ID to use for this provider")
+    rows: Optional[List[Dict[str, Any]]] = None
+    dataset: Optional[str] = Field(None, description="CSV (with a header row) or JSONL text, one dataset row per line")
+    dataset_format: Optional[Literal["csv", "jsonl"]] = None
+
+    @model_validator(mode="after")
+    def _one_dataset_source(self):
+        if (self.rows is None) == (self.dataset is None):
+            raise ValueError("Provide exactly one of 'rows' or 'dataset'.")
+        if self.dataset is not None and self.dataset_format is None:
+            raise ValueError("'dataset_format' is required with 'dataset'.")
+        return self
+
+class BatchRun(BaseModel):
+    id: int
+    prompt_id: str
+    version_id: str
+    llm_provider: str
+    model_id: str
+    status: str # pending, running, completed, failed, cancelled
+    error: Optional[str] = None
+    total_rows: int
+    completed_rows: int
+    failed_rows: int
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+class BatchRunRow(BaseModel):
+    row_index: int
+    variables: Dict[str, Any]
+    status: str # pending, completed, failed
+    output_text: Optional[str] = None
+    error: Optional[str] = None
+    latency_ms: Optional[int] = None
+    completed_at: Optional[datetime.datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class BatchRunRowListResponse(BaseModel):
+    rows: List[BatchRunRow]
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= to fetch the next page; null on the last page")
 
 
 # --- User API Key Schemas ---
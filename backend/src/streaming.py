@@ -0,0 +1,75 @@
+# backend/src/streaming.py
+# Server-Sent Events helpers for the streaming playground endpoints.
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from src.config import settings
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no", # Stop nginx-style proxies from buffering the stream
+}
+
+DISCONNECT_POLL_SECONDS = 1.0
+
+_END = object()
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formats one SSE message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def relay_as_sse(request: Request, events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> AsyncIterator[str]:
+    """
+    Relays (event, data) pairs from ``events`` to the client as SSE messages.
+
+    ``events`` is consumed by a separate task through a bounded queue, so a slow client
+    pauses the upstream call instead of buffering the whole response in memory. While
+    waiting for the next event the client connection is polled, and a disconnect cancels
+    the task, which closes ``events`` and with it the upstream provider request.
+    An unexpected exception from ``events`` is sent as a final "error" event.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.PLAYGROUND_STREAM_BUFFER_SIZE)
+
+    async def pump() -> None:
+        try:
+            async for item in events:
+                await queue.put(item)
+        except Exception as e:
+            print(f"DEBUG: Stream failed: {type(e).__name__} - {e}")
+            await queue.put(("error", {"error": f"STREAM_ERROR:{str(e)}"}))
+        finally:
+            await events.aclose()
+        await queue.put(_END) # Not reached when cancelled
+
+    producer = asyncio.create_task(pump())
+    loop = asyncio.get_running_loop()
+    last_sent = loop.time()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=DISCONNECT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    print("DEBUG: Client disconnected, cancelling stream")
+                    break
+                if loop.time() - last_sent >= settings.PLAYGROUND_STREAM_HEARTBEAT_SECONDS:
+                    last_sent = loop.time()
+                    yield ": keep-alive\n\n" # SSE comment; keeps idle proxies from closing the connection
+                continue
+            if item is _END:
+                break
+            last_sent = loop.time()
+            yield sse_event(*item)
+    finally:
+        producer.cancel() # No-op if it already finished
+
+
+def sse_response(request: Request, events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> StreamingResponse:
+    return StreamingResponse(relay_as_sse(request, events), media_type="text/event-stream", headers=SSE_HEADERS)
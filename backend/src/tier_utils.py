@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from typing import Dict, Optional
 from functools import wraps
@@ -30,10 +30,10 @@ def get_tier_limits(tier: str) -> schemas.TierLimits:
     )
 
 
-def check_user_tier_info(db: Session, user_id: int) -> schemas.UserTierInfo:
+async def check_user_tier_info(db: AsyncSession, user_id: int) -> schemas.UserTierInfo:
     """Get comprehensive tier information for a user."""
     # Get user's tier and subscription status
-    tier_info = crud_users.get_user_tier_and_status(db, user_id)
+    tier_info = await crud_users.get_user_tier_and_status(db, user_id)
     if not tier_info:
         # Default to free tier for unknown users
         tier_info = {"tier": "free", "subscription_status": "active"}
@@ -42,7 +42,7 @@ def check_user_tier_info(db: Session, user_id: int) -> schemas.UserTierInfo:
     subscription_status = tier_info["subscription_status"]
     
     # Count current prompts
-    prompt_count = crud_users.count_user_prompts(db, user_id)
+    prompt_count = await crud_users.count_user_prompts(db, user_id)
     
     # Get tier limits
     limits = get_tier_limits(tier)
@@ -71,9 +71,9 @@ def check_user_tier_info(db: Session, user_id: int) -> schemas.UserTierInfo:
     )
 
 
-def enforce_prompt_creation_limit(db: Session, user_id: int):
+async def enforce_prompt_creation_limit(db: AsyncSession, user_id: int):
     """Enforce prompt creation limits for the user's tier."""
-    tier_info = check_user_tier_info(db, user_id)
+    tier_info = await check_user_tier_info(db, user_id)
     
     if not tier_info.can_create_prompt:
         if tier_info.prompt_limit:
@@ -88,15 +88,15 @@ def enforce_prompt_creation_limit(db: Session, user_id: int):
             )
 
 
-def enforce_version_creation_limit(db: Session, user_id: int, prompt_id: str):
+async def enforce_version_creation_limit(db: AsyncSession, user_id: int, prompt_id: str):
     """Enforce version creation limits for the user's tier."""
-    tier_info = check_user_tier_info(db, user_id)
+    tier_info = await check_user_tier_info(db, user_id)
     
     # Get tier limits
     limits = get_tier_limits(tier_info.tier)
     
     if limits.max_versions_per_prompt is not None:
-        version_count = crud_users.count_prompt_versions(db, user_id, prompt_id)
+        version_count = await crud_users.count_prompt_versions(db, user_id, prompt_id)
         
         if version_count >= limits.max_versions_per_prompt:
             raise HTTPException(
@@ -127,14 +127,14 @@ def require_tier(required_tier: str):
                     detail="User ID not found in token"
                 )
             
-            user = crud_users.get_user_by_auth0_id(db, auth0_id)
+            user = await crud_users.get_user_by_auth0_id(db, auth0_id)
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="User not found"
                 )
             
-            tier_info = check_user_tier_info(db, user.user_id)
+            tier_info = await check_user_tier_info(db, user.user_id)
             
             if required_tier == "pro" and tier_info.tier != "pro":
                 raise HTTPException(
@@ -147,7 +147,7 @@ def require_tier(required_tier: str):
     return decorator
 
 
-def get_user_from_auth0_id(db: Session, auth0_id: str) -> Optional[int]:
+async def get_user_from_auth0_id(db: AsyncSession, auth0_id: str) -> Optional[int]:
     """Helper function to get user_id from auth0_id."""
-    user = crud_users.get_user_by_auth0_id(db, auth0_id)
+    user = await crud_users.get_user_by_auth0_id(db, auth0_id)
     return user.user_id if user else None 
\ No newline at end of file
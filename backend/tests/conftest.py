@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+# src.database refuses to import without DATABASE_URL. Unit tests that never open a
+# connection only need a well-formed URL; tests that do need Postgres read
+# TEST_DATABASE_URL and skip themselves when it isn't set.
+os.environ.setdefault(
+    "DATABASE_URL", os.environ.get("TEST_DATABASE_URL", "postgresql://localhost/prompt_library_test")
+)
+
+
+@pytest.fixture
+def pg_session_factory():
+    """
+    sessionmaker bound to TEST_DATABASE_URL, a Postgres database already migrated with
+    `alembic upgrade head`. Tests using it are skipped when the variable isn't set.
+    """
+    test_database_url = os.environ.get("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_engine(test_database_url, pool_size=20)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_async_session_factory():
+    """
+    async_sessionmaker for TEST_DATABASE_URL (see pg_session_factory). Uses NullPool: tests drive
+    each scenario with its own asyncio.run(), and asyncpg connections can't move between event loops.
+    """
+    test_database_url = os.environ.get("TEST_DATABASE_URL")
+    if not test_database_url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from src.database import async_database_url
+
+    engine = create_async_engine(async_database_url(test_database_url), poolclass=NullPool)
+    return async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
@@ -0,0 +1,101 @@
+"""
+Local stand-in for Auth0's JWKS endpoint, for tests and benchmarks.
+
+    with LocalJWKSServer(keys=[jwk]) as server:
+        settings.AUTH0_JWKS_URL = server.url
+        ...
+
+The served key set, an artificial response delay and a forced error status can be
+changed while the server is running; `request_count` records how often it was hit.
+"""
+
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+
+
+def _b64url_uint(value: int) -> str:
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def make_signing_key(kid: str) -> Tuple[bytes, Dict[str, str]]:
+    """Returns (private key PEM, public JWK) for a fresh RS256 key."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    numbers = private_key.public_key().public_numbers()
+    jwk = {"kty": "RSA", "kid": kid, "use": "sig", "n": _b64url_uint(numbers.n), "e": _b64url_uint(numbers.e)}
+    return pem, jwk
+
+
+def sign_token(pem: bytes, kid: str, domain: str, audience: str, sub: str = "auth0|abc", exp_in: int = 3600) -> str:
+    """Signs an Auth0-shaped access token."""
+    now = int(time.time())
+    claims = {"sub": sub, "aud": audience, "iss": f"https://{domain}/", "iat": now, "exp": now + exp_in}
+    return jwt.encode(claims, pem, algorithm="RS256", headers={"kid": kid})
+
+
+class LocalJWKSServer:
+    def __init__(self, keys: Optional[List[Dict[str, str]]] = None):
+        self.keys: List[Dict[str, str]] = list(keys or [])
+        self.delay_seconds = 0.0
+        self.fail_with_status: Optional[int] = None
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/.well-known/jwks.json"
+
+    def start(self) -> "LocalJWKSServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                if server.delay_seconds:
+                    time.sleep(server.delay_seconds)
+                if server.fail_with_status:
+                    self.send_response(server.fail_with_status)
+                    self.end_headers()
+                    return
+                body = json.dumps({"keys": server.keys}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Keep test output quiet
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "LocalJWKSServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,186 @@
+"""
+Tests for token verification in src/auth_utils.py: the verified-token cache and the
+async JWKS manager. Tokens are signed with throwaway RSA keys and the JWKS is served
+by a local stand-in (tests/jwks_server.py), so no Auth0 tenant is needed.
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from src import auth_utils
+from src.config import settings
+from jwks_server import LocalJWKSServer, make_signing_key, sign_token
+
+DOMAIN = "test-tenant.example.com"
+AUDIENCE = "https://api.test"
+
+
+@pytest.fixture
+def auth_env(monkeypatch):
+    pem, jwk = make_signing_key("key-1")
+    with LocalJWKSServer(keys=[jwk]) as server:
+        monkeypatch.setattr(settings, "AUTH0_DOMAIN", DOMAIN)
+        monkeypatch.setattr(settings, "AUTH0_API_AUDIENCE", AUDIENCE)
+        monkeypatch.setattr(settings, "AUTH0_JWKS_URL", server.url)
+        monkeypatch.setattr(settings, "AUTH_JWKS_MIN_REFRESH_INTERVAL_SECONDS", 0)
+
+        decode_calls = []
+        real_decode = auth_utils.jwt.decode
+
+        def counting_decode(*args, **kwargs):
+            decode_calls.append(1)
+            return real_decode(*args, **kwargs)
+
+        monkeypatch.setattr(auth_utils.jwt, "decode", counting_decode)
+        auth_utils.jwks_manager.reset()
+        auth_utils._verified_token_cache.clear()
+        yield {"pem": pem, "server": server, "decode_calls": decode_calls}
+        auth_utils.jwks_manager.reset()
+        auth_utils._verified_token_cache.clear()
+
+
+def _sign(pem, kid, **kwargs):
+    return sign_token(pem, kid, DOMAIN, AUDIENCE, **kwargs)
+
+
+async def _verify_async(token: str):
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return await auth_utils.verify_token(creds)
+
+
+def _verify(token: str):
+    return asyncio.run(_verify_async(token))
+
+
+# --- Verified token cache ---
+
+def test_repeated_token_is_verified_once(auth_env):
+    token = _sign(auth_env["pem"], "key-1")
+
+    first = _verify(token)
+    second = _verify(token)
+
+    assert first["sub"] == second["sub"] == "auth0|abc"
+    assert len(auth_env["decode_calls"]) == 1
+
+
+def test_cached_payload_is_not_shared_with_callers(auth_env):
+    token = _sign(auth_env["pem"], "key-1")
+
+    _verify(token)["sub"] = "tampered"
+
+    assert _verify(token)["sub"] == "auth0|abc"
+
+
+def test_entry_expires_with_token(auth_env):
+    token = _sign(auth_env["pem"], "key-1", exp_in=1)
+    _verify(token)
+
+    time.sleep(2.1) # jose compares whole seconds
+
+    with pytest.raises(HTTPException) as exc_info:
+        _verify(token)
+    assert exc_info.value.detail == "Token has expired"
+
+
+def test_jwks_rotation_clears_cache(auth_env):
+    token = _sign(auth_env["pem"], "key-1")
+    _verify(token)
+    assert len(auth_utils._verified_token_cache) == 1
+
+    # A token signed by a new key forces a JWKS refresh that sees a different key set.
+    new_pem, new_jwk = make_signing_key("key-2")
+    auth_env["server"].keys = [new_jwk]
+    _verify(_sign(new_pem, "key-2"))
+
+    assert len(auth_utils._verified_token_cache) == 1
+    with pytest.raises(HTTPException):
+        _verify(token) # key-1 is gone, so the old token must be re-verified and rejected
+
+
+# --- JWKS manager ---
+
+def test_cold_cache_fetch_is_single_flight(auth_env):
+    server = auth_env["server"]
+    server.delay_seconds = 0.2
+    tokens = [_sign(auth_env["pem"], "key-1", sub=f"auth0|user{i}") for i in range(20)]
+
+    async def verify_all():
+        return await asyncio.gather(*(_verify_async(t) for t in tokens))
+
+    payloads = asyncio.run(verify_all())
+
+    assert len(payloads) == 20
+    assert server.request_count == 1
+
+
+def test_unknown_kid_is_negatively_cached(auth_env, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_JWKS_MIN_REFRESH_INTERVAL_SECONDS", 60)
+    server = auth_env["server"]
+    _verify(_sign(auth_env["pem"], "key-1"))
+    assert server.request_count == 1
+
+    bogus_pem, _ = make_signing_key("bogus")
+    for i in range(10):
+        with pytest.raises(HTTPException) as exc_info:
+            _verify(_sign(bogus_pem, "bogus", sub=f"auth0|attacker{i}"))
+        assert exc_info.value.status_code == 401
+
+    assert server.request_count == 1
+
+
+def test_key_rotated_in_during_refresh_throttle_is_not_negatively_cached(auth_env, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_JWKS_MIN_REFRESH_INTERVAL_SECONDS", 60)
+    server = auth_env["server"]
+    _verify(_sign(auth_env["pem"], "key-1"))
+
+    # Auth0 publishes key-2 right after our fetch: rejected until a refresh is allowed again...
+    new_pem, new_jwk = make_signing_key("key-2")
+    server.keys.append(new_jwk)
+    with pytest.raises(HTTPException):
+        _verify(_sign(new_pem, "key-2"))
+    assert server.request_count == 1
+
+    # ...but not for the negative-cache TTL after that.
+    auth_utils.jwks_manager._last_fetch_attempt -= 60
+    assert _verify(_sign(new_pem, "key-2"))["sub"] == "auth0|abc"
+    assert server.request_count == 2
+
+
+def test_serves_stale_keys_when_refresh_fails(auth_env, monkeypatch):
+    server = auth_env["server"]
+    _verify(_sign(auth_env["pem"], "key-1"))
+
+    server.fail_with_status = 500
+    monkeypatch.setattr(settings, "AUTH_JWKS_TTL_SECONDS", 0)
+    auth_utils.jwks_manager._expires_at = 0 # Force the next request to refresh
+    auth_utils._verified_token_cache.clear()
+
+    assert _verify(_sign(auth_env["pem"], "key-1"))["sub"] == "auth0|abc"
+    assert server.request_count == 2
+
+
+def test_cold_cache_fetch_failure_is_503(auth_env):
+    auth_env["server"].fail_with_status = 500
+
+    with pytest.raises(HTTPException) as exc_info:
+        _verify(_sign(auth_env["pem"], "key-1"))
+    assert exc_info.value.status_code == 503
+
+
+def test_refreshes_ahead_of_expiry_in_background(auth_env, monkeypatch):
+    server = auth_env["server"]
+
+    async def scenario():
+        await _verify_async(_sign(auth_env["pem"], "key-1", sub="auth0|first"))
+        monkeypatch.setattr(settings, "AUTH_JWKS_REFRESH_AHEAD_SECONDS", settings.AUTH_JWKS_TTL_SECONDS + 1)
+        await _verify_async(_sign(auth_env["pem"], "key-1", sub="auth0|second"))
+        await asyncio.sleep(0.2) # Let the background refresh finish
+
+    asyncio.run(scenario())
+
+    assert server.request_count == 2
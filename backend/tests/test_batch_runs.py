@@ -0,0 +1,134 @@
+"""
+Tests for batch runs (src/batch_runner.py, src/crud/crud_batch_runs.py). Tests taking
+pg_async_session_factory need a migrated Postgres database in TEST_DATABASE_URL and are skipped otherwise.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import func, update
+
+from src import batch_runner as batch_runner_module, models, schemas
+from src.batch_runner import BatchRunner, parse_dataset, render_template
+from src.config import settings
+from src.crud import crud_batch_runs, crud_prompts, crud_users
+
+
+@pytest.fixture
+def pg_prompt(pg_session_factory, pg_async_session_factory):
+    """(user_id, prompt_id) of a throwaway user owning one templated prompt; deleted afterwards."""
+    async def create_prompt():
+        async with pg_async_session_factory() as db:
+            user_id = (await crud_users.get_or_create_user_from_auth0(db, {"sub": f"auth0|batch-{uuid.uuid4().hex}"})).user_id
+            prompt = await crud_prompts.create_db_prompt(
+                db, schemas.PromptCreate(title="Batch", initial_version_text="Summarise {{ topic }} for {{audience}}"), user_id=user_id
+            )
+            return user_id, prompt.prompt_id
+
+    user_id, prompt_id = asyncio.run(create_prompt())
+    yield user_id, prompt_id
+    db = pg_session_factory()
+    db.query(models.User).filter(models.User.user_id == user_id).delete()
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replaces the LLM call and API key lookup; records prompts and peak concurrency."""
+    state = {"prompts": [], "in_flight": 0, "peak": 0}
+
+    async def fake_get_llm_response(provider_name, api_key, model_id, prompt_text):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.02)
+        state["in_flight"] -= 1
+        state["prompts"].append(prompt_text)
+        return f"summary of: {prompt_text}", None
+
+    async def fake_get_decrypted_api_key(db, user_id, llm_provider):
+        return "sk-test"
+
+    monkeypatch.setattr(batch_runner_module, "get_llm_response", fake_get_llm_response)
+    monkeypatch.setattr(batch_runner_module.crud_api_keys, "get_decrypted_api_key", fake_get_decrypted_api_key)
+    return state
+
+
+def test_render_template():
+    assert render_template("Hi {{name}}, {{ name }}!", {"name": "Ada"}) == "Hi Ada, Ada!"
+    with pytest.raises(KeyError):
+        render_template("Hi {{name}}", {})
+
+
+def test_parse_dataset():
+    assert parse_dataset("topic,audience\ncats,kids\n", "csv") == [{"topic": "cats", "audience": "kids"}]
+    assert parse_dataset('{"topic": "cats"}\n\n{"topic": "dogs"}\n', "jsonl") == [{"topic": "cats"}, {"topic": "dogs"}]
+    with pytest.raises(ValueError):
+        parse_dataset('["not", "an", "object"]', "jsonl")
+
+
+def test_batch_run_evaluates_every_row_with_bounded_concurrency(pg_async_session_factory, pg_prompt, fake_llm, monkeypatch):
+    user_id, prompt_id = pg_prompt
+    monkeypatch.setattr(settings, "BATCH_RUN_CONCURRENCY_PER_KEY", 3)
+    rows = [{"topic": f"topic {i}", "audience": "kids"} for i in range(11)] + [{"topic": "no audience"}]
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            run = await crud_batch_runs.create_batch_run(db, user_id, prompt_id, "v1", "openai", "gpt-4o", rows)
+        runner = BatchRunner(session_factory=pg_async_session_factory)
+        runner.start(run.id)
+        await asyncio.gather(*runner._tasks.values())
+        async with pg_async_session_factory() as db:
+            finished = await crud_batch_runs.get_batch_run(db, run.id, user_id)
+            page, _ = await crud_batch_runs.get_batch_run_rows(db, run.id, user_id, limit=100)
+        return finished, page
+
+    finished, page = asyncio.run(scenario())
+    assert (finished.status, finished.completed_rows, finished.failed_rows) == ("completed", 11, 1)
+    assert fake_llm["peak"] == 3
+    assert page[0].output_text == "summary of: Summarise topic 0 for kids"
+    assert page[-1].error == "MISSING_VARIABLE:audience"
+
+
+def test_batch_run_resumes_only_pending_rows(pg_async_session_factory, pg_prompt, fake_llm):
+    user_id, prompt_id = pg_prompt
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            run = await crud_batch_runs.create_batch_run(
+                db, user_id, prompt_id, "v1", "openai", "gpt-4o", [{"topic": f"t{i}", "audience": "all"} for i in range(5)]
+            )
+            # Simulate a process that finished two rows and then died while holding the lease.
+            assert await crud_batch_runs.claim_batch_run(db, run.id, "dead-worker", lease_seconds=60) is not None
+            for row_id, _ in (await crud_batch_runs.get_pending_batch_run_rows(db, run.id))[:2]:
+                await crud_batch_runs.record_batch_run_row_result(db, run.id, row_id, "done before restart", None, 5)
+
+        runner = BatchRunner(session_factory=pg_async_session_factory)
+        assert run.id not in await runner.resume_pending_runs() # Lease still live
+
+        async with pg_async_session_factory() as db:
+            await db.execute(update(models.BatchRunDB).where(models.BatchRunDB.id == run.id).values(lease_expires_at=func.now()))
+            await db.commit()
+
+        assert run.id in await runner.resume_pending_runs()
+        await asyncio.gather(*runner._tasks.values())
+        async with pg_async_session_factory() as db:
+            return await crud_batch_runs.get_batch_run(db, run.id, user_id)
+
+    finished = asyncio.run(scenario())
+    assert (finished.status, finished.completed_rows) == ("completed", 5)
+    assert sorted(fake_llm["prompts"]) == ["Summarise t2 for all", "Summarise t3 for all", "Summarise t4 for all"]
+
+
+def test_cancelled_run_is_not_claimed(pg_async_session_factory, pg_prompt):
+    user_id, prompt_id = pg_prompt
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            run = await crud_batch_runs.create_batch_run(db, user_id, prompt_id, "v1", "openai", "gpt-4o", [{"topic": "x", "audience": "y"}])
+            assert (await crud_batch_runs.cancel_batch_run(db, run.id, user_id)).status == "cancelled"
+            assert await crud_batch_runs.claim_batch_run(db, run.id, "worker", lease_seconds=60) is None
+            assert await crud_batch_runs.create_batch_run(db, user_id, prompt_id, "v9", "openai", "gpt-4o", []) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+"""
+Tests for the decrypted API key cache in src/crud/crud_api_keys.py. Tests taking
+pg_async_session_factory need a migrated Postgres database in TEST_DATABASE_URL and are skipped otherwise.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import delete
+
+from src import models
+from src.config import settings
+from src.crud import crud_api_keys, crud_users
+
+
+@pytest.fixture
+def fernet_key(monkeypatch):
+    monkeypatch.setattr(settings, "FERNET_KEY", Fernet.generate_key().decode())
+    crud_api_keys._decrypted_key_cache.clear()
+    yield
+    crud_api_keys._decrypted_key_cache.clear()
+
+
+@pytest.fixture
+def pg_user(pg_session_factory, pg_async_session_factory):
+    async def create_user():
+        async with pg_async_session_factory() as db:
+            return (await crud_users.get_or_create_user_from_auth0(db, {"sub": f"auth0|keys-{uuid.uuid4().hex}"})).user_id
+
+    user_id = asyncio.run(create_user())
+    yield user_id
+    db = pg_session_factory()
+    db.query(models.User).filter(models.User.user_id == user_id).delete()
+    db.commit()
+    db.close()
+
+
+def test_fernet_instance_is_memoized(fernet_key):
+    assert crud_api_keys._get_fernet_instance() is crud_api_keys._get_fernet_instance()
+
+
+def test_evicted_keys_are_wiped(fernet_key):
+    key_bytes = bytearray(b"sk-secret")
+    crud_api_keys._decrypted_key_cache.set((1, "openai"), key_bytes)
+    crud_api_keys.invalidate_cached_api_key(1, "OpenAI")
+    assert key_bytes == bytearray(len(b"sk-secret"))
+
+
+def test_cached_key_skips_the_database_until_invalidated(pg_async_session_factory, pg_user, fernet_key):
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            await crud_api_keys.create_user_api_key(db, pg_user, "OpenAI", "sk-first")
+            assert await crud_api_keys.get_decrypted_api_key(db, pg_user, "openai") == "sk-first"
+
+            # Remove the row behind the cache's back: the hot path no longer reads the database.
+            await db.execute(delete(models.UserApiKeyDB).where(models.UserApiKeyDB.user_id == pg_user))
+            await db.commit()
+            db.expunge_all()
+            assert await crud_api_keys.get_decrypted_api_key(db, pg_user, "OpenAI") == "sk-first"
+            assert crud_api_keys._decrypted_key_cache.stats()["hits"] >= 1
+
+            await crud_api_keys.create_user_api_key(db, pg_user, "openai", "sk-second")
+            assert await crud_api_keys.get_decrypted_api_key(db, pg_user, "openai") == "sk-second"
+            await crud_api_keys.update_user_api_key(db, pg_user, "openai", "sk-third")
+            assert await crud_api_keys.get_decrypted_api_key(db, pg_user, "openai") == "sk-third"
+            assert await crud_api_keys.delete_user_api_key(db, pg_user, "openai")
+            assert await crud_api_keys.get_decrypted_api_key(db, pg_user, "openai") is None
+
+    asyncio.run(scenario())
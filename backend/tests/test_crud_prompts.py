@@ -0,0 +1,214 @@
+"""
+Tests for src/crud/crud_prompts.py. Tests taking pg_async_session_factory need a migrated
+Postgres database in TEST_DATABASE_URL and are skipped otherwise.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from src import crud, models, schemas
+from src.crud import crud_prompts, crud_users
+from src.models import User
+
+
+@pytest.fixture
+def pg_user(pg_session_factory, pg_async_session_factory):
+    """The user_id of a throwaway user (deleted with all their prompts afterwards)."""
+    async def create_user():
+        async with pg_async_session_factory() as db:
+            return (await crud_users.get_or_create_user_from_auth0(db, {"sub": f"auth0|test-{uuid.uuid4().hex}"})).user_id
+
+    user_id = asyncio.run(create_user())
+    yield user_id
+    db = pg_session_factory()
+    db.query(User).filter(User.user_id == user_id).delete()
+    db.commit()
+    db.close()
+
+
+async def _create_prompts(db, user_id, count):
+    return [
+        await crud.create_db_prompt(
+            db, schemas.PromptCreate(title=f"Prompt {i}", initial_version_text=f"text {i}"), user_id=user_id
+        )
+        for i in range(count)
+    ]
+
+
+def test_cursor_round_trip():
+    assert crud.decode_cursor(crud.encode_cursor(id=42), "id") == 42
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", crud.encode_cursor(other=1), crud.encode_cursor(id="1")])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        crud.decode_cursor(cursor, "id")
+
+
+def test_get_prompts_pages_with_cursor(pg_async_session_factory, pg_user):
+    user_id = pg_user
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            created = await _create_prompts(db, user_id, 5)
+            seen, cursor = [], None
+            while True:
+                page, cursor = await crud.get_prompts(db, user_id=user_id, limit=2, cursor=cursor)
+                seen.extend(p.prompt_id for p in page)
+                assert all(len(p.versions) == 1 for p in page)
+                if cursor is None:
+                    break
+            return seen, [p.prompt_id for p in created]
+
+    seen, created = asyncio.run(scenario())
+    assert seen == created
+
+
+def test_created_and_updated_prompts_map_to_schema(pg_async_session_factory, pg_user):
+    """Returned prompts have their versions loaded: nothing is lazy-loaded after the session's I/O."""
+    user_id = pg_user
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            prompt = (await _create_prompts(db, user_id, 1))[0]
+            created = crud._map_prompt_db_to_schema(prompt)
+            await crud.create_db_version(db, prompt.prompt_id, user_id, schemas.VersionCreate(text="second draft"))
+            db.expunge_all()
+            # Each call returns the same identity-mapped row, so map it before the next write
+            tagged = crud._map_prompt_db_to_schema(await crud.add_db_tag(db, prompt.prompt_id, user_id, schemas.TagCreate(name="t", color="red")))
+            renamed = crud._map_prompt_db_to_schema(await crud.update_db_prompt(db, prompt.prompt_id, user_id, schemas.PromptUpdate(title="Renamed")))
+            untagged = crud._map_prompt_db_to_schema(await crud.remove_db_tag(db, prompt.prompt_id, user_id, "t"))
+            return created, tagged, renamed, untagged
+
+    created, tagged, renamed, untagged = asyncio.run(scenario())
+    assert list(created.versions) == ["v1"] and created.versions["v1"].text == "text 0"
+    assert list(tagged.versions) == ["v2", "v1"] and tagged.tags[0].name == "t"
+    assert renamed.title == "Renamed" and renamed.latest_version == "v2"
+    assert untagged.tags == [] and untagged.versions["v2"].text == "second draft"
+
+
+def test_prompt_summaries_count_versions_without_loading_them(pg_async_session_factory, pg_user):
+    user_id = pg_user
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            first, second = [p.prompt_id for p in await _create_prompts(db, user_id, 2)]
+            await crud.create_db_version(db, first, user_id, schemas.VersionCreate(text="second draft"))
+            db.expunge_all()
+
+            rows, cursor = await crud.get_prompt_summaries(db, user_id=user_id)
+            assert not db.identity_map # Column projection only: no ORM objects were loaded
+            return first, second, [crud._map_prompt_summary_row_to_schema(row) for row in rows], cursor
+
+    first, second, summaries, cursor = asyncio.run(scenario())
+    assert cursor is None
+    assert [(s.id, s.version_count, s.latest_version) for s in summaries] == [
+        (first, 2, "v2"),
+        (second, 1, "v1"),
+    ]
+    assert all(s.updated_at is not None for s in summaries)
+
+
+def test_get_prompt_versions_pages_newest_first(pg_async_session_factory, pg_user):
+    user_id = pg_user
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            prompt_id = (await _create_prompts(db, user_id, 1))[0].prompt_id
+            for i in range(4):
+                await crud.create_db_version(db, prompt_id, user_id, schemas.VersionCreate(text=f"draft {i}"))
+
+            seen, cursor = [], None
+            while True:
+                page, cursor = await crud.get_prompt_versions(db, prompt_id, user_id, limit=2, cursor=cursor)
+                seen.extend(v.version_id_str for v in page)
+                if cursor is None:
+                    break
+            return seen, await crud.get_prompt_versions(db, "no-such-prompt", user_id)
+
+    seen, missing = asyncio.run(scenario())
+    assert seen == ["v5", "v4", "v3", "v2", "v1"]
+    assert missing is None
+
+
+def test_delete_prompt_removes_versions(pg_async_session_factory, pg_user):
+    user_id = pg_user
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            prompt = (await _create_prompts(db, user_id, 1))[0]
+            prompt_pk, prompt_id = prompt.id, prompt.prompt_id
+            await crud.create_db_version(db, prompt_id, user_id, schemas.VersionCreate(text="draft"))
+
+            assert await crud.delete_db_prompt(db, prompt_id, user_id) is True
+            assert await crud.delete_db_prompt(db, prompt_id, user_id) is False
+            return (await db.execute(
+                select(func.count(models.PromptVersionDB.id)).where(models.PromptVersionDB.prompt_id == prompt_pk)
+            )).scalar()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_concurrent_version_creates_get_distinct_numbers(pg_async_session_factory, pg_user):
+    """Fires N simultaneous version creates for one prompt; each must get its own vN."""
+    user_id = pg_user
+    workers = 8
+
+    async def scenario():
+        async with pg_async_session_factory() as db:
+            prompt_id = (await _create_prompts(db, user_id, 1))[0].prompt_id
+        barrier = asyncio.Barrier(workers)
+
+        async def create_version(i):
+            async with pg_async_session_factory() as session:
+                await barrier.wait()
+                version = await crud.create_db_version(session, prompt_id, user_id, schemas.VersionCreate(text=f"v text {i}"))
+                return version.version_number
+
+        numbers = await asyncio.gather(*(create_version(i) for i in range(workers)))
+        async with pg_async_session_factory() as db:
+            return numbers, await crud.get_prompt_by_prompt_id(db, prompt_id, user_id)
+
+    numbers, prompt = asyncio.run(scenario())
+    assert sorted(numbers) == list(range(2, workers + 2))
+    assert prompt.latest_version == f"v{workers + 1}"
+    assert crud.get_next_version_id_db(prompt) == f"v{workers + 2}"
+
+
+def test_concurrent_prompt_creates_get_distinct_ids(pg_async_session_factory, pg_user):
+    """Fires N simultaneous prompt creates for one user; each must get its own prompt_id."""
+    user_id = pg_user
+    workers = 8
+
+    async def scenario():
+        barrier = asyncio.Barrier(workers)
+
+        async def create_prompt(i):
+            async with pg_async_session_factory() as session:
+                await barrier.wait()
+                prompt_data = schemas.PromptCreate(title=f"Race {i}", initial_version_text="text")
+                return (await crud.create_db_prompt(session, prompt_data, user_id=user_id)).prompt_id
+
+        return await asyncio.gather(*(create_prompt(i) for i in range(workers)))
+
+    prompt_ids = asyncio.run(scenario())
+    prefix = crud_prompts._user_prompt_prefix(user_id)
+    assert sorted(prompt_ids) == sorted(f"{prefix}{n}" for n in range(1, workers + 1))
+
+
+def test_list_endpoint_rejects_the_removed_skip_parameter():
+    from fastapi.testclient import TestClient
+    from src import main
+    from src.auth_utils import get_current_user, get_read_db
+
+    main.app.dependency_overrides[get_current_user] = lambda: None
+    main.app.dependency_overrides[get_read_db] = lambda: None
+    try:
+        response = TestClient(main.app).get("/prompts?skip=100")
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 400 and "cursor" in response.json()["detail"]
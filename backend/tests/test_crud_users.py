@@ -0,0 +1,110 @@
+"""
+Tests for src/crud/crud_users.py.
+"""
+
+import asyncio
+import datetime
+
+import pytest
+
+from src.crud import crud_users
+from src.models import User
+
+
+def _user_row(auth0_id: str, tier: str = "free") -> User:
+    return User(
+        user_id=7, auth0_id=auth0_id, email="a@example.com", username="a",
+        tier=tier, subscription_status="active", has_seen_paywall_modal=False,
+        created_at=datetime.datetime.now(datetime.timezone.utc),
+    )
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    calls = []
+
+    async def fake_get_or_create(db, auth0_user_data):
+        calls.append(auth0_user_data["sub"])
+        return _user_row(auth0_user_data["sub"])
+
+    monkeypatch.setattr(crud_users, "get_or_create_user_from_auth0", fake_get_or_create)
+    crud_users._user_cache.clear()
+    yield calls
+    crud_users._user_cache.clear()
+
+
+def _cached_user(auth0_id: str):
+    return asyncio.run(crud_users.get_cached_user_from_auth0(None, {"sub": auth0_id}))
+
+
+def test_cached_user_skips_repeat_lookups(lookups):
+    first = _cached_user("auth0|a")
+    second = _cached_user("auth0|a")
+
+    assert first.user_id == second.user_id == 7
+    assert lookups == ["auth0|a"]
+
+
+def test_invalidate_forces_fresh_lookup(lookups):
+    _cached_user("auth0|a")
+    crud_users.invalidate_cached_user("auth0|a")
+    _cached_user("auth0|a")
+
+    assert lookups == ["auth0|a", "auth0|a"]
+
+
+def test_subscription_update_invalidates_cache(lookups):
+    _cached_user("auth0|a")
+    row = _user_row("auth0|a")
+
+    class FakeResult:
+        def scalars(self):
+            return self
+
+        def first(self):
+            return row
+
+    class FakeSession:
+        async def execute(self, statement):
+            return FakeResult()
+
+        async def commit(self):
+            pass
+
+        async def refresh(self, obj):
+            pass
+
+    asyncio.run(crud_users.update_user_subscription(FakeSession(), 7, "pro", "active"))
+    _cached_user("auth0|a")
+
+    assert lookups == ["auth0|a", "auth0|a"]
+
+
+def test_concurrent_first_logins_create_one_row(pg_session_factory, pg_async_session_factory):
+    """Fires N simultaneous first-login lookups for the same auth0_id against Postgres."""
+    import uuid
+
+    auth0_id = f"auth0|race-{uuid.uuid4().hex}"
+    workers = 16
+
+    async def scenario():
+        barrier = asyncio.Barrier(workers)
+
+        async def first_login():
+            async with pg_async_session_factory() as db:
+                await barrier.wait()
+                return (await crud_users.get_or_create_user_from_auth0(db, {"sub": auth0_id})).user_id
+
+        return await asyncio.gather(*(first_login() for _ in range(workers)))
+
+    user_ids = asyncio.run(scenario())
+
+    db = pg_session_factory()
+    try:
+        rows = db.query(User).filter(User.auth0_id == auth0_id).all()
+        assert len(rows) == 1
+        assert set(user_ids) == {rows[0].user_id}
+        db.delete(rows[0])
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,170 @@
+"""
+Tests for engine, pool and read-replica configuration in src/database.py. Tests that open connections need
+TEST_DATABASE_URL and are skipped otherwise.
+"""
+
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src import database
+from src.config import settings
+
+NEON_DIRECT = "postgresql://u:p@ep-cool-name-123456.us-east-2.aws.neon.tech/neondb?sslmode=require&channel_binding=require"
+NEON_POOLED = "postgresql://u:p@ep-cool-name-123456-pooler.us-east-2.aws.neon.tech/neondb?sslmode=require"
+
+
+@pytest.fixture
+def test_database_url():
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    return url
+
+
+def test_async_database_url_translates_libpq_parameters():
+    url = database.async_database_url(NEON_DIRECT)
+    assert url.startswith("postgresql+asyncpg://u:p@ep-cool-name-123456")
+    assert "ssl=require" in url and "sslmode" not in url and "channel_binding" not in url
+
+    url = database.async_database_url(NEON_DIRECT + "&options=endpoint%3Dep-cool-name-123456%20-c%20search_path%3Dapp")
+    assert "options" not in url and "ssl=require" in url # asyncpg.connect() has no options parameter
+    assert database.url_server_settings(NEON_DIRECT + "&options=endpoint%3Dep-cool-name-123456%20-c%20search_path%3Dapp%20--lock-timeout%3D2s") == {
+        "search_path": "app", "lock_timeout": "2s"
+    }
+
+
+def test_pooler_detection(monkeypatch):
+    monkeypatch.setattr(settings, "DB_TRANSACTION_POOLER", "auto")
+    assert database.uses_transaction_pooler(NEON_POOLED)
+    assert not database.uses_transaction_pooler(NEON_DIRECT)
+    monkeypatch.setattr(settings, "DB_TRANSACTION_POOLER", "true")
+    assert database.uses_transaction_pooler("postgresql://u:p@pgbouncer:6432/app")
+
+
+def test_engine_options(monkeypatch):
+    monkeypatch.setattr(settings, "DB_TRANSACTION_POOLER", "auto")
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 5000)
+
+    direct = database.engine_options(NEON_DIRECT, is_async=True)
+    assert direct["pool_pre_ping"] is settings.DB_POOL_PRE_PING
+    assert direct["connect_args"]["server_settings"] == {"statement_timeout": "5000"}
+    assert "statement_cache_size" not in direct["connect_args"]
+
+    pooled = database.engine_options(NEON_POOLED, is_async=True)["connect_args"]
+    assert "server_settings" not in pooled # Transaction-mode poolers reject startup parameters
+    assert pooled["statement_cache_size"] == 0 and pooled["prepared_statement_cache_size"] == 0
+    assert pooled["prepared_statement_name_func"]() != pooled["prepared_statement_name_func"]()
+
+    with_options = database.engine_options(NEON_DIRECT + "&options=-c%20statement_timeout%3D1%20-csearch_path%3Dapp", is_async=True)
+    assert with_options["connect_args"]["server_settings"] == {"statement_timeout": "5000", "search_path": "app"}
+
+    sync = database.engine_options(NEON_DIRECT + "&options=endpoint%3Dep-cool-name-123456", is_async=False)["connect_args"]
+    assert sync["options"] == "endpoint=ep-cool-name-123456 -c statement_timeout=5000"
+
+
+def test_pool_metrics_count_checkouts_reconnects_and_failed_pings(test_database_url, monkeypatch):
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 1234)
+    metrics = database.PoolMetrics()
+
+    async def scenario():
+        engine = create_async_engine(
+            database.async_database_url(test_database_url), **database.engine_options(test_database_url, is_async=True)
+        )
+        metrics.attach("test", engine.sync_engine)
+        async with engine.connect() as conn:
+            timeout = (await conn.execute(text("SHOW statement_timeout"))).scalar()
+            backend_pid = (await conn.execute(text("SELECT pg_backend_pid()"))).scalar()
+        async with engine.connect() as conn: # Reuses the pooled connection
+            await conn.execute(text("SELECT 1"))
+        during = metrics.stats()["test"]
+
+        # The server drops the idle pooled connection (as Neon does); the pre-ping notices and reconnects.
+        killer = create_async_engine(database.async_database_url(test_database_url), poolclass=NullPool)
+        async with killer.connect() as conn:
+            await conn.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": backend_pid})
+        await killer.dispose()
+        async with engine.connect() as conn:
+            new_pid = (await conn.execute(text("SELECT pg_backend_pid()"))).scalar()
+        await engine.dispose()
+        return timeout, during, backend_pid, new_pid
+
+    timeout, during, backend_pid, new_pid = asyncio.run(scenario())
+    assert timeout == "1234ms"
+    assert (during["checkouts"], during["connects"], during["checked_out"]) == (2, 1, 0)
+    after = metrics.stats()["test"]
+    assert new_pid != backend_pid
+    assert (after["checkouts"], after["connects"], after["invalidations"]) == (3, 2, 1)
+    assert after["connect_seconds_max"] > 0
+
+
+def test_pooler_mode_runs_repeated_statements(test_database_url, monkeypatch):
+    monkeypatch.setattr(settings, "DB_TRANSACTION_POOLER", "true")
+
+    async def scenario():
+        engine = create_async_engine(
+            database.async_database_url(test_database_url), **database.engine_options(test_database_url, is_async=True)
+        )
+        async with engine.connect() as conn:
+            results = [(await conn.execute(text("SELECT :n + 1"), {"n": n})).scalar() for n in range(3)]
+        await engine.dispose()
+        return results
+
+    assert asyncio.run(scenario()) == [1, 2, 3]
+
+
+def _primary():
+    return "primary session"
+
+
+def test_reads_use_the_replica_until_the_user_writes(pg_async_session_factory):
+    router = database.ReadSessionRouter(_primary, pg_async_session_factory, max_lag=5, check_interval=60)
+
+    async def scenario():
+        reader = await router.session(user_id=1)
+        assert reader is not _primary() and (await reader.execute(text("SELECT 1"))).scalar() == 1
+        await reader.close()
+
+        # Commits on a session tagged with a user (as get_current_user does) open their window.
+        async with pg_async_session_factory() as db:
+            db.info["user_id"] = "writer"
+            await db.execute(text("SELECT 1"))
+            await db.commit()
+        assert database.read_session_router._recent_writers.get("writer")
+
+        router.note_write(1)
+        return await router.session(user_id=1), await router.session(user_id=2)
+
+    after_write, other_user = asyncio.run(scenario())
+    assert after_write == "primary session"
+    assert other_user != "primary session"
+    assert router.stats()["last_lag_seconds"] == 0 # The test database is a primary
+    assert (router.counters["replica"], router.counters["primary"]) == (2, 1)
+
+
+def test_lagging_or_unreachable_replica_falls_back_to_primary(pg_async_session_factory):
+    now = [0.0]
+    lagging = database.ReadSessionRouter(_primary, pg_async_session_factory, max_lag=-1, check_interval=10, clock=lambda: now[0])
+    unreachable = database.ReadSessionRouter(
+        _primary, async_sessionmaker(create_async_engine("postgresql+asyncpg://nobody@127.0.0.1:1/none", poolclass=NullPool))
+    )
+
+    async def scenario():
+        results = [await lagging.session(), await lagging.session()]
+        now[0] = 11 # Next check is due
+        results.append(await lagging.session())
+        results.append(await unreachable.session())
+        return results
+
+    assert asyncio.run(scenario()) == ["primary session"] * 4
+    assert lagging.counters["lag_fallbacks"] == 2 # Checked once per interval, not per session
+    assert unreachable.stats()["check_errors"] == 1 and not unreachable.stats()["replica_ok"]
+
+
+def test_without_a_replica_reads_use_the_primary():
+    router = database.ReadSessionRouter(_primary)
+    assert asyncio.run(router.session(user_id=1)) == "primary session"
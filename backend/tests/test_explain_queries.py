@@ -0,0 +1,60 @@
+"""
+Tests for scripts/explain_queries.py and the indexes it checks (alembic revision 3951d3bcf180).
+Needs a Postgres database migrated to head in TEST_DATABASE_URL; skipped otherwise.
+"""
+
+import asyncio
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine, text
+
+from scripts.explain_queries import explain_all, sequential_scans
+from src.config import settings
+from src.crud import crud_api_keys
+
+
+@pytest.fixture
+def test_database_url(monkeypatch):
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    monkeypatch.setattr(settings, "FERNET_KEY", Fernet.generate_key().decode())
+    yield url
+    crud_api_keys._decrypted_key_cache.clear()
+
+
+def test_sequential_scans_lists_seeded_tables_only():
+    results = [
+        {"case": "a", "plan": "Seq Scan on prompts  (cost=...)\n  ->  Seq Scan on pg_class", "error": None},
+        {"case": "b", "plan": None, "error": "boom"},
+    ]
+    assert sequential_scans(results) == [("a", "prompts")]
+
+
+def test_every_crud_statement_is_explained_and_nothing_is_kept(test_database_url):
+    results = asyncio.run(explain_all(test_database_url, users=5, prompts=4, versions=3, seqscan=False, verbose=False))
+    assert results and all(result["plan"] for result in results)
+    plans = {}
+    for result in results:
+        plans[result["case"]] = plans.get(result["case"], "") + result["plan"]
+
+    assert "ix_prompts_user_id_id" in plans["get_prompts (next page)"]
+    # Index Only vs Index Scan depends on the visibility map, so only check the index is used
+    assert "ix_prompt_versions_prompt_id_version_number" in plans["get_prompt_summaries"]
+    assert "ix_prompt_versions_prompt_id_version_number" in plans["get_prompt_versions"]
+    assert "ix_userdb_stripe_customer_id" in plans["get_user_by_stripe_customer_id"]
+    assert "ix_userdb_email" in plans["get_user_by_email"]
+
+    engine = create_engine(test_database_url)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM userdb WHERE auth0_id LIKE 'auth0|explain-%'")).scalar() == 0
+    engine.dispose()
+
+
+def test_runs_without_a_fernet_key_and_leaves_settings_alone(test_database_url, monkeypatch):
+    monkeypatch.setattr(settings, "FERNET_KEY", "")
+    results = asyncio.run(explain_all(test_database_url, users=2, prompts=2, versions=1, only=["get_decrypted_api_key"], verbose=False))
+    assert results and all(result["plan"] for result in results)
+    assert settings.FERNET_KEY == ""
@@ -0,0 +1,87 @@
+"""
+Tests for src/llm_cache.py. Tests taking pg_async_session_factory need a migrated Postgres
+database in TEST_DATABASE_URL and are skipped otherwise.
+"""
+
+import asyncio
+import datetime
+import uuid
+
+from fastapi.testclient import TestClient
+
+from src import llm_cache, llm_services, schemas
+from src.llm_cache import LLMResponseCache, llm_cache_key
+
+
+def test_cache_key_ignores_whitespace_only_edits():
+    base = llm_cache_key(1, "openai", "gpt-4o", "Summarise this:\n  the text")
+    assert llm_cache_key(1, "OpenAI", "gpt-4o", "\nSummarise this:   \r\n  the text\n\n") == base
+    assert llm_cache_key(1, "openai", "gpt-4o", "Summarise this:\nthe text") != base # Leading indentation matters
+    assert llm_cache_key(2, "openai", "gpt-4o", "Summarise this:\n  the text") != base
+    assert llm_cache_key(1, "openai", "gpt-4o-mini", "Summarise this:\n  the text") != base
+    assert llm_cache_key(1, "openai", "gpt-4o", "Summarise this:\n  the text", {"temperature": 0.2}) != base
+
+
+def test_playground_opt_in_cache(monkeypatch):
+    from src import main
+    from src.auth_utils import get_current_user
+    from src.database import get_db
+
+    calls = []
+
+    async def fake_get_llm_response(provider_name, api_key, model_id, prompt_text):
+        calls.append(prompt_text)
+        return ("fresh output", None) if prompt_text != "fails" else (None, "OPENAI_RATE_LIMIT_EXCEEDED:slow down")
+
+    monkeypatch.setattr(llm_services, "get_llm_response", fake_get_llm_response)
+    monkeypatch.setattr(llm_cache, "llm_response_cache", LLMResponseCache(maxsize=10, ttl=60, use_sql=False))
+    async def fake_get_decrypted_api_key(db, user_id, llm_provider):
+        return "sk-test"
+
+    monkeypatch.setattr(main.crud, "get_decrypted_api_key", fake_get_decrypted_api_key)
+    monkeypatch.setattr(main.settings, "METRICS_TOKEN", "scrape-me")
+    main.app.dependency_overrides[get_current_user] = lambda: schemas.User(
+        user_id=1, auth0_id="auth0|test", tier="free", subscription_status="active",
+        created_at=datetime.datetime.now(datetime.timezone.utc)
+    )
+    main.app.dependency_overrides[get_db] = lambda: None
+    try:
+        client = TestClient(main.app)
+        request = {"prompt_text": "hello", "llm_provider": "openai", "model_id": "gpt-4o", "use_cache": True}
+        first = client.post("/playground/test", json=request).json()
+        second = client.post("/playground/test", json={**request, "prompt_text": "hello\n"}).json()
+        not_opted_in = client.post("/playground/test", json={**request, "use_cache": False}).json()
+        client.post("/playground/test", json={**request, "prompt_text": "fails"})
+        errors_not_cached = client.post("/playground/test", json={**request, "prompt_text": "fails"}).json()
+        metrics = client.get("/metrics", headers={"X-Metrics-Token": "scrape-me"}).json()
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert first == {"output_text": "fresh output", "error": None, "cached": False}
+    assert second == {"output_text": "fresh output", "error": None, "cached": True}
+    assert not_opted_in["cached"] is False
+    assert errors_not_cached["error"].startswith("OPENAI_RATE_LIMIT_EXCEEDED")
+    assert calls == ["hello", "hello", "fails", "fails"]
+    assert metrics["llm_response_cache"]["hits"] == 1
+
+
+def test_sql_tier_is_shared_between_workers(pg_async_session_factory):
+    cache_key = llm_cache_key(0, "openai", "gpt-4o", f"prompt {uuid.uuid4()}")
+
+    async def scenario():
+        writer = LLMResponseCache(maxsize=10, ttl=60, use_sql=True, session_factory=pg_async_session_factory)
+        reader = LLMResponseCache(maxsize=10, ttl=60, use_sql=True, session_factory=pg_async_session_factory)
+        expired = LLMResponseCache(maxsize=10, ttl=-1, use_sql=True, session_factory=pg_async_session_factory)
+        missing_before = await reader.get(cache_key)
+        await writer.set(cache_key, "openai", "gpt-4o", "shared output")
+        from_sql = await reader.get(cache_key)
+        from_memory = await reader.get(cache_key)
+        await expired.set(cache_key, "openai", "gpt-4o", "stale output")
+        fresh_reader = LLMResponseCache(maxsize=10, ttl=60, use_sql=True, session_factory=pg_async_session_factory)
+        return missing_before, from_sql, from_memory, await fresh_reader.get(cache_key), reader.stats()
+
+    missing_before, from_sql, from_memory, after_expiry, stats = asyncio.run(scenario())
+    assert missing_before is None
+    assert from_sql == from_memory == "shared output"
+    assert after_expiry is None
+    assert stats["sql"]["hits"] == 1 and stats["memory"]["hits"] == 1
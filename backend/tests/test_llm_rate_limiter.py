@@ -0,0 +1,189 @@
+"""
+Tests for the outbound LLM rate limiter (src/llm_rate_limiter.py).
+"""
+
+import asyncio
+import time
+
+from src import llm_rate_limiter
+from src.llm_resilience import LLMResiliencePolicy
+from src.llm_rate_limiter import LLMGovernor, TokenBucket, note_retry_after, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRateLimitError(Exception):
+    def __init__(self, headers):
+        super().__init__("429")
+        self.response = type("Response", (), {"headers": headers})()
+
+
+def test_token_bucket_reserves_ahead_and_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock) # 1 token per second, burst of 60
+    assert bucket.reserve(60, max_wait=0) == 0
+    assert bucket.reserve(2, max_wait=10) == 2.0
+    assert bucket.reserve(1, max_wait=2.5) is None # Would need 3s; nothing is reserved
+    clock.now += 3
+    assert bucket.reserve(1, max_wait=0) == 0
+    assert bucket.reserve(500, max_wait=120) == 60.0 # Oversized calls are capped at one minute's worth
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert parse_retry_after({"retry-after": "7"}) == 7.0
+    assert 0 < parse_retry_after({"retry-after": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))}) <= 30
+    assert parse_retry_after({"retry-after": "soon"}) is None
+    assert parse_retry_after(None) is None
+
+
+def test_concurrency_is_bounded_per_key():
+    governor = LLMGovernor(limits={"openai": {"concurrency": 2}}, queue_timeout=5, max_retries=0)
+    state = {"in_flight": 0, "peak": 0}
+
+    async def call():
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.02)
+        state["in_flight"] -= 1
+        return "ok", None
+
+    async def scenario():
+        same_key = [governor.run("openai", "sk-a", "hi", call) for _ in range(6)]
+        return await asyncio.gather(*same_key)
+
+    assert asyncio.run(scenario()) == [("ok", None)] * 6
+    assert state["peak"] == 2
+
+
+def test_calls_that_cannot_be_admitted_in_time_fail_fast():
+    governor = LLMGovernor(limits={"anthropic": {"rpm": 60}}, queue_timeout=0.5, max_retries=0)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "ok", None
+
+    async def scenario():
+        results = [await governor.run("anthropic", "sk-a", "hi", call) for _ in range(62)]
+        other_key = await governor.run("anthropic", "sk-b", "hi", call)
+        return results, other_key
+
+    results, other_key = asyncio.run(scenario())
+    assert results[:60] == [("ok", None)] * 60
+    assert results[61][0] is None and results[61][1].startswith("ANTHROPIC_RATE_LIMIT_EXCEEDED:")
+    assert other_key == ("ok", None) # Limits are per key
+    assert governor.stats()["rejected"] >= 1
+
+
+def test_calls_rejected_while_waiting_for_a_slot_give_back_their_budget():
+    governor = LLMGovernor(limits={"openai": {"rpm": 2, "concurrency": 1}}, queue_timeout=0.1, max_retries=0)
+
+    async def slow_call():
+        await asyncio.sleep(0.2)
+        return "slow", None
+
+    async def call():
+        return "ok", None
+
+    async def scenario():
+        holder = asyncio.ensure_future(governor.run("openai", "sk-a", "hi", slow_call))
+        await asyncio.sleep(0) # Let it take the only slot
+        timed_out = await governor.run("openai", "sk-a", "hi", call) # Reserves a request, then times out on the slot
+        held = await holder
+        return timed_out, held, await governor.run("openai", "sk-a", "hi", call)
+
+    timed_out, held, after = asyncio.run(scenario())
+    assert timed_out[1].startswith("OPENAI_RATE_LIMIT_EXCEEDED:") and held == ("slow", None)
+    assert after == ("ok", None) # Only the slow call used the 2 rpm budget
+
+
+def test_provider_429_backs_off_for_retry_after_and_retries(monkeypatch):
+    governor = LLMGovernor(limits={"openai": {}}, queue_timeout=5, max_retries=2)
+    attempts = []
+
+    async def call():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            note_retry_after(FakeRateLimitError({"retry-after-ms": "200"}))
+            return None, "OPENAI_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later."
+        return "ok", None
+
+    assert asyncio.run(governor.run("openai", "sk-a", "hi", call)) == ("ok", None)
+    assert attempts[1] - attempts[0] >= 0.19
+    assert governor.stats()["retries"] == 1
+
+
+def test_rate_limit_error_is_returned_once_retries_run_out(monkeypatch):
+    monkeypatch.setattr(llm_rate_limiter, "MIN_BACKOFF_SECONDS", 0.01)
+    governor = LLMGovernor(limits={"gemini": {}}, queue_timeout=5, max_retries=1)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        return None, "GEMINI_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later."
+
+    output_text, error = asyncio.run(governor.run("gemini", "sk-a", "hi", call))
+    assert output_text is None and error.startswith("GEMINI_RATE_LIMIT_EXCEEDED")
+    assert len(attempts) == 2
+
+
+def test_retry_after_reaches_the_governor_through_with_timeout():
+    """The governor reads the hint from its own task, so the provider must not run in a child task."""
+    governor = LLMGovernor(limits={"openai": {}}, queue_timeout=5, max_retries=1)
+    policy = LLMResiliencePolicy(attempt_timeout=1, deadline=5, max_retries=0)
+    attempts = []
+
+    async def provider_call():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            note_retry_after(FakeRateLimitError({"retry-after-ms": "200"}))
+            return None, "OPENAI_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later."
+        return "ok", None
+
+    result = asyncio.run(governor.run("openai", "sk-a", "hi", lambda: policy.with_timeout("openai", provider_call(), 1)))
+    assert result == ("ok", None)
+    assert 0.19 <= attempts[1] - attempts[0] < 0.9 # The advertised 200ms, not the 1s default backoff
+
+
+def test_a_free_slot_is_taken_even_at_the_deadline():
+    clock = FakeClock()
+    governor = LLMGovernor(limits={"openai": {"concurrency": 1}}, queue_timeout=0, max_retries=0, clock=clock)
+
+    async def scenario():
+        async with governor.slot("openai", "sk-a", "hi", deadline=clock()) as error:
+            return error
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_limiters_in_use_are_not_evicted():
+    clock = FakeClock()
+    governor = LLMGovernor(limits={"openai": {"concurrency": 1}}, queue_timeout=0.05, max_retries=0, clock=clock)
+    governor.max_keys = 2
+
+    async def call():
+        return "ok", None
+
+    async def scenario():
+        async with governor.slot("openai", "sk-busy", "hi") as error:
+            assert error is None
+            busy = governor._limiter("openai", "sk-busy")
+            for i in range(5): # More keys than max_keys while sk-busy holds its only slot
+                await governor.run("openai", f"sk-{i}", "hi", call)
+            assert governor._limiter("openai", "sk-busy") is busy
+            assert len(governor._limiters) <= 3
+            still_limited = await governor.run("openai", "sk-busy", "hi", call) # Times out on the held slot
+        clock.now += governor.idle_ttl
+        await governor.run("openai", "sk-new", "hi", call)
+        return still_limited, list(governor._limiters)
+
+    (output_text, error), keys = asyncio.run(scenario())
+    assert output_text is None and error.startswith("OPENAI_RATE_LIMIT_EXCEEDED:")
+    assert len(keys) == 1 # Idle limiters are dropped once they expire
@@ -0,0 +1,161 @@
+"""
+Tests for the LLM resilience policy (src/llm_resilience.py).
+"""
+
+import asyncio
+
+from src import llm_services
+from src.llm_rate_limiter import LLMGovernor
+from src.llm_resilience import CircuitBreaker, LLMResiliencePolicy, is_retryable_error
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _policy(**overrides):
+    options = dict(attempt_timeout=1, deadline=5, max_retries=2, backoff_base=0.01, backoff_max=0.02,
+                   failure_threshold=3, reset_seconds=30, hedge=False, hedge_min_samples=5)
+    options.update(overrides)
+    return LLMResiliencePolicy(**options)
+
+
+def test_retryable_errors():
+    assert is_retryable_error("OPENAI_API_ERROR:503 - Service Unavailable")
+    assert is_retryable_error("ANTHROPIC_API_ERROR:529 - Overloaded")
+    assert is_retryable_error("GEMINI_TIMEOUT:No response within 60s")
+    assert is_retryable_error("OPENAI_CONNECTION_ERROR:Connection error.")
+    assert not is_retryable_error("OPENAI_API_ERROR:400 - Bad request")
+    assert not is_retryable_error("OPENAI_RATE_LIMIT_EXCEEDED:Rate limit exceeded. Please try again later.")
+    assert not is_retryable_error("OPENAI_AUTHENTICATION_ERROR:Invalid API key or insufficient permissions.")
+
+
+def test_transient_errors_are_retried():
+    policy = _policy()
+    outcomes = [(None, "OPENAI_API_ERROR:502 - Bad gateway"), (None, "OPENAI_CONNECTION_ERROR:reset"), ("ok", None)]
+
+    async def attempt(timeout):
+        return outcomes.pop(0)
+
+    assert asyncio.run(policy.call("openai", "gpt-4o", attempt)) == ("ok", None)
+    assert policy.stats()["retries"] == 2
+    assert policy.breaker("openai", "gpt-4o").state == "closed"
+
+
+def test_request_errors_are_not_retried():
+    policy = _policy()
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        return None, "OPENAI_MODEL_NOT_FOUND:gpt-9"
+
+    assert asyncio.run(policy.call("openai", "gpt-9", attempt)) == (None, "OPENAI_MODEL_NOT_FOUND:gpt-9")
+    assert calls == [1]
+
+
+def test_attempt_timeout_becomes_a_retryable_error():
+    policy = _policy(attempt_timeout=0.05, max_retries=1)
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(1)
+        return await policy.with_timeout("anthropic", asyncio.sleep(1, result=("late", None)), timeout)
+
+    output_text, error = asyncio.run(policy.call("anthropic", "claude", attempt))
+    assert output_text is None and error == "ANTHROPIC_TIMEOUT:No response within 0.05s"
+    assert len(calls) == 2
+    assert policy.stats()["timeouts"] == 2
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_a_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30, probe_timeout=60, clock=clock)
+    for _ in range(3):
+        assert breaker.allow() is None
+        breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow() == 30
+
+    clock.now += 31
+    assert breaker.allow() is None # The probe
+    assert breaker.state == "half_open"
+    assert breaker.allow() is not None # Only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open" # A failed probe re-opens straight away
+
+    clock.now += 31
+    assert breaker.allow() is None
+    breaker.record_success(0.2)
+    assert breaker.state == "closed" and breaker.allow() is None
+
+
+def test_open_breaker_short_circuits_calls():
+    policy = _policy(max_retries=0)
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(1)
+        return None, "GEMINI_API_ERROR:503 - unavailable"
+
+    async def scenario():
+        for _ in range(3):
+            await policy.call("gemini", "gemini-pro", attempt)
+        return await policy.call("gemini", "gemini-pro", attempt)
+
+    output_text, error = asyncio.run(scenario())
+    assert error.startswith("GEMINI_MODEL_UNAVAILABLE:gemini-pro")
+    assert len(calls) == 3
+    assert policy.stats()["breakers"]["gemini/gemini-pro"]["state"] == "open"
+
+
+def test_slow_attempt_is_hedged():
+    policy = _policy(hedge=True)
+    policy.breaker("openai", "gpt-4o").latencies.extend([0.02] * 5) # p95 of 20ms
+    started = []
+
+    async def attempt(timeout):
+        started.append(timeout)
+        if len(started) == 1:
+            await asyncio.sleep(1) # Stuck; the hedge should win and this gets cancelled
+            return "slow", None
+        return "hedged", None
+
+    assert asyncio.run(policy.call("openai", "gpt-4o", attempt)) == ("hedged", None)
+    assert len(started) == 2
+    assert policy.stats()["hedges"] == 1 and policy.stats()["hedge_wins"] == 1
+
+
+def test_get_llm_response_goes_through_the_policy(monkeypatch):
+    calls = []
+
+    class FlakyProvider(llm_services.BaseLLMProvider):
+        async def generate_text(self, api_key, model_id, prompt_text):
+            calls.append(prompt_text)
+            return ("recovered", None) if len(calls) > 1 else (None, "FLAKY_API_ERROR:503 - try again")
+
+    monkeypatch.setitem(llm_services.PROVIDER_REGISTRY, "flaky", FlakyProvider)
+    monkeypatch.setattr(llm_services, "llm_resilience", _policy())
+    result = asyncio.run(llm_services.get_llm_response("flaky", "sk-test", "m1", "hi"))
+    assert result == ("recovered", None)
+    assert calls == ["hi", "hi"]
+
+
+def test_provider_retry_after_reaches_the_rate_limiter(monkeypatch):
+    governor = LLMGovernor(limits={}, queue_timeout=5, max_retries=1)
+    monkeypatch.setitem(llm_services.PROVIDER_REGISTRY, "mock", llm_services.MockProvider)
+    monkeypatch.setattr(llm_services, "llm_governor", governor)
+    monkeypatch.setattr(llm_services, "llm_resilience", _policy())
+
+    async def scenario():
+        result = await llm_services.get_llm_response("mock", "sk-test", "m?latency_ms=1&errors=429:1&retry_after=7", "hi")
+        return result, governor._limiter("mock", "sk-test").backoff
+
+    (output_text, error), backoff = asyncio.run(scenario())
+    assert output_text is None and error.startswith("MOCK_RATE_LIMIT_EXCEEDED")
+    assert backoff == 7 # The advertised retry-after, not the default exponential backoff
+    assert governor.stats()["retries"] == 0 # 7s would overrun the 5s queue deadline
@@ -0,0 +1,269 @@
+"""
+Tests for src/llm_services.py and the /playground/test endpoint. No network access needed:
+SDK clients are stood in for by the factories passed to the pool.
+"""
+
+import asyncio
+import datetime
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from src import llm_services, schemas
+from src.config import settings
+from src.llm_services import LLMProviderError, ProviderClientPool
+
+
+def _factory(built):
+    def build(http_client):
+        client = object()
+        built.append((client, http_client))
+        return client
+    return build
+
+
+def _override_playground_deps(main):
+    from src.auth_utils import get_current_user
+    from src.database import get_db
+
+    main.app.dependency_overrides[get_current_user] = lambda: schemas.User(
+        user_id=1, auth0_id="auth0|test", tier="free", subscription_status="active",
+        created_at=datetime.datetime.now(datetime.timezone.utc)
+    )
+    main.app.dependency_overrides[get_db] = lambda: None
+
+
+async def _fake_get_decrypted_api_key(db, user_id, llm_provider):
+    return None if llm_provider == "mistral" else "sk-test"
+
+
+def test_pool_reuses_clients_per_provider_and_key():
+    pool = ProviderClientPool(maxsize=10, idle_ttl=60)
+    built = []
+
+    async def scenario():
+        first = pool.get("openai", "sk-a", _factory(built))
+        again = pool.get("openai", "sk-a", _factory(built))
+        other_key = pool.get("openai", "sk-b", _factory(built))
+        other_provider = pool.get("anthropic", "sk-a", _factory(built))
+        await pool.aclose()
+        return first, again, other_key, other_provider
+
+    first, again, other_key, other_provider = asyncio.run(scenario())
+    assert first is again
+    assert len({id(first), id(other_key), id(other_provider)}) == 3
+    # Keys of one provider share a connection pool; providers don't.
+    assert built[0][1] is built[1][1]
+    assert built[0][1] is not built[2][1]
+
+
+def test_pool_drops_idle_clients():
+    pool = ProviderClientPool(maxsize=10, idle_ttl=0.05)
+    built = []
+
+    async def scenario():
+        first = pool.get("openai", "sk-a", _factory(built))
+        await asyncio.sleep(0.1)
+        second = pool.get("openai", "sk-a", _factory(built))
+        await pool.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is not second
+    assert built[0][1] is built[1][1] # The connection pool outlives idle SDK clients
+
+
+def test_pool_starts_over_on_a_new_event_loop():
+    pool = ProviderClientPool(maxsize=10, idle_ttl=60)
+    built = []
+
+    async def get():
+        return pool.get("openai", "sk-a", _factory(built))
+
+    assert asyncio.run(get()) is not asyncio.run(get())
+    assert built[0][1] is not built[1][1]
+
+
+def test_playground_awaits_llm_response(monkeypatch):
+    from src import main
+
+    calls = []
+
+    async def fake_get_llm_response(provider_name, api_key, model_id, prompt_text):
+        calls.append((provider_name, api_key, model_id, prompt_text))
+        return ("hello back", None) if prompt_text == "hello" else (None, "MODEL_NOT_FOUND:x")
+
+    monkeypatch.setattr(llm_services, "get_llm_response", fake_get_llm_response)
+    monkeypatch.setattr(main.crud, "get_decrypted_api_key", _fake_get_decrypted_api_key)
+    _override_playground_deps(main)
+    try:
+        client = TestClient(main.app)
+        request = {"prompt_text": "hello", "llm_provider": "OpenAI", "model_id": "gpt-4o"}
+        ok = client.post("/playground/test", json=request).json()
+        failed = client.post("/playground/test", json={**request, "prompt_text": "boom"}).json()
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert ok == {"output_text": "hello back", "error": None, "cached": False}
+    assert failed == {"output_text": None, "error": "MODEL_NOT_FOUND:x", "cached": False}
+    assert calls[0] == ("openai", "sk-test", "gpt-4o", "hello")
+
+
+def test_identical_concurrent_calls_share_one_upstream_call(monkeypatch):
+    calls = []
+
+    async def fake_get_llm_response(provider_name, api_key, model_id, prompt_text):
+        calls.append(api_key)
+        await asyncio.sleep(0.05)
+        return f"answer {len(calls)} for {api_key}", None
+
+    monkeypatch.setattr(llm_services, "get_llm_response", fake_get_llm_response)
+
+    async def scenario():
+        same = [llm_services.get_llm_response_coalesced(1, "openai", "sk-test", "gpt-4o", "hi") for _ in range(3)]
+        other_user = llm_services.get_llm_response_coalesced(2, "openai", "sk-other", "gpt-4o", "hi")
+        results = await asyncio.gather(*same, other_user)
+        later = await llm_services.get_llm_response_coalesced(1, "openai", "sk-test", "gpt-4o", "hi")
+        return results, later
+
+    results, later = asyncio.run(scenario())
+    assert results[:3] == [results[0]] * 3 and results[0][0].endswith("for sk-test")
+    assert results[3][0].endswith("for sk-other") # Never shared across users
+    assert later == ("answer 3 for sk-test", None) # Only overlapping calls are coalesced; nothing is cached
+    assert calls == ["sk-test", "sk-other", "sk-test"]
+
+
+def _parse_sse(body):
+    events = []
+    for message in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in message.splitlines() if not line.startswith(":"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_playground_stream_relays_deltas_as_sse(monkeypatch):
+    from src import main
+
+    async def fake_stream(provider_name, api_key, model_id, prompt_text):
+        for delta in ["Hel", "lo"]:
+            yield delta
+        if prompt_text == "boom":
+            raise LLMProviderError("OPENAI_RATE_LIMIT_EXCEEDED:slow down")
+
+    monkeypatch.setattr(main, "stream_llm_response", fake_stream)
+    monkeypatch.setattr(main.crud, "get_decrypted_api_key", _fake_get_decrypted_api_key)
+    _override_playground_deps(main)
+    try:
+        client = TestClient(main.app)
+        request = {"prompt_text": "hello", "llm_provider": "openai", "model_id": "gpt-4o"}
+        ok = client.post("/playground/test/stream", json=request)
+        failed = client.post("/playground/test/stream", json={**request, "prompt_text": "boom"})
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert ok.headers["content-type"].startswith("text/event-stream")
+    assert _parse_sse(ok.text) == [("delta", {"text": "Hel"}), ("delta", {"text": "lo"}), ("done", {})]
+    assert _parse_sse(failed.text)[-1] == ("error", {"error": "OPENAI_RATE_LIMIT_EXCEEDED:slow down"})
+
+
+def test_client_disconnect_aborts_upstream(monkeypatch):
+    from src import streaming
+
+    monkeypatch.setattr(streaming, "DISCONNECT_POLL_SECONDS", 0.05)
+    upstream_closed = asyncio.Event()
+
+    class DisconnectedRequest:
+        async def is_disconnected(self):
+            return True
+
+    async def slow_events():
+        try:
+            yield "delta", {"text": "first"}
+            await asyncio.sleep(30) # A model that stalls mid-generation
+            yield "delta", {"text": "never sent"}
+        finally:
+            upstream_closed.set()
+
+    async def scenario():
+        relayed = [chunk async for chunk in streaming.relay_as_sse(DisconnectedRequest(), slow_events())]
+        await asyncio.wait_for(upstream_closed.wait(), timeout=1)
+        return relayed
+
+    assert asyncio.run(scenario()) == [streaming.sse_event("delta", {"text": "first"})]
+
+
+def _fake_compare_llm(delays):
+    async def fake_get_llm_response(provider_name, api_key, model_id, prompt_text):
+        await asyncio.sleep(delays[model_id])
+        return f"{model_id} says hi", None
+    return fake_get_llm_response
+
+
+def test_compare_runs_targets_concurrently(monkeypatch):
+    from src import main
+
+    delays = {"gemini-1.5-flash": 0.3, "gpt-4o": 0.3, "claude-3-5-haiku": 0.3, "slowpoke": 5}
+    monkeypatch.setattr(main, "get_llm_response", _fake_compare_llm(delays))
+    monkeypatch.setattr(main.crud, "get_decrypted_api_key", _fake_get_decrypted_api_key)
+    _override_playground_deps(main)
+    try:
+        client = TestClient(main.app)
+        started = time.perf_counter()
+        response = client.post("/playground/compare", json={
+            "prompt_text": "hi",
+            "timeout_seconds": 1,
+            "targets": [
+                {"llm_provider": "gemini", "model_id": "gemini-1.5-flash"},
+                {"llm_provider": "openai", "model_id": "gpt-4o"},
+                {"llm_provider": "anthropic", "model_id": "claude-3-5-haiku"},
+                {"llm_provider": "openai", "model_id": "slowpoke"},
+                {"llm_provider": "mistral", "model_id": "mistral-small"},
+            ],
+        })
+        elapsed = time.perf_counter() - started
+    finally:
+        main.app.dependency_overrides.clear()
+
+    results = response.json()["results"]
+    assert [r["output_text"] for r in results[:3]] == [
+        "gemini-1.5-flash says hi", "gpt-4o says hi", "claude-3-5-haiku says hi"
+    ]
+    assert results[3]["error"].startswith("TIMEOUT:")
+    assert results[4]["error"] == "API_KEY_NOT_CONFIGURED"
+    assert elapsed < 2 # Bounded by the timeout, not the sum of the delays
+
+
+def test_compare_stream_sends_results_as_they_finish(monkeypatch):
+    from src import main
+
+    monkeypatch.setattr(main, "get_llm_response", _fake_compare_llm({"slow": 0.4, "fast": 0.05}))
+    monkeypatch.setattr(main.crud, "get_decrypted_api_key", _fake_get_decrypted_api_key)
+    _override_playground_deps(main)
+    try:
+        client = TestClient(main.app)
+        response = client.post("/playground/compare/stream", json={
+            "prompt_text": "hi",
+            "targets": [{"llm_provider": "openai", "model_id": "slow"}, {"llm_provider": "openai", "model_id": "fast"}],
+        })
+    finally:
+        main.app.dependency_overrides.clear()
+
+    events = _parse_sse(response.text)
+    assert [(event, data.get("index"), data.get("model_id")) for event, data in events] == [
+        ("result", 1, "fast"), ("result", 0, "slow"), ("done", None, None)
+    ]
+
+
+def test_compare_rejects_too_many_targets(monkeypatch):
+    from src import main
+
+    _override_playground_deps(main)
+    try:
+        client = TestClient(main.app)
+        targets = [{"llm_provider": "openai", "model_id": f"m{i}"} for i in range(settings.PLAYGROUND_COMPARE_MAX_TARGETS + 1)]
+        response = client.post("/playground/compare", json={"prompt_text": "hi", "targets": targets})
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 400
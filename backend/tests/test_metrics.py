@@ -0,0 +1,23 @@
+"""
+Tests for src/routers/metrics.py.
+"""
+
+from fastapi.testclient import TestClient
+
+from src import main
+from src.config import settings
+
+
+def test_metrics_require_the_configured_token(monkeypatch):
+    client = TestClient(main.app)
+
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"X-Metrics-Token": ""}).status_code == 404
+
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-me")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"X-Metrics-Token": "guess"}).status_code == 401
+    response = client.get("/metrics", headers={"X-Metrics-Token": "scrape-me"})
+    assert response.status_code == 200
+    assert "llm_rate_limiter" in response.json()
@@ -0,0 +1,157 @@
+"""
+Tests for the mock provider (src/mock_llm.py) and the OpenAI/Anthropic/Gemini stand-in (scripts/mock_llm_server.py).
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from scripts.mock_llm_server import start_mock_llm_server
+from src import llm_services
+from src.config import settings
+from src.llm_rate_limiter import LLMGovernor
+from src.llm_resilience import LLMResiliencePolicy
+from src.mock_llm import MockLLM, MockSpec, mock_text
+
+
+@pytest.fixture
+def quick_policies(monkeypatch):
+    """Fresh limiter and retry policy with short timeouts, so tests don't share breaker or backoff state."""
+    monkeypatch.setattr(llm_services, "llm_governor", LLMGovernor(limits={}, queue_timeout=5, max_retries=1))
+    monkeypatch.setattr(llm_services, "llm_resilience", LLMResiliencePolicy(
+        attempt_timeout=0.3, deadline=5, max_retries=2, backoff_base=0.01, backoff_max=0.02,
+        failure_threshold=100, reset_seconds=1, hedge=False, hedge_min_samples=20
+    ))
+    monkeypatch.setitem(llm_services.PROVIDER_REGISTRY, "mock", llm_services.MockProvider)
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    server = start_mock_llm_server()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{base}/v1")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", base)
+    monkeypatch.setattr(settings, "GEMINI_BASE_URL", base)
+    yield server
+    server.shutdown()
+
+
+def test_spec_parsing():
+    spec = MockSpec("fast?latency_ms=20&p99_ms=200&tps=100&tokens=5&errors=429:0.05,timeout:0.01&seed=7")
+    assert (spec.name, spec.latency_ms, spec.p99_ms, spec.tokens_per_second, spec.output_tokens, spec.seed) == ("fast", 20, 200, 100, 5, 7)
+    assert spec.error_rates == {"429": 0.05, "timeout": 0.01}
+    with pytest.raises(ValueError):
+        MockSpec("m?errors=418:0.5")
+
+
+def test_outputs_and_injected_behaviour_are_deterministic():
+    assert mock_text("m", "hello", 8) == mock_text("m", "hello", 8)
+    assert mock_text("m", "hello", 8) != mock_text("m", "hello!", 8)
+
+    model_id = "m?latency_ms=10&p99_ms=100&errors=500:0.3&seed=3"
+    first = MockLLM()
+    second = MockLLM()
+    runs = [[(call.first_token_delay, call.error) for call in (llm.plan(model_id, "hi") for _ in range(50))] for llm in (first, second)]
+    assert runs[0] == runs[1]
+    assert {error for _, error in runs[0]} == {None, "500"}
+    assert len({delay for delay, _ in runs[0]}) > 1
+
+
+def test_mock_provider_exercises_retries_and_timeouts(quick_policies):
+    async def scenario():
+        ok = await llm_services.get_llm_response("mock", "any", "m?latency_ms=1&tokens=3", "hi")
+        streamed = [delta async for delta in llm_services.stream_llm_response("mock", "any", "m?latency_ms=1&tokens=3&tps=1000", "hi")]
+        timed_out = await llm_services.get_llm_response("mock", "any", "m?latency_ms=1&errors=timeout:1", "hi")
+        failing = await llm_services.get_llm_response("mock", "any", "m?latency_ms=1&errors=503:1", "hi")
+        return ok, streamed, timed_out, failing
+
+    ok, streamed, timed_out, failing = asyncio.run(scenario())
+    assert ok == ("".join(mock_text("m", "hi", 3)), None)
+    assert "".join(streamed) == ok[0] and len(streamed) == 3
+    assert timed_out == (None, "MOCK_TIMEOUT:No response within 0.3s")
+    assert failing[1] == "MOCK_API_ERROR:503 - Injected error for m?latency_ms=1&errors=503:1"
+    assert llm_services.llm_resilience.stats()["retries"] == 4 # Two retries each for the timeout and the 503
+
+
+@pytest.mark.parametrize("provider", ["openai", "anthropic", "gemini"])
+def test_wire_format_stand_in_works_with_the_real_sdks(provider, mock_server, quick_policies):
+    api_key = f"sk-mock-{uuid.uuid4().hex}" # A fresh pooled client, built with the base URL above
+    model = "gpt-mock?latency_ms=1&tokens=6&tps=2000"
+
+    async def scenario():
+        completed = await llm_services.get_llm_response(provider, api_key, model, "Say hi")
+        streamed = [delta async for delta in llm_services.stream_llm_response(provider, api_key, model, "Say hi")]
+        rate_limited = await llm_services.get_llm_response(provider, api_key, "m?latency_ms=1&errors=429:1&retry_after=0.05", "Say hi")
+        await llm_services.client_pool.aclose()
+        return completed, streamed, rate_limited
+
+    completed, streamed, rate_limited = asyncio.run(scenario())
+    expected = "".join(mock_text("gpt-mock", "Say hi", 6))
+    assert completed == (expected, None)
+    assert "".join(streamed) == expected
+    assert rate_limited[1].startswith(f"{provider.upper()}_RATE_LIMIT_EXCEEDED")
+    assert llm_services.llm_governor.stats()["retries"] == 1 # Retried once after the advertised retry-after
+    assert mock_server.request_count == 4
+
+
+@pytest.mark.parametrize("provider", ["openai", "anthropic", "gemini"])
+def test_closing_a_stream_early_aborts_the_upstream_response(provider, mock_server, quick_policies):
+    async def scenario():
+        stream = llm_services.stream_llm_response(provider, f"sk-mock-{uuid.uuid4().hex}", "m?latency_ms=1&tokens=200&tps=20", "hi")
+        first = await stream.__anext__()
+        await stream.aclose() # What the SSE relay does when the client disconnects
+        for _ in range(40):
+            if mock_server.aborted_streams:
+                break
+            await asyncio.sleep(0.05)
+        await llm_services.client_pool.aclose()
+        return first
+
+    assert asyncio.run(scenario())
+    assert mock_server.aborted_streams == 1 # Long before the 10s the full stream would take
+
+
+def test_concurrent_gemini_calls_use_their_own_keys_in_parallel(mock_server, quick_policies):
+    keys = [f"gemini-key-{n}-{uuid.uuid4().hex}" for n in range(8)]
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*(
+            llm_services.get_llm_response("gemini", key, "gemini-mock?latency_ms=200&tokens=2", f"prompt for {key}")
+            for key in keys
+        ))
+        elapsed = asyncio.get_running_loop().time() - started
+        await llm_services.client_pool.aclose()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == [("".join(mock_text("gemini-mock", f"prompt for {key}", 2)), None) for key in keys]
+    assert sorted(mock_server.api_keys) == sorted(keys) # Every request carried its own caller's key
+    assert elapsed < 0.2 * len(keys) / 2 # Overlapping, not serialized
+
+
+def test_gemini_clients_share_one_connection_pool(mock_server, quick_policies):
+    keys = [f"gemini-key-{n}-{uuid.uuid4().hex}" for n in range(3)]
+
+    async def scenario():
+        results = [await llm_services.get_llm_response("gemini", key, "gemini-mock?latency_ms=1&tokens=2", "hi") for key in keys]
+        await llm_services.client_pool.aclose()
+        return results
+
+    assert all(error is None for _, error in asyncio.run(scenario()))
+    assert mock_server.api_keys == keys
+    assert mock_server.connection_count == 1 # Every key's client reused the first keep-alive connection
+
+
+def test_random_sequences_are_kept_for_a_bounded_number_of_models():
+    llm = MockLLM(max_sequences=2)
+    for i in range(5):
+        llm.plan(f"m{i}?seed=1", "hi")
+    assert len(llm._rngs) == 2
+
+    model_id = "m?latency_ms=10&p99_ms=100&seed=3"
+    replay = [llm.plan(model_id, "hi").first_token_delay for _ in range(3)]
+    llm.plan("other", "hi")
+    llm.plan("another", "hi") # Evicts model_id's sequence, which restarts from its seed
+    assert [llm.plan(model_id, "hi").first_token_delay for _ in range(3)] == replay
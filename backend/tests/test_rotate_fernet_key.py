@@ -0,0 +1,117 @@
+"""
+Tests for MultiFernet key rotation in src/crud/crud_api_keys.py and scripts/rotate_fernet_key.py.
+Tests taking pg_session_factory need a migrated Postgres database in TEST_DATABASE_URL and are skipped otherwise.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+
+from scripts.rotate_fernet_key import rotate_all, rotate_tokens
+from src import models
+from src.config import settings
+from src.crud import crud_api_keys, crud_users
+
+PROVIDERS = ["openai", "anthropic", "gemini"]
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    monkeypatch.setattr(settings, "FERNET_KEY", old_key)
+    monkeypatch.setattr(settings, "FERNET_PREVIOUS_KEYS", [])
+    crud_api_keys._decrypted_key_cache.clear()
+    yield old_key, new_key
+    crud_api_keys._decrypted_key_cache.clear()
+
+
+def test_previous_keys_still_decrypt(keys, monkeypatch):
+    old_key, new_key = keys
+    token = crud_api_keys._get_fernet_instance().encrypt(b"sk-old")
+    monkeypatch.setattr(settings, "FERNET_KEY", new_key)
+    with pytest.raises(InvalidToken):
+        crud_api_keys._get_fernet_instance().decrypt(token)
+
+    monkeypatch.setattr(settings, "FERNET_PREVIOUS_KEYS", [old_key])
+    assert crud_api_keys._get_fernet_instance().decrypt(token) == b"sk-old"
+    new_token = crud_api_keys._get_fernet_instance().encrypt(b"sk-new")
+    assert Fernet(new_key.encode()).decrypt(new_token) == b"sk-new" # Encryption always uses the current key
+
+
+def test_rotate_tokens_skips_current_and_reports_unknown(keys):
+    old_key, new_key = keys
+    rows = [
+        (1, Fernet(old_key.encode()).encrypt(b"a")),
+        (2, Fernet(new_key.encode()).encrypt(b"b")),
+        (3, Fernet.generate_key()), # Not a token any configured key made
+    ]
+    rotated, undecryptable = rotate_tokens((new_key, old_key), rows)
+    assert [row_id for row_id, _, _ in rotated] == [1]
+    assert Fernet(new_key.encode()).decrypt(rotated[0][2]) == b"a"
+    assert undecryptable == [3]
+
+
+async def _create_user_with_keys(session_factory, providers, key_prefix="sk"):
+    async with session_factory() as db:
+        user_id = (await crud_users.get_or_create_user_from_auth0(db, {"sub": f"auth0|rotate-{uuid.uuid4().hex}"})).user_id
+        rows = [await crud_api_keys.create_user_api_key(db, user_id, provider, f"{key_prefix}-{user_id}-{provider}") for provider in providers]
+        return user_id, rows
+
+
+async def _decrypted(session_factory, user_id, provider):
+    async with session_factory() as db:
+        return await crud_api_keys.get_decrypted_api_key(db, user_id, provider)
+
+
+def test_job_rotates_every_row_and_is_resumable(pg_session_factory, pg_async_session_factory, keys, monkeypatch):
+    old_key, new_key = keys
+    user_ids = [asyncio.run(_create_user_with_keys(pg_async_session_factory, PROVIDERS))[0] for _ in range(3)]
+    db = pg_session_factory()
+
+    monkeypatch.setattr(settings, "FERNET_KEY", new_key)
+    monkeypatch.setattr(settings, "FERNET_PREVIOUS_KEYS", [old_key])
+    crud_api_keys._decrypted_key_cache.clear()
+    assert asyncio.run(_decrypted(pg_async_session_factory, user_ids[0], "openai")) == f"sk-{user_ids[0]}-openai"
+
+    first_id = db.query(models.UserApiKeyDB.id).filter(models.UserApiKeyDB.user_id == user_ids[0]).order_by(models.UserApiKeyDB.id).first()[0]
+    stats = rotate_all(pg_session_factory, batch_size=2, workers=2, after_id=first_id - 1, verbose=False)
+    assert stats["rotated"] >= 9 and stats["undecryptable"] == 0
+
+    current = Fernet(new_key.encode())
+    db.expire_all() # The rows were rewritten on the job's own connections
+    rows = db.query(models.UserApiKeyDB).filter(models.UserApiKeyDB.user_id.in_(user_ids)).all()
+    assert sorted(current.decrypt(row.encrypted_api_key).decode() for row in rows) == sorted(
+        f"sk-{user_id}-{provider}" for user_id in user_ids for provider in PROVIDERS
+    )
+
+    again = rotate_all(pg_session_factory, batch_size=2, workers=0, after_id=first_id - 1, verbose=False)
+    assert again["rotated"] == 0 and again["scanned"] == stats["scanned"]
+
+    db.query(models.User).filter(models.User.user_id.in_(user_ids)).delete()
+    db.commit()
+    db.close()
+
+
+def test_concurrent_change_is_not_overwritten(pg_session_factory, pg_async_session_factory, keys, monkeypatch):
+    old_key, new_key = keys
+    user_id, (row,) = asyncio.run(_create_user_with_keys(pg_async_session_factory, ["openai"], key_prefix="sk-before"))
+    row_id, stale_token = row.id, row.encrypted_api_key
+
+    monkeypatch.setattr(settings, "FERNET_KEY", new_key)
+    monkeypatch.setattr(settings, "FERNET_PREVIOUS_KEYS", [old_key])
+
+    async def change_key(): # The user changes the key mid-rotation
+        async with pg_async_session_factory() as db:
+            await crud_api_keys.update_user_api_key(db, user_id, "openai", "sk-after")
+
+    asyncio.run(change_key())
+    db = pg_session_factory()
+    rotated, _ = rotate_tokens((new_key, old_key), [(row_id, bytes(stale_token))])
+    assert crud_api_keys.store_rotated_api_keys(db, rotated) == 0
+    assert asyncio.run(_decrypted(pg_async_session_factory, user_id, "openai")) == "sk-after"
+
+    db.query(models.User).filter(models.User.user_id == user_id).delete()
+    db.commit()
+    db.close()
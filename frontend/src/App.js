@@ -96,11 +96,15 @@ function App() {
         setDataLoading(false);
         return;
       }
-      const data = await apiFetchPrompts(token);
       const promptsObj = {};
-      (data.prompts || []).forEach(p => {
-        promptsObj[p.id] = p;
-      });
+      let cursor = null;
+      do { // Follow next_cursor until the last page
+        const data = await apiFetchPrompts(token, cursor);
+        (data.prompts || []).forEach(p => {
+          promptsObj[p.id] = p;
+        });
+        cursor = data.next_cursor;
+      } while (cursor);
       setPromptsData(promptsObj);
     } catch (err) {
       setError(`Failed to load prompts: ${err.message}.`);
@@ -14,9 +14,10 @@ const createHeaders = (token) => {
   return headers;
 };
 
-// Fetch all prompts
-export async function fetchPrompts(token) {
-  const res = await fetch(`${API_BASE}/prompts`, {
+// Fetch one page of prompts; pass the previous page's next_cursor to get the next one
+export async function fetchPrompts(token, cursor = null) {
+  const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+  const res = await fetch(`${API_BASE}/prompts${query}`, {
     headers: createHeaders(token),
   });
   if (!res.ok) {